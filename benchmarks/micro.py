@@ -0,0 +1,235 @@
+"""Microbenchmarks of the per value CPU cost of python-duco.
+
+Every case runs against an in-memory fake hub, no bus is involved.
+
+Run with ``python -m benchmarks.micro``. ``--save`` stores the results as
+baseline, later runs print a comparison with the baseline and with
+``--check`` exit with an error when a case got slower than the allowed
+regression.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from duco.const import (DUCO_REG_ADDR_NODE_ID_OFFSET)
+from duco.enum_types import (ModuleType)
+from duco.helpers import (twos_comp, verify_value_in_range)
+from duco.modbus import (
+    DATA_TYPE_FLOAT,
+    DATA_TYPE_INT,
+    REGISTER_TYPE_HOLDING,
+    REGISTER_TYPE_INPUT,
+    ModbusRegister,
+    RegisterSpec
+)
+from duco.nodes import (Node, _NODE_CLASSES)
+from duco.registers import (REGISTER_SPECS)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+
+
+class _Response:
+    """Read response with fixed registers."""
+
+    __slots__ = ('registers',)
+
+    def __init__(self, registers):
+        """Initialize _Response."""
+        self.registers = registers
+
+
+# register key: raw words of a plausible, valid value
+NODE_VALUES = {
+    'status': (0,),
+    'fan_actual': (40,),
+    'temperature': (215,),
+    'co2_value': (800,),
+    'rh_value': (550,),
+    'zone': (1,),
+    'setpoint': (50,),
+    'co2_setpoint': (900,),
+    'rh_setpoint': (60,),
+    'rh_delta': (1,),
+    'flow': (120,),
+    'button_1': (20,),
+    'automin': (10,),
+    'button_2': (50,),
+    'automax': (90,),
+    'button_3': (80,),
+    'manual_time': (15,),
+    'action': (0,),
+}
+
+
+class FakeHub:
+    """In-memory hub answering reads with fixed words per register."""
+
+    write_elision = True
+    verify_writes = False
+    cache_ttl = 0
+
+    def __init__(self, values=None):
+        """Initialize FakeHub.
+
+        Args:
+            values (:obj:`dict`, optional): raw words per
+                (register_type, param_id), by default the NODE_VALUES of
+                every register.
+
+        """
+        if values is None:
+            values = {(spec.register_type, spec.param_id): NODE_VALUES[key]
+                      for key, spec in REGISTER_SPECS.items()}
+        self._responses = {key: _Response(list(words))
+                           for key, words in values.items()}
+
+    def _read(self, register_type, address):
+        """Return the response of the register at address."""
+        return self._responses[(register_type,
+                                address % DUCO_REG_ADDR_NODE_ID_OFFSET)]
+
+    def read_input_registers(self, address, count=1):
+        """Read input registers."""
+        return self._read(REGISTER_TYPE_INPUT, address)
+
+    def read_holding_registers(self, address, count=1):
+        """Read holding registers."""
+        return self._read(REGISTER_TYPE_HOLDING, address)
+
+
+def _register_update(data_type, words):
+    """Return a case decoding a register of data_type."""
+    spec = RegisterSpec('Bench', 3, REGISTER_TYPE_INPUT, '', len(words),
+                        0.1, 0, data_type, 1)
+    register = ModbusRegister(FakeHub({(REGISTER_TYPE_INPUT, 3): words}),
+                              spec, 23)
+    return register.update
+
+
+def _node_factory(module_type):
+    """Return a case creating a node of module_type."""
+    hub = FakeHub()
+    return lambda: Node.factory(2, module_type, hub)
+
+
+def _node_attribute(module_type, render):
+    """Return a case rendering a node of module_type."""
+    node = Node.factory(2, module_type, FakeHub())
+    return lambda: render(node)
+
+
+def cases():
+    """Return the {name: zero argument callable} benchmark cases."""
+    result = {
+        'register.update.int': _register_update(DATA_TYPE_INT, (0x00F1,)),
+        'register.update.float': _register_update(DATA_TYPE_FLOAT,
+                                                  (0x41C8, 0x0000)),
+        'helpers.twos_comp': lambda: twos_comp(0xFF38, 16),
+        'helpers.verify_value_in_range':
+            lambda: verify_value_in_range(50, 10, 5, 100),
+        'module_type.supported': lambda: ModuleType.supported(17),
+        'node.factory': _node_factory(ModuleType.VALVE_CO2),
+    }
+    for module_type, node_class in _NODE_CLASSES.items():
+        name = node_class.__name__
+        result['construct.' + name] = _node_factory(module_type)
+        result['str.' + name] = _node_attribute(module_type, str)
+        result['state.' + name] = _node_attribute(
+            module_type, lambda node: node.state())
+    return result
+
+
+def measure(case, repeat=5):
+    """Return the best time per call of case in nanoseconds."""
+    timer = timeit.Timer(case)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def run(pattern=None, repeat=5):
+    """Run the cases matching pattern, return {name: ns per call}.
+
+    Cases that raise are reported and left out of the results.
+    """
+    results = {}
+    for name, case in sorted(cases().items()):
+        if pattern and pattern not in name:
+            continue
+        try:
+            case()
+        except Exception as exc:  # pylint: disable=broad-except
+            print("{:<40} failed: {!r}".format(name, exc), file=sys.stderr)
+            continue
+        results[name] = measure(case, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance, pattern=None):
+    """Print results against baseline, return the regressed case names.
+
+    A baseline case matching pattern without a result, because it failed
+    or no longer exists, counts as regressed.
+    """
+    regressions = []
+    print("{:<40} {:>12} {:>12} {:>8}".format('case', 'baseline ns',
+                                              'current ns', 'change'))
+    for name, base in sorted(baseline.items()):
+        if name in results or (pattern and pattern not in name):
+            continue
+        regressions.append(name)
+        print("{:<40} {:>12.0f} {:>12} {:>8}".format(name, base, '-',
+                                                     'missing !'))
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            print("{:<40} {:>12} {:>12.0f} {:>8}".format(name, '-',
+                                                         current, 'new'))
+            continue
+        change = current / base - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = ' !'
+        print("{:<40} {:>12.0f} {:>12.0f} {:>+7.1%}{}".format(
+            name, base, current, change, flag))
+    return regressions
+
+
+def main(argv=None):
+    """Run the microbenchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern',
+                        help='only run cases containing this string')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timing repeats per case, the best is kept')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline file')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as baseline')
+    parser.add_argument('--check', action='store_true',
+                        help='fail when a case regressed')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slow down before a case regressed')
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.tolerance, args.pattern)
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+    if args.check and regressions:
+        print("regressed: " + ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Capture and replay of raw Modbus transactions."""
+import collections
+import logging
+import struct
+import time
+from collections import namedtuple
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+CAPTURE_MAGIC = b'DUCOCAP1'
+# timestamp, function code, unit, address, count or value, status,
+# number of words that follow
+RECORD_STRUCT = struct.Struct('<dBBHHBH')
+
+STATUS_OK = 0
+STATUS_ERROR_RESPONSE = 1
+STATUS_EXCEPTION = 2
+
+# pymodbus client function: Modbus function code
+FUNCTION_CODES = {
+    'read_coils': 0x01,
+    'read_holding_registers': 0x03,
+    'read_input_registers': 0x04,
+    'write_coil': 0x05,
+    'write_register': 0x06,
+    'write_registers': 0x10,
+}
+_FUNCTION_NAMES = {code: name for name, code in FUNCTION_CODES.items()}
+
+# words are the response registers of reads and the request values of
+# write_registers, arg is the count of reads and the value of single writes
+Transaction = namedtuple('Transaction', [
+    'timestamp', 'function', 'unit', 'address', 'arg', 'status', 'words'])
+
+
+class CaptureWriter:
+    """Append Modbus transactions to a capture file.
+
+    Every transaction is one fixed size record followed by its 16 bit
+    words, the file can be appended to by a later capture.
+    """
+
+    def __init__(self, path):
+        """Open the capture file path for appending."""
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+
+    def __enter__(self):
+        """Enter."""
+        return self
+
+    def __exit__(self, exc_type, _exc_value, traceback):
+        """Exit."""
+        self.close()
+
+    def record(self, function, address, arg, unit, result,
+               timestamp=None):
+        """Append the transaction function(address, arg) and its result.
+
+        result is the response of the client, or the exception it raised.
+        """
+        if isinstance(result, Exception):
+            status = STATUS_EXCEPTION
+            words = ()
+        elif result is None or _is_error(result):
+            status = STATUS_ERROR_RESPONSE
+            words = ()
+        else:
+            status = STATUS_OK
+            words = getattr(result, 'registers', None) or ()
+        if function == 'write_registers':
+            words = arg
+            arg = len(arg)
+        self._file.write(RECORD_STRUCT.pack(
+            time.time() if timestamp is None else timestamp,
+            FUNCTION_CODES[function], unit, address, int(arg), status,
+            len(words)))
+        self._file.write(struct.pack('<{}H'.format(len(words)), *words))
+
+    def close(self):
+        """Flush and close the capture file."""
+        self._file.close()
+
+
+def _is_error(result):
+    """Return whether result is an error response."""
+    is_error = getattr(result, 'isError', None)
+    return is_error is not None and bool(is_error())
+
+
+def read_capture(path):
+    """Yield the Transaction records of capture file path in order."""
+    with open(path, 'rb') as capture:
+        if capture.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("{} is not a Modbus capture".format(path))
+        while True:
+            header = capture.read(RECORD_STRUCT.size)
+            if len(header) < RECORD_STRUCT.size:
+                return
+            timestamp, code, unit, address, arg, status, count = \
+                RECORD_STRUCT.unpack(header)
+            data = capture.read(2 * count)
+            if len(data) < 2 * count:
+                _LOGGER.warning("Capture %s ends in a partial record", path)
+                return
+            yield Transaction(timestamp, _FUNCTION_NAMES[code], unit,
+                              address, arg, status,
+                              struct.unpack('<{}H'.format(count), data))
+
+
+class _ReplayResponse:
+    """Response of ReplayClient, registers is missing on errors."""
+
+    def __init__(self, registers=None):
+        """Initialize _ReplayResponse."""
+        if registers is not None:
+            self.registers = list(registers)
+
+    def isError(self):  # pylint: disable=invalid-name
+        """Return whether the response is an error, like pymodbus."""
+        return not hasattr(self, 'registers')
+
+
+class ReplayClient:
+    """Modbus client that answers from a capture file.
+
+    A request is answered by the next recorded transaction with the same
+    function, unit, address and count, the last one is repeated once they
+    are used up. With a speed the answers are delayed to the recorded
+    timing divided by speed, without speed they are returned at once.
+    """
+
+    def __init__(self, path, speed=None):
+        """Load the capture file path."""
+        self._speed = speed
+        self._transactions = collections.defaultdict(collections.deque)
+        self._first = None
+        for transaction in read_capture(path):
+            if self._first is None:
+                self._first = transaction.timestamp
+            arg = transaction.arg
+            if transaction.function == 'write_registers':
+                arg = tuple(transaction.words)
+            self._transactions[(transaction.function, transaction.unit,
+                                transaction.address, arg)].append(
+                                    transaction)
+        self._start = None
+
+    def connect(self):
+        """Start the replay clock."""
+        self._start = time.monotonic()
+        return True
+
+    def close(self):
+        """Do nothing, there is no connection."""
+
+    def _answer(self, function, address, arg, unit):
+        """Return the recorded response to function(address, arg)."""
+        recorded = self._transactions.get((function, unit, address, arg))
+        if not recorded:
+            _LOGGER.debug("No recorded %s of %s", function, address)
+            return _ReplayResponse()
+        transaction = (recorded.popleft() if len(recorded) > 1
+                       else recorded[0])
+        if self._speed:
+            if self._start is None:
+                self._start = time.monotonic()
+            delay = ((transaction.timestamp - self._first) / self._speed -
+                     (time.monotonic() - self._start))
+            if delay > 0:
+                time.sleep(delay)
+        if transaction.status == STATUS_EXCEPTION:
+            raise IOError("Recorded {} of {} failed".format(function,
+                                                            address))
+        if transaction.status == STATUS_ERROR_RESPONSE:
+            return _ReplayResponse()
+        if function.startswith('read_'):
+            return _ReplayResponse(transaction.words)
+        return _ReplayResponse(())
+
+    def read_coils(self, address, count=1, unit=0):
+        """Read coils."""
+        return self._answer('read_coils', address, count, unit)
+
+    def read_input_registers(self, address, count=1, unit=0):
+        """Read input registers."""
+        return self._answer('read_input_registers', address, count, unit)
+
+    def read_holding_registers(self, address, count=1, unit=0):
+        """Read holding registers."""
+        return self._answer('read_holding_registers', address, count, unit)
+
+    def write_coil(self, address, value, unit=0):
+        """Write coil."""
+        return self._answer('write_coil', address, value, unit)
+
+    def write_register(self, address, value, unit=0):
+        """Write register."""
+        return self._answer('write_register', address, value, unit)
+
+    def write_registers(self, address, values, unit=0):
+        """Write registers."""
+        return self._answer('write_registers', address, tuple(values), unit)
@@ -0,0 +1,66 @@
+"""Columnar export of node values as NumPy arrays."""
+import logging
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+# column: register key, NaN for nodes without the register
+_REGISTER_COLUMNS = (
+    ('zone', 'zone'),
+    ('status', 'status'),
+    ('fan_actual', 'fan_actual'),
+    ('temperature', 'temperature'),
+    ('co2', 'co2_value'),
+    ('rh', 'rh_value'),
+)
+
+COLUMNS = (('node_id', 'module_type') +
+           tuple(column for column, _ in _REGISTER_COLUMNS))
+
+
+def _numpy():
+    """Return the numpy module, an optional dependency."""
+    # numpy is only imported on export so the package works without it
+    import numpy  # pylint: disable=import-outside-toplevel,import-error
+    return numpy
+
+
+def _cached_value(node, key):
+    """Return the last value of register key of node, or NaN."""
+    register = node.register(key)
+    if register is None:
+        return float('nan')
+    value = register.cached_value
+    return float('nan') if value is None else value
+
+
+def export_columns(nodes):
+    """Return the last known values of nodes as parallel NumPy arrays.
+
+    Returns a dict with an array per name in COLUMNS, one element per node.
+    node_id and module_type are integer arrays, the register columns are
+    float arrays with NaN where a node has no such register or no value.
+    No bus access is done, sweep first for current values.
+    """
+    numpy = _numpy()
+    nodes = list(nodes)
+    count = len(nodes)
+    columns = {
+        'node_id': numpy.fromiter((node.node_id for node in nodes),
+                                  numpy.uint16, count),
+        'module_type': numpy.fromiter((node.node_type.value
+                                       for node in nodes),
+                                      numpy.uint8, count),
+    }
+    for column, key in _REGISTER_COLUMNS:
+        columns[column] = numpy.fromiter(
+            (_cached_value(node, key) for node in nodes),
+            numpy.float64, count)
+    return columns
+
+
+def sweep_columns(box):
+    """Sweep DucoBox box and return its nodes as with export_columns."""
+    box.sweep()
+    return export_columns(box.node_list)
@@ -2,9 +2,13 @@
 """Command line tool that wraps Python Duco."""
 import logging
 import argparse
-from duco.const import (PROJECT_PACKAGE_NAME)
+from duco.const import (PROJECT_PACKAGE_NAME,
+                        DUCO_MODBUS_MASTER_DEFAULT_UNIT_ID)
 from duco.enum_types import (ModuleType, ZoneAction)
 from duco.duco import (DucoBox)
+from duco.modbus import (create_client_config, ModbusHub)
+from duco.proxy import (ModbusProxy)
+from duco.rest import (RestApi)
 
 
 _LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
@@ -34,6 +38,13 @@ def parse_args():
     description = 'Command line interface to Duco Ventilation System'
     parser = argparse.ArgumentParser(description=description)
 
+    parser.add_argument('command', nargs='?', default='list',
+                        choices=['list', 'proxy', 'serve'],
+                        help='list: print the Duco node tree (default); '
+                        'proxy: serve the bus as a caching Modbus TCP '
+                        'endpoint; serve: serve the node tree as a '
+                        'REST/JSON API')
+
     parser.add_argument('--type', dest='modbus_type',
                         default='serial', help='modbus client type; '
                         'supported: serial, tcp')
@@ -45,15 +56,66 @@ def parse_args():
                         default='localhost',
                         help='optional, modbus tcp host')
 
+    parser.add_argument('--listen-host', dest='listen_host',
+                        default='localhost',
+                        help='optional, address the proxy or API '
+                        'listens on')
+
+    parser.add_argument('--listen-port', dest='listen_port', type=int,
+                        help='optional, port the proxy (default 5020) '
+                        'or API (default 8080) listens on')
+
+    parser.add_argument('--interval', dest='interval', type=float,
+                        default=10,
+                        help='optional, seconds between sweeps of the API')
+
     return parser.parse_args()
 
 
+def run_proxy(args):
+    """Serve the Modbus bus as a caching Modbus TCP endpoint."""
+    hub = ModbusHub(create_client_config(args.modbus_type, args.modbus_port,
+                                         args.modbus_host,
+                                         DUCO_MODBUS_MASTER_DEFAULT_UNIT_ID))
+    hub.setup()
+    proxy = ModbusProxy(hub, args.listen_host, args.listen_port or 5020)
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.shutdown()
+        hub.close()
+
+
+def run_api(args):
+    """Serve the node tree as a REST/JSON API."""
+    with DucoBox(args.modbus_type, args.modbus_port,
+                 args.modbus_host) as duco_box:
+        api = RestApi([duco_box], args.listen_host,
+                      args.listen_port or 8080, args.interval)
+        api.refresh()
+        try:
+            api.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            api.shutdown()
+
+
 def main():
     """Execute main function."""
     args = parse_args()
 
     configure_logging()
 
+    if args.command == 'proxy':
+        run_proxy(args)
+        return
+    if args.command == 'serve':
+        run_api(args)
+        return
+
     with DucoBox(args.modbus_type, args.modbus_port,
                  args.modbus_host) as duco_box:
         for node in duco_box.node_list:
@@ -127,6 +127,10 @@ DUCO_RH_DELTA_ON = 1
 DUCO_FLOW_MIN = 20
 DUCO_FLOW_RES = 5
 DUCO_FLOW_MAX = 200
+# duco manual time in minutes, limited by the 16 bit register
+DUCO_MANUAL_TIME_MIN = 0
+DUCO_MANUAL_TIME_RES = 1
+DUCO_MANUAL_TIME_MAX = 0xFFFF
 # duco auto min/max
 # only auto defaults, use setpoint min, res, max
 DUCO_FAN_SETPOINT_AUTO_MIN_DEFAULT = 10
@@ -0,0 +1,197 @@
+"""Deadline driven control loops on top of a DucoBox."""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+from duco.modbus import (REGISTER_TYPE_HOLDING, is_error_response)
+from duco.registers import (COMMAND_SPECS)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+# cycles: number of executed cycles, misses: cycles that overran their
+# deadline, mean_jitter/max_jitter: start delay in seconds after the
+# scheduled time, last_duration: seconds of the last cycle
+LoopStats = namedtuple('LoopStats', [
+    'cycles', 'misses', 'mean_jitter', 'max_jitter', 'last_duration'])
+
+
+def flush_writes(hub, writes, elided=None):
+    """Write the {register: raw value} writes to hub in one batch.
+
+    Writes are elided and committed like ModbusRegister.write, adjacent
+    holding registers share one write request. Raises TypeError, before
+    anything is written, when a register is not a holding register.
+    Returns the list of registers that were written successfully, the
+    registers whose write was elided are appended to the list elided.
+    """
+    for register in writes:
+        if register.spec.register_type != REGISTER_TYPE_HOLDING:
+            raise TypeError("Register must be of type HOLDING")
+    pending = []
+    for register, value in writes.items():
+        command = register.spec in COMMAND_SPECS
+        if not command and register.elides(value):
+            if elided is not None:
+                elided.append(register)
+            continue
+        pending.append((register.address, register, value, command))
+    pending.sort(key=lambda write: write[0])
+
+    written = []
+    start = 0
+    while start < len(pending):
+        end = start + 1
+        while (end < len(pending) and
+               pending[end][0] == pending[end - 1][0] + 1):
+            end += 1
+        group = pending[start:end]
+        if len(group) == 1:
+            result = hub.write_register(group[0][0], group[0][2])
+        else:
+            result = hub.write_registers(
+                group[0][0], [value for _, _, value, _ in group])
+        if is_error_response(result):
+            _LOGGER.error("Write to modbus registers %s-%s failed",
+                          group[0][0], group[-1][0])
+        else:
+            for _, register, value, command in group:
+                if not command:
+                    register.commit_write(value)
+                written.append(register)
+        start = end
+    return written
+
+
+class ControlCycle:
+    """Inputs and collected writes of one control loop cycle."""
+
+    def __init__(self, now, updated):
+        """Initialize ControlCycle."""
+        self.now = now
+        self.updated = updated
+        self._writes = {}
+
+    def write(self, register, value):
+        """Write the raw value to register at the end of the cycle.
+
+        The last value written to a register within a cycle wins.
+        """
+        self._writes[register] = value
+
+    @property
+    def writes(self):
+        """Return the {register: value} writes of the cycle."""
+        return dict(self._writes)
+
+
+class ControlLoop:
+    """Run a step function at a fixed period.
+
+    Every cycle reads the input registers with one coalesced read, calls
+    step with a ControlCycle and flushes the writes of the step in one
+    batch, adjacent holding registers share one write request. Deadlines
+    that were missed are skipped instead of run late in a burst.
+    """
+
+    def __init__(self, hub, registers, step, period):
+        """Initialize ControlLoop.
+
+        Args:
+            hub (:obj:`ModbusHub`): hub the registers belong to.
+            registers (:obj:`list` of :obj:`ModbusRegister`): inputs read
+                at the start of every cycle.
+            step (callable): called with the ControlCycle of every cycle.
+            period (float): seconds between the starts of two cycles.
+
+        """
+        if period <= 0:
+            raise ValueError("period must be > 0")
+        self._hub = hub
+        self._registers = list(registers)
+        self._step = step
+        self._period = period
+        self._cycles = 0
+        self._misses = 0
+        self._total_jitter = 0.0
+        self._max_jitter = 0.0
+        self._last_duration = 0.0
+        self._stop_event = None
+        self._thread = None
+
+    @property
+    def period(self):
+        """Return the period of the loop in seconds."""
+        return self._period
+
+    @property
+    def stats(self):
+        """Return the LoopStats of the loop."""
+        mean = self._total_jitter / self._cycles if self._cycles else 0.0
+        return LoopStats(self._cycles, self._misses, mean,
+                         self._max_jitter, self._last_duration)
+
+    def run_cycle(self, now=None):
+        """Read the inputs, run step and flush its writes once."""
+        now = time.time() if now is None else now
+        results = self._hub.read_many(
+            (register.spec.register_type, register.address,
+             register.spec.count) for register in self._registers)
+        updated = []
+        for register, words in zip(self._registers, results):
+            if words is not None:
+                register.decode(words)
+                updated.append(register)
+        cycle = ControlCycle(now, updated)
+        self._step(cycle)
+        return self.flush(cycle.writes)
+
+    def flush(self, writes):
+        """Write the {register: raw value} writes in one batch.
+
+        Returns the list of registers that were written successfully.
+        """
+        return flush_writes(self._hub, writes)
+
+    def run(self, stop_event):
+        """Run cycles until threading.Event stop_event is set."""
+        deadline = time.monotonic()
+        while not stop_event.is_set():
+            start = time.monotonic()
+            jitter = start - deadline
+            try:
+                self.run_cycle()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Control loop cycle failed")
+            end = time.monotonic()
+            self._cycles += 1
+            self._total_jitter += jitter
+            self._max_jitter = max(self._max_jitter, jitter)
+            self._last_duration = end - start
+            deadline += self._period
+            if end > deadline:
+                missed = int((end - deadline) // self._period) + 1
+                self._misses += 1
+                _LOGGER.warning("Control loop overran its deadline, "
+                                "skipping %d cycles", missed)
+                deadline += missed * self._period
+            stop_event.wait(max(0.0, deadline - time.monotonic()))
+
+    def start(self):
+        """Run the loop in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self.run,
+                                        args=(self._stop_event,),
+                                        name='duco-control', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
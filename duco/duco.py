@@ -1,22 +1,48 @@
 """Duco."""
+import bisect
 import logging
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from duco.const import (
     PROJECT_PACKAGE_NAME,
     DUCO_REG_ADDR_INPUT_MODULE_TYPE,
+    DUCO_REG_ADDR_NODE_ID_OFFSET,
     DUCO_MODBUS_MASTER_DEFAULT_UNIT_ID
 )
 
-from duco.enum_types import (ModuleType)
+from duco.control import (ControlLoop, flush_writes)
+from duco.enum_types import (ModuleType, ZoneAction)
 from duco.helpers import (to_register_addr)
 from duco.modbus import (
     create_client_config,
-    ModbusHub
+    ModbusHub,
+    ModbusConnectionError,
+    is_error_response,
+    REGISTER_TYPE_INPUT,
+    CONF_TYPE,
+    CONF_WRITE_ELISION,
+    CONF_VERIFY_WRITES,
+    CONF_CACHE_TTL
 )
-from duco.nodes import (Node)
+from duco.nodes import (Node, to_action_value)
+from duco.registers import (RegisterIndex, COMMAND_SPECS)
+from duco.zones import (ZoneIndex)
 
 _LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
 
+# result of a bulk action on one node
+ActionResult = namedtuple('ActionResult', ['node_id', 'success', 'error'])
+
+# change of the node tree, old_type/new_type are None if not applicable
+TopologyEvent = namedtuple('TopologyEvent',
+                           ['kind', 'node_id', 'old_type', 'new_type'])
+TOPOLOGY_NODE_ADDED = 'added'
+TOPOLOGY_NODE_REMOVED = 'removed'
+TOPOLOGY_NODE_TYPE_CHANGED = 'type_changed'
+
 
 class DucoBox:
     """The summary line for a class docstring should fit on one line.
@@ -37,7 +63,9 @@ class DucoBox:
 
     def __init__(self, modbus_client_type, modbus_client_port,
                  modbus_client_host=None,
-                 modbus_master_unit_id=DUCO_MODBUS_MASTER_DEFAULT_UNIT_ID):
+                 modbus_master_unit_id=DUCO_MODBUS_MASTER_DEFAULT_UNIT_ID,
+                 write_elision=True, verify_writes=False, cache_ttl=0,
+                 discover_on_enter=True, modbus_hub=None):
         """Initialize DucoBox.
 
         The __init__ method may be documented in either the class level
@@ -54,54 +82,360 @@ class DucoBox:
             param2 (:obj:`int`, optional): Description of `param2`. Multiple
                 lines are supported.
             param3 (:obj:`list` of :obj:`str`): Description of `param3`.
+            write_elision (bool): skip writes of the known register value
+                while it is younger than cache_ttl.
+            verify_writes (bool): verify writes on the next read back.
+            cache_ttl (float): seconds a register value is served from
+                cache, 0 reads the bus on every access.
+            discover_on_enter (bool): enumerate the node tree on enter,
+                otherwise iterate discover() to stream the nodes.
+            modbus_hub (:obj:`ModbusHub`, optional): hub shared with other
+                boxes on the same line, the box addresses its unit id
+                through it and leaves closing the hub to its owner.
 
         """
         client_config = create_client_config(modbus_client_type,
                                              modbus_client_port,
                                              modbus_client_host,
                                              modbus_master_unit_id)
-        self._modbus_hub = ModbusHub(client_config)
+        client_config[CONF_WRITE_ELISION] = write_elision
+        client_config[CONF_VERIFY_WRITES] = verify_writes
+        client_config[CONF_CACHE_TTL] = cache_ttl
+        self._client_config = client_config
+        if modbus_hub is None:
+            self._modbus_hub = ModbusHub(client_config)
+        else:
+            self._modbus_hub = modbus_hub.unit_view(modbus_master_unit_id)
+            self._modbus_hub.write_elision = write_elision
+            self._modbus_hub.verify_writes = verify_writes
+            self._modbus_hub.cache_ttl = cache_ttl
+        self._modbus_hub.add_resume_listener(self.__resume)
+        self._catch_up_thread = None
+        # additional connections used for bulk actions
+        self._connection_pool = []
+        self._discover_on_enter = discover_on_enter
         self.node_list = list()
+        self.register_index = RegisterIndex()
+        self.zone_index = ZoneIndex()
+        # topology watch
+        self._topology_listeners = []
+        self._topology_misses = {}
+        self._topology_stop = None
+        self._topology_thread = None
 
     def __enter__(self):
         """Enter."""
         self._modbus_hub.setup()
-        self.__enumerate_node_tree()
+        if self._discover_on_enter:
+            for _ in self.discover():
+                pass
         return self
 
     def __exit__(self, exc_type, _exc_value, traceback):
         """Exit."""
+        self.stop_topology_watch()
+        self._modbus_hub.remove_resume_listener(self.__resume)
+        thread = self._catch_up_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._catch_up_thread = None
+        for hub in self._connection_pool:
+            hub.close()
+        self._connection_pool = []
         self._modbus_hub.close()
 
-    def __enumerate_node_tree(self):
-        """Enumerate Duco node tree."""
-        node_id = 1
-        node_found = True
+    def __resume(self):
+        """Catch up on values missed while the connection was down."""
+        thread = self._catch_up_thread
+        if thread is not None and thread.is_alive():
+            return
+        self._catch_up_thread = threading.Thread(
+            target=self.sweep, name='duco-catch-up', daemon=True)
+        self._catch_up_thread.start()
+
+    def readable_registers(self):
+        """Return the registers of all nodes except write-only commands."""
+        return [register for node in list(self.node_list)
+                for register in node.registers
+                if register.spec not in COMMAND_SPECS]
+
+    def sweep(self):
+        """Update all readable registers of all nodes.
+
+        The registers are read with ModbusHub.read_many, so adjacent
+        registers share a single request. Returns a list of the registers
+        that were updated successfully.
+        """
+        registers = self.readable_registers()
+        results = self._modbus_hub.read_many(
+            (register.spec.register_type, register.address,
+             register.spec.count) for register in registers)
+        updated = []
+        for register, words in zip(registers, results):
+            if words is None:
+                _LOGGER.error("No response from modbus register %s",
+                              register.address)
+                continue
+            register.decode(words)
+            updated.append(register)
+        self.zone_index.apply(updated)
+        return updated
+
+    def control_loop(self, step, period, registers=None):
+        """Return a ControlLoop that runs step every period seconds.
+
+        The loop reads registers, by default all readable registers of
+        all nodes, at the start of every cycle. Call start() on the loop to
+        run it in the background.
+        """
+        if registers is None:
+            registers = self.readable_registers()
+        return ControlLoop(self._modbus_hub, registers, step, period)
+
+    def write_batch(self, writes, elided=None):
+        """Write the {register: raw value} writes in one batch.
+
+        Returns the list of registers that were written successfully, the
+        registers whose write was elided are appended to the list elided.
+        """
+        written = flush_writes(self._modbus_hub, writes, elided)
+        self.zone_index.apply(written)
+        return written
+
+    def set_zone_action(self, zone_id, action):
+        """Apply action to all nodes of zone zone_id.
+
+        Zone wide actions are written to a single node of the zone, node
+        visibility actions to every node of the zone. Returns the list of
+        node ids that were written.
+        """
+        value = to_action_value(action)
+        nodes = self.zone_index.nodes(zone_id)
+        if not nodes:
+            raise ValueError("Unknown zone: {}".format(zone_id))
+        if value not in (to_action_value(ZoneAction.NODE_VISIBILITY_OFF),
+                         to_action_value(ZoneAction.NODE_VISIBILITY_ON)):
+            nodes = nodes[:1]
+        written = []
+        for node in nodes:
+            if node.register('action').write(value, force=True):
+                written.append(node.node_id)
+        return written
+
+    def apply_action(self, nodes, action, connections=4):
+        """Apply action to every node in nodes.
+
+        The action is validated once. On network transports the writes are
+        spread over up to connections pooled connections, on serial they
+        are written one after the other. Returns a list of ActionResult,
+        one per node in order of nodes.
+        """
+        value = to_action_value(action)
+        nodes = list(nodes)
+        hubs = self.__get_connections(min(connections, len(nodes)))
+        if len(hubs) <= 1:
+            return [self.__write_action(self._modbus_hub, node, value)
+                    for node in nodes]
+
+        idle = queue.Queue()
+        for hub in hubs:
+            idle.put(hub)
+
+        def write(node):
+            hub = idle.get()
+            try:
+                return self.__write_action(hub, node, value)
+            finally:
+                idle.put(hub)
+
+        with ThreadPoolExecutor(max_workers=len(hubs)) as executor:
+            return list(executor.map(write, nodes))
+
+    def __get_connections(self, count):
+        """Return count connected hubs, including the main hub."""
+        if self._client_config[CONF_TYPE] == 'serial':
+            return [self._modbus_hub]
+        while len(self._connection_pool) < count - 1:
+            hub = self._modbus_hub.spawn()
+            hub.setup()
+            self._connection_pool.append(hub)
+        return [self._modbus_hub] + self._connection_pool[:max(0, count - 1)]
+
+    @staticmethod
+    def __write_action(hub, node, value):
+        """Write action value to node through hub, return ActionResult."""
+        address = node.register('action').address
+        try:
+            result = hub.write_register(address, value)
+        except Exception as exc:  # pylint: disable=broad-except
+            return ActionResult(node.node_id, False, str(exc))
+        if is_error_response(result):
+            return ActionResult(node.node_id, False, str(result))
+        return ActionResult(node.node_id, True, None)
+
+    def add_topology_listener(self, callback):
+        """Call callback with a TopologyEvent for every topology change."""
+        self._topology_listeners.append(callback)
+
+    def check_topology(self, lookahead=3, miss_limit=2):
+        """Detect added, removed and replaced nodes.
+
+        The module type registers of all ids up to the highest known id
+        and of the lookahead ids past it are probed, in as few requests as
+        possible. A known node is removed after miss_limit consecutive
+        probes without a valid response. The check is skipped while the
+        connection is down, so an outage does not count as a miss. Changes
+        are applied to node_list and the indexes in place, nodes that did
+        not change are kept as they are.
+
+        Returns the list of TopologyEvent that were applied.
+        """
+        known = {node.node_id: node for node in self.node_list}
+        last_id = max(known) if known else 0
+        # the ids past the last node are usually empty, they are not merged
+        # so their failures do not fail the probes of the known ids
+        node_ids = list(range(1, last_id + lookahead + 1))
+        try:
+            node_types = (
+                self.__probe_node_ids(node_ids[:last_id],
+                                      DUCO_REG_ADDR_NODE_ID_OFFSET - 1) +
+                self.__probe_node_ids(node_ids[last_id:]))
+        except ModbusConnectionError:
+            _LOGGER.debug("Modbus connection down, topology not checked")
+            return []
+        events = []
+        for node_id, node_type in zip(node_ids, node_types):
+            node = known.get(node_id)
+            if node is None:
+                if node_type is not False:
+                    events.append(TopologyEvent(TOPOLOGY_NODE_ADDED, node_id,
+                                                None, node_type))
+            elif node_type is False:
+                misses = self._topology_misses.get(node_id, 0) + 1
+                self._topology_misses[node_id] = misses
+                if misses >= miss_limit:
+                    events.append(TopologyEvent(TOPOLOGY_NODE_REMOVED,
+                                                node_id, node.node_type,
+                                                None))
+            else:
+                self._topology_misses.pop(node_id, None)
+                if node_type != node.node_type:
+                    events.append(TopologyEvent(TOPOLOGY_NODE_TYPE_CHANGED,
+                                                node_id, node.node_type,
+                                                node_type))
+
+        applied = [event for event in events if self.__apply_topology(event)]
+        for event in applied:
+            _LOGGER.info("node_id %d %s", event.node_id, event.kind)
+            for callback in self._topology_listeners:
+                callback(event)
+        return applied
+
+    def __apply_topology(self, event):
+        """Apply TopologyEvent event to the node tree and indexes."""
+        node_ids = [node.node_id for node in self.node_list]
+        position = bisect.bisect_left(node_ids, event.node_id)
+        new_node = None
+        if event.new_type is not None:
+            try:
+                new_node = Node.factory(event.node_id, event.new_type,
+                                        self._modbus_hub)
+            except ValueError:
+                _LOGGER.warning("node_id %d: %s not supported",
+                                event.node_id, event.new_type)
+                return False
+
+        if event.old_type is not None:
+            old_node = self.node_list.pop(position)
+            self.register_index.remove_node(old_node)
+            self.zone_index.remove_node(old_node)
+            self._topology_misses.pop(event.node_id, None)
+        if new_node is not None:
+            self.node_list.insert(position, new_node)
+            self.register_index.add_node(new_node)
+            self.zone_index.add_node(new_node)
+        return True
+
+    def start_topology_watch(self, interval=60, lookahead=3):
+        """Check the topology every interval seconds in the background."""
+        if self._topology_thread is not None:
+            return
+        self._topology_stop = threading.Event()
+
+        def watch(stop):
+            while not stop.wait(interval):
+                try:
+                    self.check_topology(lookahead)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Topology check failed")
+
+        self._topology_thread = threading.Thread(
+            target=watch, args=(self._topology_stop,),
+            name='duco-topology', daemon=True)
+        self._topology_thread.start()
+
+    def stop_topology_watch(self):
+        """Stop the background topology watch."""
+        if self._topology_thread is None:
+            return
+        self._topology_stop.set()
+        self._topology_thread.join()
+        self._topology_thread = None
+
+    def discover(self):
+        """Enumerate the Duco node tree.
+
+        Yields each Node as soon as it is identified, after it was added to
+        node_list and the indexes, so it can be read while the next node
+        ids are still being probed.
+        """
         self.node_list = list()
+        self.register_index.clear()
+        self.zone_index.build(self.node_list)
+        node_id = 1
 
-        while node_found:
+        while True:
             node_type = self.__probe_node_id(node_id)
-
             if node_type is False:
-                node_found = False
-            else:
-                self.node_list.append(
-                    Node.factory(node_id, node_type, self._modbus_hub))
+                return
+
+            node = Node.factory(node_id, node_type, self._modbus_hub)
+            self.node_list.append(node)
+            self.register_index.add_node(node)
+            self.zone_index.add_node(node)
+            yield node
 
             node_id = node_id + 1
 
+    def __probe_node_ids(self, node_ids, max_gap=0):
+        """Probe Modbus for the module types of node_ids in one batch."""
+        if not node_ids:
+            return []
+        results = self._modbus_hub.read_many(
+            [(REGISTER_TYPE_INPUT,
+              to_register_addr(node_id, DUCO_REG_ADDR_INPUT_MODULE_TYPE), 1)
+             for node_id in node_ids], max_gap=max_gap, strict=True)
+        return [self.__to_module_type(node_id, words)
+                for node_id, words in zip(node_ids, results)]
+
     def __probe_node_id(self, node_id):
         """Probe Modbus for node_id module type."""
         _LOGGER.debug("probe node_id %d", node_id)
         modbus_result = self._modbus_hub.read_input_registers(
             to_register_addr(node_id, DUCO_REG_ADDR_INPUT_MODULE_TYPE), 1)
         try:
-            register = modbus_result.registers
-            response = register[0]
+            words = modbus_result.registers
         except AttributeError:
+            words = None
+        return self.__to_module_type(node_id, words)
+
+    @staticmethod
+    def __to_module_type(node_id, words):
+        """Return the ModuleType in the words read for node_id, or False."""
+        if not words:
             _LOGGER.debug("No response from node_id %d", node_id)
             return False
-
+        response = words[0]
         if ModuleType.supported(response):
             module_type = ModuleType(response)
             _LOGGER.debug("node_id %d is a module of type %s",
@@ -0,0 +1,209 @@
+"""Multi-core polling of a fleet of Duco boxes."""
+import logging
+import multiprocessing
+import queue
+import struct
+import time
+from collections import namedtuple
+
+from duco.const import (
+    PROJECT_PACKAGE_NAME,
+    DUCO_MODBUS_MASTER_DEFAULT_UNIT_ID
+)
+from duco.duco import (DucoBox)
+from duco.modbus import (ModbusHub, create_client_config)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+# box_index, node_id, register_id, value, timestamp
+READING_STRUCT = struct.Struct('<HHBdd')
+
+
+class BoxConfig(namedtuple('BoxConfig', [
+        'modbus_client_type', 'modbus_client_port', 'modbus_client_host',
+        'modbus_master_unit_id'])):
+    """Arguments needed to create a DucoBox in a worker process."""
+
+    __slots__ = ()
+
+    def __new__(cls, modbus_client_type, modbus_client_port,
+                modbus_client_host=None,
+                modbus_master_unit_id=DUCO_MODBUS_MASTER_DEFAULT_UNIT_ID):
+        """Create BoxConfig, host and unit id are optional."""
+        return super().__new__(cls, modbus_client_type, modbus_client_port,
+                               modbus_client_host, modbus_master_unit_id)
+
+    @property
+    def endpoint(self):
+        """Return the transport endpoint the box is reached through."""
+        return (self.modbus_client_type, self.modbus_client_host,
+                self.modbus_client_port)
+
+
+def shard_boxes(box_configs, n_shards):
+    """Distribute box_configs over n_shards.
+
+    Boxes behind the same endpoint (serial port or gateway) end up in the
+    same shard as the endpoint can only be owned by one process. Endpoints
+    are assigned largest first to the least loaded shard. Returns a list of
+    shards, each a list of (box_index, box_config) tuples.
+    """
+    endpoints = {}
+    for box_index, config in enumerate(box_configs):
+        endpoints.setdefault(config.endpoint, []).append((box_index, config))
+
+    shards = [[] for _ in range(max(1, int(n_shards)))]
+    for group in sorted(endpoints.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return [shard for shard in shards if shard]
+
+
+def pack_readings(box_index, registers):
+    """Pack the last values of registers into a compact byte string."""
+    pack = READING_STRUCT.pack
+    return b''.join(
+        pack(box_index, register.node_id, register.spec.register_id,
+             register.cached_value, register.timestamp)
+        for register in registers if register.cached_value is not None)
+
+
+def _poll_worker(shard, interval, results, stop_event):
+    """Poll the boxes of shard until stop_event is set.
+
+    Runs in a worker process, each sweep is sent to the parent as one
+    packed byte string.
+    """
+    boxes = []
+    hubs = {}
+    try:
+        for box_index, config in shard:
+            # boxes behind one endpoint share its connection
+            hub = hubs.get(config.endpoint)
+            if hub is None:
+                hub = ModbusHub(create_client_config(
+                    config.modbus_client_type, config.modbus_client_port,
+                    config.modbus_client_host,
+                    config.modbus_master_unit_id))
+                hubs[config.endpoint] = hub
+            box = DucoBox(*config, modbus_hub=hub)
+            try:
+                box.__enter__()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unable to open box %d", box_index)
+                continue
+            boxes.append((box_index, box))
+
+        while not stop_event.is_set():
+            start = time.monotonic()
+            results.put(b''.join(pack_readings(box_index, box.sweep())
+                                 for box_index, box in boxes))
+            stop_event.wait(max(0, interval - (time.monotonic() - start)))
+    finally:
+        for _, box in boxes:
+            box.__exit__(None, None, None)
+        for hub in hubs.values():
+            if hub.is_set_up:
+                hub.close()
+
+
+class FleetPoller:
+    """Poll a fleet of Duco boxes with a pool of worker processes.
+
+    Boxes are sharded over the workers, every worker owns the ModbusHubs
+    and DucoBoxes of its shard and streams packed sweeps back to the parent,
+    where they are merged into one view keyed by
+    (box_index, node_id, register_id).
+    """
+
+    def __init__(self, box_configs, processes=None, interval=10):
+        """Initialize FleetPoller.
+
+        Args:
+            box_configs (:obj:`list` of :obj:`BoxConfig`): boxes to poll,
+                box_index is the position in this list.
+            processes (:obj:`int`, optional): number of worker processes,
+                defaults to the number of cores.
+            interval (float): seconds between sweeps of a worker.
+
+        """
+        self._box_configs = list(box_configs)
+        self._processes = processes or multiprocessing.cpu_count()
+        self._interval = interval
+        self._results = None
+        self._stop_event = None
+        self._workers = []
+        self._values = {}
+
+    def __enter__(self):
+        """Enter."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, _exc_value, traceback):
+        """Exit."""
+        self.stop()
+
+    @property
+    def values(self):
+        """Return the merged view of the fleet.
+
+        Maps (box_index, node_id, register_id) to (value, timestamp).
+        """
+        return self._values
+
+    def start(self):
+        """Start the worker processes."""
+        self._results = multiprocessing.Queue()
+        self._stop_event = multiprocessing.Event()
+        for shard in shard_boxes(self._box_configs, self._processes):
+            worker = multiprocessing.Process(
+                target=_poll_worker,
+                args=(shard, self._interval, self._results,
+                      self._stop_event),
+                daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """Stop the worker processes."""
+        if self._stop_event is not None:
+            self._stop_event.set()
+        deadline = time.monotonic() + self._interval + 5
+        for worker in self._workers:
+            # a worker only exits once its queued sweeps are consumed
+            while worker.is_alive() and time.monotonic() < deadline:
+                self.poll(0)
+                worker.join(0.1)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+
+    def merge(self, data):
+        """Merge one packed sweep into the view.
+
+        Returns the number of merged readings.
+        """
+        values = self._values
+        count = 0
+        for (box_index, node_id, register_id,
+             value, timestamp) in READING_STRUCT.iter_unpack(data):
+            values[(box_index, node_id, register_id)] = (value, timestamp)
+            count += 1
+        return count
+
+    def poll(self, timeout=None):
+        """Merge all sweeps that arrived from the workers.
+
+        Blocks up to timeout seconds for the first sweep. Returns the number
+        of merged readings.
+        """
+        count = 0
+        block = timeout is None or timeout > 0
+        try:
+            data = self._results.get(block, timeout)
+            while True:
+                count += self.merge(data)
+                data = self._results.get_nowait()
+        except queue.Empty:
+            pass
+        return count
@@ -1,10 +1,19 @@
 """Support for Modbus."""
 import logging
+import queue
+import random
 import struct
 import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
 
+from pymodbus.exceptions import (ConnectionException, ModbusIOException)
+
+from duco.capture import (CaptureWriter, ReplayClient)
 from duco.const import (
     PROJECT_PACKAGE_NAME,
+    DUCO_REG_ADDR_NODE_ID_OFFSET,
     DUCO_MODBUS_BAUD_RATE,
     DUCO_MODBUS_BYTE_SIZE,
     DUCO_MODBUS_STOP_BITS,
@@ -26,6 +35,14 @@ CONF_STOPBITS = 'stopbits'
 CONF_TYPE = 'type'
 CONF_PARITY = 'parity'
 CONF_TIMEOUT = 'timeout'
+CONF_WRITE_ELISION = 'write_elision'
+CONF_VERIFY_WRITES = 'verify_writes'
+CONF_CACHE_TTL = 'cache_ttl'
+CONF_RECONNECT_DELAY = 'reconnect_delay'
+CONF_RECONNECT_MAX_DELAY = 'reconnect_max_delay'
+CONF_REPLAY_SPEED = 'replay_speed'
+CONF_MAX_REQUESTS_PER_SECOND = 'max_requests_per_second'
+CONF_MAX_REGISTERS_PER_SECOND = 'max_registers_per_second'
 
 REGISTER_TYPE_HOLDING = 'holding'
 REGISTER_TYPE_INPUT = 'input'
@@ -33,6 +50,23 @@ REGISTER_TYPE_INPUT = 'input'
 DATA_TYPE_INT = 'int'
 DATA_TYPE_FLOAT = 'float'
 
+# Modbus limit of registers per read request
+MAX_READ_COUNT = 125
+
+_READ_FUNCTIONS = {
+    REGISTER_TYPE_INPUT: 'read_input_registers',
+    REGISTER_TYPE_HOLDING: 'read_holding_registers',
+}
+
+
+class ModbusConnectionError(ConnectionError):
+    """The connection to the Modbus network failed or is backing off."""
+
+
+# client errors that mean the connection is lost, other errors such as
+# invalid arguments leave the connection as it is
+_CONNECTION_ERRORS = (ConnectionException, ModbusIOException, OSError)
+
 
 def create_client_config(modbus_client_type, modbus_client_port,
                          modbus_client_host=None, modbus_master_unit_id=0):
@@ -50,25 +84,140 @@ def create_client_config(modbus_client_type, modbus_client_port,
         config[CONF_PARITY] = DUCO_MODBUS_PARITY
     elif modbus_client_type == 'tcp':
         config[CONF_HOST] = str(modbus_client_host)
-    else:
-        raise ValueError("modbus_client_type must be serial or tcp")
+    elif modbus_client_type != 'replay':
+        raise ValueError("modbus_client_type must be serial, tcp or replay")
 
     return config
 
 
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second up to burst.
+
+    A reservation always succeeds and may leave the bucket in debt, the
+    returned wait time makes the caller pay it off, so reservations are
+    served in order and large requests are not starved by small ones.
+    """
+
+    __slots__ = ('rate', 'burst', '_tokens', '_time')
+
+    def __init__(self, rate, burst=None):
+        """Initialize a full TokenBucket."""
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._time = time.monotonic()
+
+    def reserve(self, tokens, now=None):
+        """Take tokens, return the seconds to wait before using them."""
+        now = time.monotonic() if now is None else now
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._time) * self.rate)
+        self._time = now
+        self._tokens -= tokens
+        return max(0.0, -self._tokens / self.rate)
+
+
+class _FairLock:
+    """Lock that is granted in the order it was requested."""
+
+    def __init__(self):
+        """Initialize an unlocked _FairLock."""
+        self._condition = threading.Condition(threading.Lock())
+        self._next_ticket = 0
+        self._serving = 0
+
+    def __enter__(self):
+        """Acquire the lock."""
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, _exc_value, traceback):
+        """Release the lock."""
+        self.release()
+
+    def acquire(self):
+        """Wait until all earlier requests released the lock."""
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._condition.wait()
+
+    def release(self):
+        """Release the lock to the next request."""
+        with self._condition:
+            self._serving += 1
+            self._condition.notify_all()
+
+
+class _BusState:
+    """Rate limits and capture shared by the hubs of one bus."""
+
+    def __init__(self):
+        """Initialize _BusState without limits and capture."""
+        # unit, None for the whole bus -> buckets of requests and registers
+        self.limits = {}
+        # unit -> [throttled requests, throttled seconds]
+        self.throttled = {}
+        self.limit_lock = threading.Lock()
+        self.capture = None
+        self.capture_lock = threading.Lock()
+
+
 class ModbusHub:
-    """Thread safe wrapper class for pymodbus."""
+    """Thread safe wrapper class for pymodbus.
+
+    A hub can serve several unit ids on one line, every method accepts a
+    unit that defaults to the master unit id of the configuration.
+    Transactions are executed in arrival order so no unit is starved.
+    """
+
+    def __init__(self, client_config, bus_state=None):
+        """Initialize the modbus hub.
 
-    def __init__(self, client_config):
-        """Initialize the modbus hub."""
+        bus_state is the state shared with the hub this one was spawned
+        from, see spawn().
+        """
         # generic configuration
         self._client = None
+        self._client_config = dict(client_config)
         self._kwargs = {'unit': client_config[CONF_MASTER_UNIT_ID]}
-        self._lock = threading.Lock()
+        self._lock = _FairLock()
+        # reads in flight: (function, address, count, unit) -> Future
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # I/O worker, owns the client while running
+        self._requests = None
+        self._worker = None
+        # serializes queueing requests with stopping the worker
+        self._worker_lock = threading.Lock()
+        # reconnect state, None until the first transaction
+        self._connected = None
+        self._retry_at = 0
+        self._retry_delay = 0
+        self._resume_listeners = []
+        # rate limits and capture, owned by the first hub of the bus
+        self._owns_bus = bus_state is None
+        self._bus = _BusState() if bus_state is None else bus_state
+        if self._owns_bus and (
+                client_config.get(CONF_MAX_REQUESTS_PER_SECOND) or
+                client_config.get(CONF_MAX_REGISTERS_PER_SECOND)):
+            self.set_rate_limit(
+                client_config.get(CONF_MAX_REQUESTS_PER_SECOND),
+                client_config.get(CONF_MAX_REGISTERS_PER_SECOND))
+        self.reconnect_delay = client_config.get(CONF_RECONNECT_DELAY, 0.5)
+        self.reconnect_max_delay = client_config.get(
+            CONF_RECONNECT_MAX_DELAY, 30)
         self._config_type = client_config[CONF_TYPE]
         self._config_port = client_config[CONF_PORT]
         self._config_timeout = client_config[CONF_TIMEOUT]
         self._config_delay = 0
+        # register layer behaviour
+        self.write_elision = client_config.get(CONF_WRITE_ELISION, True)
+        self.verify_writes = client_config.get(CONF_VERIFY_WRITES, False)
+        self.cache_ttl = client_config.get(CONF_CACHE_TTL, 0)
 
         if self._config_type == "serial":
             # serial configuration
@@ -77,10 +226,46 @@ class ModbusHub:
             self._config_stopbits = client_config[CONF_STOPBITS]
             self._config_bytesize = client_config[CONF_BYTESIZE]
             self._config_parity = client_config[CONF_PARITY]
+        elif self._config_type == "replay":
+            # the port is the path of the capture file
+            self._config_replay_speed = client_config.get(CONF_REPLAY_SPEED)
         else:
             # network configuration
             self._config_host = client_config[CONF_HOST]
 
+    @property
+    def unit(self):
+        """Return the default unit id of the hub."""
+        return self._kwargs['unit']
+
+    @property
+    def is_set_up(self):
+        """Return whether setup created the pymodbus client."""
+        return self._client is not None
+
+    def unit_view(self, unit):
+        """Return a ModbusUnit that addresses unit through this hub."""
+        return ModbusUnit(self, unit)
+
+    def spawn(self, unit=None):
+        """Return an additional hub, not yet set up, on the same endpoint.
+
+        The new hub has the configuration of this hub and addresses unit,
+        by default the unit of this hub. It shares the rate limits of this
+        hub, so both count against one bus load, and records its
+        transactions in the capture of this hub.
+        """
+        client_config = dict(self._client_config)
+        client_config[CONF_MASTER_UNIT_ID] = (self.unit if unit is None
+                                              else unit)
+        hub = ModbusHub(client_config, self._bus)
+        hub.write_elision = self.write_elision
+        hub.verify_writes = self.verify_writes
+        hub.cache_ttl = self.cache_ttl
+        hub.reconnect_delay = self.reconnect_delay
+        hub.reconnect_max_delay = self.reconnect_max_delay
+        return hub
+
     def setup(self):
         """Set up pymodbus client."""
         if self._config_type == "serial":
@@ -118,152 +303,766 @@ class ModbusHub:
                 port=self._config_port,
                 timeout=self._config_timeout,
             )
+        elif self._config_type == "replay":
+            self._client = ReplayClient(self._config_port,
+                                        self._config_replay_speed)
         else:
             raise ValueError(("Unsupported config_type, must be serial, " +
-                              "tcp, udp, rtuovertcp"))
+                              "tcp, udp, rtuovertcp, replay"))
 
         # Connect device
         self.connect()
 
     def close(self):
         """Disconnect client."""
+        self.stop_worker()
         with self._lock:
             self._client.close()
+        if self._owns_bus:
+            self.stop_capture()
+
+    def start_capture(self, path):
+        """Append every transaction to the capture file path.
+
+        A capture can be served again with a hub of type replay. Hubs
+        spawned from this hub record to the same capture.
+        """
+        writer = CaptureWriter(path)
+        with self._bus.capture_lock:
+            if self._bus.capture is not None:
+                self._bus.capture.close()
+            self._bus.capture = writer
+
+    def stop_capture(self):
+        """Stop and close the capture."""
+        with self._bus.capture_lock:
+            if self._bus.capture is not None:
+                self._bus.capture.close()
+                self._bus.capture = None
+
+    def _record(self, function, address, arg, unit, result):
+        """Record a transaction in the capture, if one is running."""
+        with self._bus.capture_lock:
+            if self._bus.capture is not None:
+                self._bus.capture.record(function, address, arg, unit,
+                                         result)
 
     def connect(self):
         """Connect client."""
         with self._lock:
             self._client.connect()
 
+    def start_worker(self):
+        """Start a dedicated I/O worker thread.
+
+        While the worker runs it executes all bus transactions, the
+        blocking methods wait for it and the submit methods return a
+        Future without waiting.
+        """
+        with self._worker_lock:
+            if self._worker is not None:
+                return
+            self._requests = queue.Queue()
+            self._worker = threading.Thread(target=self._run_worker,
+                                            args=(self._requests,),
+                                            name='duco-modbus-io',
+                                            daemon=True)
+            self._worker.start()
+
+    def stop_worker(self):
+        """Stop the I/O worker after the queued requests are executed.
+
+        Requests can no longer be queued once the worker is stopping, so
+        no request is left behind the stop sentinel.
+        """
+        with self._worker_lock:
+            worker = self._worker
+            if worker is None:
+                return
+            self._requests.put(None)
+            self._worker = None
+            self._requests = None
+        worker.join()
+
+    def _run_worker(self, requests):
+        """Execute queued requests until stop_worker is called.
+
+        All requests queued at the same time form a batch. Writes of a
+        batch are executed first in submission order, then its reads
+        ordered by address and alternating between units, identical reads
+        are executed once.
+        """
+        stop = False
+        while not stop:
+            batch = [requests.get()]
+            while True:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+            writes = []
+            reads = {}
+            for request in batch:
+                if request is None:
+                    stop = True
+                    continue
+                function, address, arg, unit, future = request
+                if not future.set_running_or_notify_cancel():
+                    continue
+                key = (function, address, arg, unit)
+                if function.startswith('read_'):
+                    reads.setdefault(unit, {}).setdefault(
+                        key, []).append(future)
+                else:
+                    writes.append((key, [future]))
+            for key, futures in writes + _round_robin(reads):
+                try:
+                    result = self._execute(*key)
+                except Exception as exc:  # pylint: disable=broad-except
+                    for future in futures:
+                        future.set_exception(exc)
+                else:
+                    for future in futures:
+                        future.set_result(result)
+
+    def add_resume_listener(self, callback):
+        """Call callback without arguments when a lost connection is back."""
+        self._resume_listeners.append(callback)
+
+    def remove_resume_listener(self, callback):
+        """Stop calling callback when a lost connection is back."""
+        try:
+            self._resume_listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def set_rate_limit(self, requests_per_second=None,
+                       registers_per_second=None, unit=None):
+        """Limit the load on the bus or, with unit, on one unit.
+
+        Reads wait for their tokens, writes are never delayed but their
+        tokens are taken, so they slow down the reads that follow. Without
+        limits the rate limit of unit, or of the hub, is removed.
+        """
+        buckets = (TokenBucket(requests_per_second)
+                   if requests_per_second else None,
+                   TokenBucket(registers_per_second)
+                   if registers_per_second else None)
+        with self._bus.limit_lock:
+            if any(buckets):
+                self._bus.limits[unit] = buckets
+            else:
+                self._bus.limits.pop(unit, None)
+
+    def throttle_stats(self):
+        """Return {unit: (throttled requests, throttled seconds)}."""
+        with self._bus.limit_lock:
+            return {unit: tuple(stats)
+                    for unit, stats in self._bus.throttled.items()}
+
+    def _throttle(self, function, arg, unit):
+        """Wait until the rate limits of the hub and unit allow function."""
+        if not self._bus.limits:
+            return
+        is_read = function.startswith('read_')
+        if is_read:
+            registers = arg
+        elif function == 'write_registers':
+            registers = len(arg)
+        else:
+            registers = 1
+        wait = 0.0
+        with self._bus.limit_lock:
+            now = time.monotonic()
+            for key in (None, unit):
+                for bucket, tokens in zip(self._bus.limits.get(key, ()),
+                                          (1, registers)):
+                    if bucket is not None:
+                        wait = max(wait, bucket.reserve(tokens, now))
+            if not is_read:
+                wait = 0.0
+            if wait > 0:
+                stats = self._bus.throttled.setdefault(unit, [0, 0.0])
+                stats[0] += 1
+                stats[1] += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def _execute(self, function, address, arg, unit=None):
+        """Execute a pymodbus client function on the bus.
+
+        A transaction failing with a connection error closes the
+        connection. The next transactions fail fast until a jittered,
+        exponentially growing delay has passed, then the connection is
+        reopened. Other errors of the client are raised unchanged. The
+        resume listeners are called after the first successful transaction
+        on a reopened connection.
+        """
+        unit = self.unit if unit is None else unit
+        self._throttle(function, arg, unit)
+        with self._lock:
+            if self._connected is False:
+                if time.monotonic() < self._retry_at:
+                    raise ModbusConnectionError("Modbus connection is down")
+                self._client.connect()
+            try:
+                result = getattr(self._client, function)(address, arg,
+                                                         unit=unit)
+            except _CONNECTION_ERRORS as exc:
+                self._record(function, address, arg, unit, exc)
+                self._connection_lost()
+                raise ModbusConnectionError(str(exc)) from exc
+            except Exception as exc:
+                self._record(function, address, arg, unit, exc)
+                raise
+            self._record(function, address, arg, unit, result)
+            resumed = self._connected is False
+            self._connected = True
+            self._retry_delay = 0
+        if resumed:
+            _LOGGER.info("Modbus connection resumed")
+            for callback in list(self._resume_listeners):
+                callback()
+        return result
+
+    def _connection_lost(self):
+        """Close the client and schedule the next connection attempt."""
+        if self._connected is not False:
+            _LOGGER.warning("Modbus connection lost")
+        self._connected = False
+        self._retry_delay = min(max(2 * self._retry_delay,
+                                    self.reconnect_delay),
+                                self.reconnect_max_delay)
+        self._retry_at = (time.monotonic() +
+                          random.uniform(0.5, 1) * self._retry_delay)
+        try:
+            self._client.close()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.debug("Closing the modbus client failed")
+
+    def _call(self, function, address, arg, unit=None):
+        """Execute function, through the I/O worker if it runs."""
+        worker = self._worker
+        if worker is None or worker is threading.current_thread():
+            return self._execute(function, address, arg, unit)
+        try:
+            future = self.submit(function, address, arg, unit)
+        except RuntimeError:
+            # the worker stopped meanwhile
+            return self._execute(function, address, arg, unit)
+        return future.result()
+
+    def submit(self, function, address, arg, unit=None):
+        """Queue a pymodbus client function for the I/O worker.
+
+        Returns a Future of the response, e.g.
+        submit('read_input_registers', address, count).
+        """
+        future = Future()
+        with self._worker_lock:
+            if self._worker is None:
+                raise RuntimeError("I/O worker is not running")
+            self._requests.put((function, address, arg,
+                                self.unit if unit is None else unit, future))
+        return future
+
+    def submit_read_input_registers(self, address, count=1, unit=None):
+        """Queue a read of input registers, return a Future."""
+        return self.submit('read_input_registers', address, count, unit)
+
+    def submit_read_holding_registers(self, address, count=1, unit=None):
+        """Queue a read of holding registers, return a Future."""
+        return self.submit('read_holding_registers', address, count, unit)
+
+    def submit_write_register(self, address, value, unit=None):
+        """Queue a write of a register, return a Future."""
+        return self.submit('write_register', address, value, unit)
+
+    def submit_write_registers(self, address, values, unit=None):
+        """Queue a write of registers, return a Future."""
+        return self.submit('write_registers', address, values, unit)
+
+    def _read(self, function, address, count, unit=None):
+        """Execute read function, sharing the result of identical reads.
+
+        A read for the same (function, address, count, unit) that arrives
+        while one is in flight waits for and returns the result of the
+        first one.
+        """
+        unit = self.unit if unit is None else unit
+        key = (function, address, count, unit)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._call(function, address, count, unit)
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return result
+
+    def read_coils(self, address, count=1, unit=None):
+        """Read coils."""
+        return self._read('read_coils', address, count, unit)
+
+    def read_input_registers(self, address, count=1, unit=None):
+        """Read input registers."""
+        return self._read('read_input_registers', address, count, unit)
+
+    def read_holding_registers(self, address, count=1, unit=None):
+        """Read holding registers."""
+        return self._read('read_holding_registers', address, count, unit)
+
+    def read_many(self, ranges, max_count=MAX_READ_COUNT, unit=None,
+                  max_gap=0, strict=False):
+        """Read many register ranges with the fewest requests.
+
+        ranges is a list of (register_type, address, count). Overlapping
+        and adjacent ranges of the same register type, or ranges at most
+        max_gap registers apart, are merged into requests of at most
+        max_count registers. When a merged request fails its ranges are
+        read one by one.
+
+        Returns a list with the raw words of each range in the order of
+        ranges, None for a range that could not be read. With strict a
+        ModbusConnectionError is raised instead of returning None for
+        ranges that were not read because the connection is down.
+        """
+        ranges = list(ranges)
+        results = [None] * len(ranges)
+        for register_type, start, count, indices in plan_reads(
+                ranges, max_count, max_gap):
+            words = self._read_words(register_type, start, count, unit,
+                                     strict)
+            for index in indices:
+                _, address, count = ranges[index]
+                if words is not None:
+                    results[index] = words[address - start:
+                                           address - start + count]
+                elif len(indices) > 1:
+                    results[index] = self._read_words(*ranges[index],
+                                                      unit=unit,
+                                                      strict=strict)
+        return results
+
+    def _read_words(self, register_type, address, count, unit=None,
+                    strict=False):
+        """Return the raw words of a register range, None on failure."""
+        try:
+            result = self._read(_READ_FUNCTIONS[register_type], address,
+                                count, unit)
+        except ModbusConnectionError:
+            if strict:
+                raise
+            return None
+        try:
+            return list(result.registers)
+        except (AttributeError, TypeError):
+            _LOGGER.debug("No response from modbus registers %s-%s",
+                          address, address + count - 1)
+            return None
+
+    def write_coil(self, address, value, unit=None):
+        """Write coil."""
+        return self._call('write_coil', address, value, unit)
+
+    def write_register(self, address, value, unit=None):
+        """Write register."""
+        return self._call('write_register', address, value, unit)
+
+    def write_registers(self, address, values, unit=None):
+        """Write registers."""
+        return self._call('write_registers', address, values, unit)
+
+
+def plan_reads(ranges, max_count=MAX_READ_COUNT, max_gap=0):
+    """Merge register ranges into the fewest read requests.
+
+    ranges is a list of (register_type, address, count). Overlapping and
+    adjacent ranges of the same register type, or ranges at most max_gap
+    registers apart, are merged into requests of at most max_count
+    registers. Returns a list of
+    (register_type, address, count, indices) per request, indices being
+    the positions in ranges the request covers.
+    """
+    for register_type, _, count in ranges:
+        if register_type not in _READ_FUNCTIONS:
+            raise ValueError("Unknown register type: {}"
+                             .format(register_type))
+        if not 1 <= count <= max_count:
+            raise ValueError("count must be between 1 and {}"
+                             .format(max_count))
+
+    if not ranges:
+        return []
+    order = sorted(range(len(ranges)), key=lambda index: ranges[index][:2])
+    # [register_type, start, end, indices] per request
+    register_type, address, count = ranges[order[0]]
+    requests = [[register_type, address, address + count, [order[0]]]]
+    for index in order[1:]:
+        register_type, address, count = ranges[index]
+        end = address + count
+        last = requests[-1]
+        if (last[0] == register_type and address <= last[2] + max_gap and
+                max(end, last[2]) - last[1] <= max_count):
+            last[2] = max(end, last[2])
+            last[3].append(index)
+        else:
+            requests.append([register_type, address, end, [index]])
+    return [(register_type, start, end - start, indices)
+            for register_type, start, end, indices in requests]
+
+
+def _round_robin(reads):
+    """Order the reads of each unit by address, alternating the units.
+
+    reads maps unit to a dict of read key to futures, returns a list of
+    (key, futures) tuples.
+    """
+    queues = [sorted(unit_reads.items())
+              for _, unit_reads in sorted(reads.items())]
+    ordered = []
+    for position in range(max(map(len, queues), default=0)):
+        ordered.extend(unit_reads[position] for unit_reads in queues
+                       if position < len(unit_reads))
+    return ordered
+
+
+class ModbusUnit:
+    """View of a ModbusHub bound to one unit id.
+
+    Several DucoBox instances on one line each use a view of the same hub.
+    The register layer settings are kept per view, the connection is
+    owned by the hub: close() leaves the shared client open.
+    """
+
+    def __init__(self, hub, unit):
+        """Initialize the view of unit on hub."""
+        self._hub = hub
+        self.unit = unit
+        self.write_elision = hub.write_elision
+        self.verify_writes = hub.verify_writes
+        self.cache_ttl = hub.cache_ttl
+
+    @property
+    def hub(self):
+        """Return the shared ModbusHub."""
+        return self._hub
+
+    def setup(self):
+        """Set up the shared hub unless that happened already."""
+        if not self._hub.is_set_up:
+            self._hub.setup()
+
+    def close(self):
+        """Do nothing, the shared hub is closed by its owner."""
+
+    def connect(self):
+        """Connect the shared hub."""
+        self._hub.connect()
+
+    def add_resume_listener(self, callback):
+        """Call callback when the connection of the shared hub is back."""
+        self._hub.add_resume_listener(callback)
+
+    def remove_resume_listener(self, callback):
+        """Stop calling callback when the shared hub is back."""
+        self._hub.remove_resume_listener(callback)
+
+    def spawn(self):
+        """Return an additional hub for this unit, see ModbusHub.spawn."""
+        hub = self._hub.spawn(self.unit)
+        hub.write_elision = self.write_elision
+        hub.verify_writes = self.verify_writes
+        hub.cache_ttl = self.cache_ttl
+        return hub
+
+    def set_rate_limit(self, requests_per_second=None,
+                       registers_per_second=None):
+        """Limit the load on this unit, see ModbusHub.set_rate_limit."""
+        self._hub.set_rate_limit(requests_per_second, registers_per_second,
+                                 self.unit)
+
     def read_coils(self, address, count=1):
         """Read coils."""
-        with self._lock:
-            return self._client.read_coils(
-                address,
-                count,
-                **self._kwargs)
+        return self._hub.read_coils(address, count, self.unit)
 
     def read_input_registers(self, address, count=1):
         """Read input registers."""
-        with self._lock:
-            return self._client.read_input_registers(
-                address,
-                count,
-                **self._kwargs)
+        return self._hub.read_input_registers(address, count, self.unit)
 
     def read_holding_registers(self, address, count=1):
         """Read holding registers."""
-        with self._lock:
-            return self._client.read_holding_registers(
-                address,
-                count,
-                **self._kwargs)
+        return self._hub.read_holding_registers(address, count, self.unit)
+
+    def read_many(self, ranges, max_count=MAX_READ_COUNT, max_gap=0,
+                  strict=False):
+        """Read many register ranges, see ModbusHub.read_many."""
+        return self._hub.read_many(ranges, max_count, self.unit, max_gap,
+                                   strict)
 
     def write_coil(self, address, value):
         """Write coil."""
-        with self._lock:
-            self._client.write_coil(
-                address,
-                value,
-                **self._kwargs)
+        return self._hub.write_coil(address, value, self.unit)
 
     def write_register(self, address, value):
         """Write register."""
-        with self._lock:
-            self._client.write_register(
-                address,
-                value,
-                **self._kwargs)
+        return self._hub.write_register(address, value, self.unit)
 
     def write_registers(self, address, values):
         """Write registers."""
-        with self._lock:
-            self._client.write_registers(
-                address,
-                values,
-                **self._kwargs)
+        return self._hub.write_registers(address, values, self.unit)
+
+
+def is_error_response(result):
+    """Return whether result of a write is missing or an error response."""
+    if result is None:
+        return True
+    is_error = getattr(result, 'isError', None)
+    return is_error is not None and bool(is_error())
+
+
+class RegisterSpec(namedtuple('RegisterSpec', [
+        'name', 'param_id', 'register_type', 'unit_of_measurement',
+        'count', 'scale', 'offset', 'data_type', 'precision'])):
+    """Immutable description of a Duco register.
+
+    A spec is defined once per node class and shared by every node of that
+    class, param_id is the address of the register relative to the node.
+    """
+
+    __slots__ = ()
+
+    @property
+    def register_id(self):
+        """Return the node independent integer id of the register."""
+        if self.register_type == REGISTER_TYPE_HOLDING:
+            return DUCO_REG_ADDR_NODE_ID_OFFSET + self.param_id
+        return self.param_id
+
+
+# _check of a register whose value was restored from a previous run
+_STALE = object()
 
 
 class ModbusRegister:
-    """Modbus register."""
+    """Modbus register.
+
+    The register metadata is kept in a shared RegisterSpec, the per node
+    state is limited to the address, last value, its timestamp and one
+    slot for the check still due on the value.
+    """
 
-    def __init__(self, hub, name, register, register_type,
-                 unit_of_measurement, count, scale, offset, data_type,
-                 precision):
+    __slots__ = ('_hub', '_spec', '_register', '_value', '_timestamp',
+                 '_check')
+
+    def __init__(self, hub, spec, register):
         """Initialize the modbus register."""
         self._hub = hub
-        self._name = name
+        self._spec = spec
         self._register = int(register)
-        self._register_type = register_type
-        self._unit_of_measurement = unit_of_measurement
-        self._count = int(count)
-        self._scale = scale
-        self._offset = offset
-        self._precision = precision
-        self._data_type = data_type
         self._value = None
+        self._timestamp = None
+        # None, _STALE for a value restored from a previous run and not
+        # yet read from the bus, or a written value awaiting its read back
+        self._check = None
 
     def __str__(self):
         """Return the string representation of the register."""
-        return (self._name + ": " + str(self.value) + " " +
-                self._unit_of_measurement)
+        return (self._spec.name + ": " + str(self.value) + " " +
+                self._spec.unit_of_measurement)
 
     @property
     def value(self):
-        """Return the value of the register."""
-        self.update()
-        return self._value
+        """Return the value of the register.
+
+        The hub is only accessed when the cached value is older than the
+        cache_ttl of the hub.
+        """
+        if (self._timestamp is None or
+                time.time() - self._timestamp >= self._hub.cache_ttl):
+            self.update()
+        if self._value is None:
+            return None
+        return format(self._value, '.{}f'.format(self._spec.precision))
 
     @value.setter
     def value(self, new_value):
         """Set the value of the node to new_value."""
-        if self._register_type != REGISTER_TYPE_HOLDING:
+        self.write(new_value)
+
+    def write(self, new_value, force=False):
+        """Write the raw value new_value to the register.
+
+        Unless force is set, the write is skipped when it can be elided
+        and a successful write is committed, see elides and commit_write.
+        Use force for command registers that cannot be read back.
+
+        Returns whether a write was issued and succeeded.
+        """
+        if self._spec.register_type != REGISTER_TYPE_HOLDING:
             raise TypeError("Register must be of type HOLDING")
 
-        self._hub.write_register(self._register, new_value)
+        if not force and self.elides(new_value):
+            _LOGGER.debug("Skip write of unchanged modbus register %s",
+                          self._register)
+            return False
+
+        result = self._hub.write_register(self._register, new_value)
+        if is_error_response(result):
+            _LOGGER.error("Write to modbus register %s failed",
+                          self._register)
+            return False
+        if not force:
+            self.commit_write(new_value)
+        return True
+
+    def _expected(self, new_value):
+        """Return the value the register reads after writing new_value."""
+        spec = self._spec
+        return round(spec.scale * new_value + spec.offset, spec.precision)
+
+    def elides(self, new_value):
+        """Return whether a write of the raw value new_value can be skipped.
+
+        That is when write elision is enabled on the hub and new_value
+        equals the known value, as long as that value was read or written
+        by this run and is younger than the cache_ttl of the hub.
+        """
+        return (self._hub.write_elision and self._check is not _STALE and
+                self._timestamp is not None and
+                time.time() - self._timestamp < self._hub.cache_ttl and
+                self._value == self._expected(new_value))
+
+    def commit_write(self, new_value):
+        """Record a successful write of the raw value new_value.
+
+        The cached value is updated and, when enabled on the hub, verified
+        by the next read of the register.
+        """
+        expected = self._expected(new_value)
+        self._value = expected
+        self._timestamp = time.time()
+        self._check = expected if self._hub.verify_writes else None
 
     @property
     def state(self):
         """Return the state of the register."""
-        return {'name': self._name,
+        return {'name': self._spec.name,
                 'value': str(self.value),
-                'unit': self._unit_of_measurement}
+                'unit': self._spec.unit_of_measurement}
 
     @property
     def name(self):
         """Return the name of the register."""
-        return self._name
+        return self._spec.name
 
     @property
     def unit_of_measurement(self):
         """Return the unit of measurement."""
-        return self._unit_of_measurement
+        return self._spec.unit_of_measurement
+
+    @property
+    def spec(self):
+        """Return the shared RegisterSpec of the register."""
+        return self._spec
+
+    @property
+    def address(self):
+        """Return the modbus address of the register."""
+        return self._register
+
+    @property
+    def node_id(self):
+        """Return the id of the node the register belongs to."""
+        return self._register // DUCO_REG_ADDR_NODE_ID_OFFSET
+
+    @property
+    def cached_value(self):
+        """Return the last decoded value without accessing the hub."""
+        return self._value
+
+    @property
+    def timestamp(self):
+        """Return the time of the last successful update, or None."""
+        return self._timestamp
+
+    @property
+    def stale(self):
+        """Return whether the value was restored and not yet refreshed."""
+        return self._check is _STALE
+
+    def restore(self, value, timestamp):
+        """Restore a value read at timestamp by a previous run.
+
+        The value is marked stale until the register is read again.
+        """
+        self._value = value
+        self._timestamp = timestamp
+        self._check = _STALE
 
     def update(self):
-        """Update the value of the register from the external hub."""
-        if self._register_type == REGISTER_TYPE_INPUT:
-            result = self._hub.read_input_registers(
-                self._register,
-                self._count)
-        else:
-            result = self._hub.read_holding_registers(
-                self._register,
-                self._count)
-        val = 0
+        """Update the value of the register from the external hub.
+
+        Returns whether the hub responded with a value.
+        """
+        spec = self._spec
+        try:
+            if spec.register_type == REGISTER_TYPE_INPUT:
+                result = self._hub.read_input_registers(
+                    self._register,
+                    spec.count)
+            else:
+                result = self._hub.read_holding_registers(
+                    self._register,
+                    spec.count)
+        except ModbusConnectionError:
+            _LOGGER.debug("Modbus connection down, register %s not read",
+                          self._register)
+            return False
 
         try:
             registers = result.registers
         except AttributeError:
             _LOGGER.error("No response from modbus register %s",
                           self._register)
-            return
-        if self._data_type == DATA_TYPE_FLOAT:
+            return False
+        self.decode(registers)
+        return True
+
+    def decode(self, registers):
+        """Decode the raw words registers into the value of the register."""
+        spec = self._spec
+        val = 0
+        if spec.data_type == DATA_TYPE_FLOAT:
             byte_string = b''.join(
                 [x.to_bytes(2, byteorder='big') for x in registers]
             )
             val = struct.unpack(">f", byte_string)[0]
-        elif self._data_type == DATA_TYPE_INT:
+        elif spec.data_type == DATA_TYPE_INT:
             for _, res in enumerate(registers):
                 val += twos_comp(res, 16)
-        self._value = format(
-            self._scale * val + self._offset, '.{}f'.format(self._precision))
+        self._value = round(spec.scale * val + spec.offset, spec.precision)
+        self._timestamp = time.time()
+        pending, self._check = self._check, None
+        if pending is not None and pending is not _STALE:
+            if pending != self._value:
+                _LOGGER.warning("Modbus register %s reads %s after write "
+                                "of %s", self._register, self._value,
+                                pending)
+
+    @property
+    def verify_pending(self):
+        """Return whether a write awaits verification by a read back."""
+        return self._check is not None and self._check is not _STALE
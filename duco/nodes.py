@@ -1,27 +1,5 @@
 """Duco nodes supported by python-duco."""
 from duco.const import (
-    DUCO_REG_ADDR_INPUT_STATUS,
-    DUCO_REG_ADDR_INPUT_FAN_ACTUAL,
-    DUCO_REG_ADDR_INPUT_TEMPERATURE,
-    DUCO_REG_ADDR_INPUT_CO2_ACTUAL,
-    DUCO_REG_ADDR_INPUT_RH_ACTUAL,
-    DUCO_REG_ADDR_INPUT_GROUP,
-    DUCO_REG_ADDR_HOLD_FAN_SETPOINT,
-    DUCO_REG_ADDR_HOLD_CO2_SETPOINT,
-    DUCO_REG_ADDR_HOLD_RH_SETPOINT,
-    DUCO_REG_ADDR_HOLD_RH_DELTA,
-    DUCO_REG_ADDR_HOLD_FLOW,
-    DUCO_REG_ADDR_HOLD_AUTOMIN,
-    DUCO_REG_ADDR_HOLD_AUTOMAX,
-    DUCO_REG_ADDR_HOLD_ACTION,
-    DUCO_REG_ADDR_HOLD_BUTTON_1,
-    DUCO_REG_ADDR_HOLD_BUTTON_2,
-    DUCO_REG_ADDR_HOLD_BUTTON_3,
-    DUCO_REG_ADDR_HOLD_MANUAL_TIME,
-    DUCO_TEMPERATURE_SCALE_FACTOR,
-    DUCO_TEMPERATURE_PRECISION,
-    DUCO_RH_SCALE_FACTOR,
-    DUCO_RH_PRECISION,
     DUCO_ZONE_STATUS_OFFSET,
     DUCO_ACTION_OFFSET,
     DUCO_PCT_RANGE_START,
@@ -37,75 +15,77 @@ from duco.helpers import (
     to_register_addr,
     verify_value_in_range
 )
-from duco.modbus import (
-    REGISTER_TYPE_INPUT,
-    REGISTER_TYPE_HOLDING,
-    DATA_TYPE_INT, ModbusRegister
-)
+from duco.modbus import (ModbusRegister)
+from duco.registers import (REGISTER_MAP, REGISTER_SPECS)
+
+
+def to_action_value(action):
+    """Convert action to the value of the action register.
+
+    action is a ZoneAction or the int register value, raises ValueError
+    when it is not a valid action.
+    """
+    # verify that action is a valid input
+    action_i = int(action)
+    # if a ZoneAction enum was passed, we need to correct the int value
+    if isinstance(action, ZoneAction):
+        action_i = action_i - DUCO_ACTION_OFFSET
+    # verify that converted value is in int range
+    verify_value_in_range(action_i, 0, 1, 6)
+    return action_i
+
+
+class _RegisterAttribute:
+    """Resolve a node attribute to its register with REGISTER_SPECS key."""
+
+    __slots__ = ('_key',)
+
+    def __init__(self, key):
+        """Initialize _RegisterAttribute."""
+        self._key = key
+
+    def __get__(self, node, owner=None):
+        """Return the register of node."""
+        if node is None:
+            return self
+        return node.register(self._key)
 
 
 class Node:
-    """Duco base node."""
+    """Duco base node.
+
+    The registers of a node are generated from the REGISTER_MAP entry of its
+    ModuleType and kept in one tuple, the only container of the node. The
+    _reg_<key> attributes of the classes resolve a register by key.
+    """
+
+    __slots__ = ('_node_id', '_node_type', '_registers')
+
+    _reg_status = _RegisterAttribute('status')
+    _reg_fan_actual = _RegisterAttribute('fan_actual')
+    _reg_zone = _RegisterAttribute('zone')
+    _reg_setpoint = _RegisterAttribute('setpoint')
+    _reg_action = _RegisterAttribute('action')
 
     # Create based on ModuleType:
     @staticmethod
     def factory(node_id, node_type, modbus_hub):
         """Create Node based on node_id and node_type."""
-        if node_type == ModuleType.MASTER:
-            return BoxNode(node_id, node_type, modbus_hub)
-        if node_type == ModuleType.VALVE_SENSORLESS:
-            return SensorlessValveNode(node_id, node_type, modbus_hub)
-        if node_type == ModuleType.VALVE_CO2:
-            return CO2ValveNode(node_id, node_type, modbus_hub)
-        if node_type == ModuleType.VALVE_RH:
-            return RHValveNode(node_id, node_type, modbus_hub)
-        if node_type == ModuleType.USER_CONTROLLER:
-            return UserControllerNode(node_id, node_type, modbus_hub)
-        if node_type == ModuleType.ROOM_SENSOR_CO2:
-            return CO2SensorNode(node_id, node_type, modbus_hub)
-        if node_type == ModuleType.ROOM_SENSOR_RH:
-            return RHSensorNode(node_id, node_type, modbus_hub)
-        raise ValueError("ModuleType not implemented: {}"
-                         .format(ModuleType(node_type)))
+        try:
+            node_class = _NODE_CLASSES[node_type]
+        except KeyError:
+            raise ValueError("ModuleType not implemented: {}"
+                             .format(ModuleType(node_type)))
+        return node_class(node_id, node_type, modbus_hub)
 
     def __init__(self, node_id, node_type, modbus_hub):
         """Initialize Node base."""
         self._node_id = int(node_id)
         self._node_type = ModuleType(node_type)
-        self._child_nodes = []
-        # registers
-        # name, register, register_type,
-        # unit_of_measurement, count, scale, offset, data_type, precision
-        # input
-        self._reg_status = ModbusRegister(
-            modbus_hub,
-            'Zone status',
-            to_register_addr(self._node_id, DUCO_REG_ADDR_INPUT_STATUS),
-            REGISTER_TYPE_INPUT, '', 1, 1, 0, DATA_TYPE_INT, 0)
-
-        self._reg_fan_actual = ModbusRegister(
-            modbus_hub,
-            'Fan actual',
-            to_register_addr(self._node_id, DUCO_REG_ADDR_INPUT_FAN_ACTUAL),
-            REGISTER_TYPE_INPUT, '%', 1, 1, 0, DATA_TYPE_INT, 0)
-
-        self._reg_zone = ModbusRegister(
-            modbus_hub,
-            'Zone',
-            to_register_addr(self._node_id, DUCO_REG_ADDR_INPUT_GROUP),
-            REGISTER_TYPE_INPUT, '', 1, 1, 0, DATA_TYPE_INT, 0)
-        # holding
-        self._reg_setpoint = ModbusRegister(
-            modbus_hub,
-            'Zone setpoint',
-            to_register_addr(self._node_id, DUCO_REG_ADDR_HOLD_FAN_SETPOINT),
-            REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0)
-
-        self._reg_action = ModbusRegister(
-            modbus_hub,
-            'Zone action',
-            to_register_addr(self._node_id, DUCO_REG_ADDR_HOLD_ACTION),
-            REGISTER_TYPE_HOLDING, '', 1, 1, 0, DATA_TYPE_INT, 0)
+        self._registers = tuple(
+            ModbusRegister(modbus_hub, spec,
+                           to_register_addr(self._node_id, spec.param_id))
+            for spec in _REGISTER_SPECS[self._node_type])
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -131,6 +111,16 @@ class Node:
         """Return the type of the node."""
         return self._node_type
 
+    @property
+    def registers(self):
+        """Return a tuple of all registers of the node."""
+        return self._registers
+
+    def register(self, key):
+        """Return the register with REGISTER_SPECS key, or None."""
+        index = _REGISTER_INDEX[self._node_type].get(key)
+        return None if index is None else self._registers[index]
+
     @property
     def action(self):
         """Return the action of the node.
@@ -144,15 +134,8 @@ class Node:
     @action.setter
     def action(self, new_action):
         """Set node.action to new_action."""
-        # verify that new_action is a valid input
-        new_action_i = int(new_action)
-        # if a ZoneAction enum was passed, we need to correct the int value
-        if isinstance(new_action, ZoneAction):
-            new_action_i = new_action_i - DUCO_ACTION_OFFSET
-        # verify that converted value is in int range
-        verify_value_in_range(new_action_i, 0, 1, 6)
-        # valid, safe to assign
-        self._reg_action.value = new_action_i
+        # valid, safe to assign, action is a command and always written
+        self._reg_action.write(to_action_value(new_action), force=True)
 
     @property
     def fan_actual(self):
@@ -174,19 +157,10 @@ class Node:
 class AutoMinMaxCapable:
     """Duco node containing AutoMin and AutoMax registers."""
 
-    def __init__(self, node_id, modbus_hub):
-        """Initialize AutoMinMaxCapable."""
-        self._reg_automin = ModbusRegister(
-            modbus_hub,
-            'AutoMin',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_AUTOMIN),
-            REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0)
+    __slots__ = ()
 
-        self._reg_automax = ModbusRegister(
-            modbus_hub,
-            'AutoMax',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_AUTOMAX),
-            REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0)
+    _reg_automin = _RegisterAttribute('automin')
+    _reg_automax = _RegisterAttribute('automax')
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -231,11 +205,7 @@ class AutoMinMaxCapable:
 class BoxNode(Node, AutoMinMaxCapable):
     """Duco box node."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize BoxNode node."""
-        Node.__init__(self, node_id, node_type, modbus_hub)
-        AutoMinMaxCapable.__init__(self, node_id, modbus_hub)
-        # no additional registers
+    __slots__ = ()
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -251,15 +221,9 @@ class BoxNode(Node, AutoMinMaxCapable):
 class TemperatureSensor:
     """TemperatureSensor base class."""
 
-    def __init__(self, node_id, modbus_hub):
-        """Initialize TemperatureSensor base class."""
-        # input
-        self._reg_temperature = ModbusRegister(
-            modbus_hub,
-            'Temperature',
-            to_register_addr(node_id, DUCO_REG_ADDR_INPUT_TEMPERATURE),
-            REGISTER_TYPE_INPUT, '°C', 1, DUCO_TEMPERATURE_SCALE_FACTOR,
-            0, DATA_TYPE_INT, DUCO_TEMPERATURE_PRECISION)
+    __slots__ = ()
+
+    _reg_temperature = _RegisterAttribute('temperature')
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -278,19 +242,9 @@ class TemperatureSensor:
 class Valve(Node, AutoMinMaxCapable, TemperatureSensor):
     """Valve base class."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize Valve base class."""
-        Node.__init__(self, node_id, node_type, modbus_hub)
-        AutoMinMaxCapable.__init__(self, node_id, modbus_hub)
-        TemperatureSensor.__init__(self, node_id, modbus_hub)
-
-        # holding
-        self._reg_flow = ModbusRegister(
-            modbus_hub,
-            'Flow',
-            to_register_addr(self._node_id, DUCO_REG_ADDR_HOLD_FLOW),
-            REGISTER_TYPE_HOLDING, 'm3/h', 1, 1, 0, DATA_TYPE_INT, 0)
-        # holding
+    __slots__ = ()
+
+    _reg_flow = _RegisterAttribute('flow')
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -313,22 +267,10 @@ class Valve(Node, AutoMinMaxCapable, TemperatureSensor):
 class CO2Sensor:
     """CO2Sensor base class."""
 
-    def __init__(self, node_id, modbus_hub):
-        """Initialize CO2Sensor base class."""
-        # input
-        self._reg_co2_value = ModbusRegister(
-            modbus_hub,
-            'CO2 value',
-            to_register_addr(node_id, DUCO_REG_ADDR_INPUT_CO2_ACTUAL),
-            REGISTER_TYPE_INPUT, 'ppm', 1, 1,
-            0, DATA_TYPE_INT, 0)
-        # holding
-        self._reg_co2_setpoint = ModbusRegister(
-            modbus_hub,
-            'CO2 setpoint',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_CO2_SETPOINT),
-            REGISTER_TYPE_HOLDING, 'ppm', 1, 1,
-            0, DATA_TYPE_INT, 0)
+    __slots__ = ()
+
+    _reg_co2_value = _RegisterAttribute('co2_value')
+    _reg_co2_setpoint = _RegisterAttribute('co2_setpoint')
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -353,28 +295,11 @@ class CO2Sensor:
 class RHSensor:
     """RHSensor base class."""
 
-    def __init__(self, node_id, modbus_hub):
-        """Initialize RHSensor base class."""
-        # input
-        self._reg_rh_value = ModbusRegister(
-            modbus_hub,
-            'RH value',
-            to_register_addr(node_id, DUCO_REG_ADDR_INPUT_RH_ACTUAL),
-            REGISTER_TYPE_INPUT, '%', 1, DUCO_RH_SCALE_FACTOR,
-            0, DATA_TYPE_INT, DUCO_RH_PRECISION)
-        # holding
-        self._reg_rh_setpoint = ModbusRegister(
-            modbus_hub,
-            'RH setpoint',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_RH_SETPOINT),
-            REGISTER_TYPE_HOLDING, '%', 1, 1,
-            0, DATA_TYPE_INT, 0)
-        self._reg_rh_delta = ModbusRegister(
-            modbus_hub,
-            'RH delta',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_RH_DELTA),
-            REGISTER_TYPE_HOLDING, '-', 1, 1,
-            0, DATA_TYPE_INT, 0)
+    __slots__ = ()
+
+    _reg_rh_value = _RegisterAttribute('rh_value')
+    _reg_rh_setpoint = _RegisterAttribute('rh_setpoint')
+    _reg_rh_delta = _RegisterAttribute('rh_delta')
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -406,33 +331,12 @@ class RHSensor:
 class UserController:
     """UserController base class."""
 
-    def __init__(self, node_id, modbus_hub):
-        """Initialize UserController base class."""
-        # holding
-        self._reg_button_1 = ModbusRegister(
-            modbus_hub,
-            'Button 1',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_BUTTON_1),
-            REGISTER_TYPE_HOLDING, '%', 1, 1,
-            0, DATA_TYPE_INT, 0)
-        self._reg_button_2 = ModbusRegister(
-            modbus_hub,
-            'Button 2',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_BUTTON_2),
-            REGISTER_TYPE_HOLDING, '%', 1, 1,
-            0, DATA_TYPE_INT, 0)
-        self._reg_button_3 = ModbusRegister(
-            modbus_hub,
-            'Button 3',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_BUTTON_3),
-            REGISTER_TYPE_HOLDING, '%', 1, 1,
-            0, DATA_TYPE_INT, 0)
-        self._reg_manual_time = ModbusRegister(
-            modbus_hub,
-            'Manual time',
-            to_register_addr(node_id, DUCO_REG_ADDR_HOLD_MANUAL_TIME),
-            REGISTER_TYPE_HOLDING, 'minutes', 1, 1,
-            0, DATA_TYPE_INT, 0)
+    __slots__ = ()
+
+    _reg_button_1 = _RegisterAttribute('button_1')
+    _reg_button_2 = _RegisterAttribute('button_2')
+    _reg_button_3 = _RegisterAttribute('button_3')
+    _reg_manual_time = _RegisterAttribute('manual_time')
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -500,9 +404,7 @@ class UserController:
 class SensorlessValveNode(Valve):
     """Valve base class."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize Valve base class."""
-        Valve.__init__(self, node_id, node_type, modbus_hub)
+    __slots__ = ()
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -516,10 +418,7 @@ class SensorlessValveNode(Valve):
 class CO2ValveNode(Valve, CO2Sensor):
     """CO2ValveNode class."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize CO2ValveNode."""
-        Valve.__init__(self, node_id, node_type, modbus_hub)
-        CO2Sensor.__init__(self, node_id, modbus_hub)
+    __slots__ = ()
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -534,10 +433,7 @@ class CO2ValveNode(Valve, CO2Sensor):
 class RHValveNode(Valve, RHSensor):
     """RHValveNode class."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize RHValveNode."""
-        Valve.__init__(self, node_id, node_type, modbus_hub)
-        RHSensor.__init__(self, node_id, modbus_hub)
+    __slots__ = ()
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -552,10 +448,7 @@ class RHValveNode(Valve, RHSensor):
 class UserControllerNode(Node, UserController):
     """UserControllerNode class."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize UserControllerNode."""
-        Node.__init__(self, node_id, node_type, modbus_hub)
-        UserController.__init__(self, node_id, modbus_hub)
+    __slots__ = ()
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -570,11 +463,7 @@ class UserControllerNode(Node, UserController):
 class CO2SensorNode(Node, UserController, CO2Sensor):
     """CO2SensorNode class."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize CO2SensorNode."""
-        Node.__init__(self, node_id, node_type, modbus_hub)
-        UserController.__init__(self, node_id, modbus_hub)
-        CO2Sensor.__init__(self, node_id, modbus_hub)
+    __slots__ = ()
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -591,11 +480,7 @@ class CO2SensorNode(Node, UserController, CO2Sensor):
 class RHSensorNode(Node, UserController, RHSensor):
     """RHSensorNode class."""
 
-    def __init__(self, node_id, node_type, modbus_hub):
-        """Initialize RHSensorNode."""
-        Node.__init__(self, node_id, node_type, modbus_hub)
-        UserController.__init__(self, node_id, modbus_hub)
-        RHSensor.__init__(self, node_id, modbus_hub)
+    __slots__ = ()
 
     def __str__(self):
         """Return the string representation of the node."""
@@ -607,3 +492,21 @@ class RHSensorNode(Node, UserController, RHSensor):
         """Return the state of the node as a tuple."""
         return (Node.state(self) + UserController.state(self) +
                 RHSensor.state(self))
+
+
+_NODE_CLASSES = {
+    ModuleType.MASTER: BoxNode,
+    ModuleType.VALVE_SENSORLESS: SensorlessValveNode,
+    ModuleType.VALVE_CO2: CO2ValveNode,
+    ModuleType.VALVE_RH: RHValveNode,
+    ModuleType.USER_CONTROLLER: UserControllerNode,
+    ModuleType.ROOM_SENSOR_CO2: CO2SensorNode,
+    ModuleType.ROOM_SENSOR_RH: RHSensorNode,
+}
+
+# ModuleType: RegisterSpec of every register, in the order of REGISTER_MAP
+_REGISTER_SPECS = {module_type: tuple(REGISTER_SPECS[key] for key in keys)
+                   for module_type, keys in REGISTER_MAP.items()}
+# ModuleType: {key: position of the register in Node.registers}
+_REGISTER_INDEX = {module_type: {key: index for index, key in enumerate(keys)}
+                   for module_type, keys in REGISTER_MAP.items()}
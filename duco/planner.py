@@ -0,0 +1,150 @@
+"""Bus capacity planning of poll schedules."""
+import logging
+from collections import namedtuple
+
+from duco.const import (
+    PROJECT_PACKAGE_NAME,
+    DUCO_MODBUS_BAUD_RATE,
+    DUCO_MODBUS_BYTE_SIZE,
+    DUCO_MODBUS_PARITY,
+    DUCO_MODBUS_STOP_BITS
+)
+from duco.modbus import (
+    plan_reads,
+    CONF_TYPE,
+    CONF_BAUDRATE,
+    CONF_BYTESIZE,
+    CONF_PARITY,
+    CONF_STOPBITS
+)
+from duco.registers import (COMMAND_SPECS)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+# RTU read request: unit, function, address, count, crc
+_RTU_REQUEST_BYTES = 8
+# RTU read response without data: unit, function, byte count, crc
+_RTU_RESPONSE_BYTES = 5
+# fixed inter-frame silence above 19200 baud
+_RTU_FAST_SILENCE = 0.00175
+
+# fits: whether the schedule fits, utilization: fraction of bus time used,
+# sweep_times: interval -> bus seconds of one coalesced read of its
+# registers, intervals: register name -> tightest feasible interval
+CapacityPlan = namedtuple('CapacityPlan', [
+    'fits', 'utilization', 'sweep_times', 'intervals'])
+
+
+class CapacityPlanner:
+    """Compute the bus time a poll schedule needs.
+
+    Registers polled at the same interval are read together with the
+    coalesced read plan of ModbusHub.read_many, every request costs the
+    bus time of the transport.
+    """
+
+    def __init__(self, request_time, max_utilization=0.8):
+        """Initialize CapacityPlanner.
+
+        Args:
+            request_time (callable): returns the bus seconds of a read
+                request of the given number of registers.
+            max_utilization (float): fraction of the bus time the schedule
+                may use, the rest is left for writes and retries.
+
+        """
+        if not 0 < max_utilization <= 1:
+            raise ValueError("max_utilization must be > 0 and <= 1")
+        self._request_time = request_time
+        self.max_utilization = max_utilization
+
+    @classmethod
+    def serial(cls, baudrate=DUCO_MODBUS_BAUD_RATE,
+               bytesize=DUCO_MODBUS_BYTE_SIZE, parity=DUCO_MODBUS_PARITY,
+               stopbits=DUCO_MODBUS_STOP_BITS, turnaround=0.01,
+               max_utilization=0.8):
+        """Return a CapacityPlanner for a Modbus RTU line.
+
+        turnaround is the time in seconds a node needs to start its
+        response.
+        """
+        char_time = ((1 + bytesize + (parity != 'N') + stopbits) /
+                     float(baudrate))
+        if baudrate > 19200:
+            silence = _RTU_FAST_SILENCE
+        else:
+            silence = 3.5 * char_time
+
+        def request_time(count):
+            """Return the bus seconds of a read of count registers."""
+            frame_bytes = (_RTU_REQUEST_BYTES + _RTU_RESPONSE_BYTES +
+                           2 * count)
+            return frame_bytes * char_time + 2 * silence + turnaround
+
+        return cls(request_time, max_utilization)
+
+    @classmethod
+    def tcp(cls, rtt, max_utilization=0.8):
+        """Return a CapacityPlanner for a gateway with round trip rtt."""
+        return cls(lambda count: rtt, max_utilization)
+
+    @classmethod
+    def for_client_config(cls, client_config, rtt=None, **kwargs):
+        """Return a CapacityPlanner for the transport of client_config.
+
+        Network transports need the measured round trip time rtt.
+        """
+        if client_config[CONF_TYPE] == 'serial':
+            return cls.serial(client_config[CONF_BAUDRATE],
+                              client_config[CONF_BYTESIZE],
+                              client_config[CONF_PARITY],
+                              client_config[CONF_STOPBITS], **kwargs)
+        if rtt is None:
+            raise ValueError("rtt is required for network transports")
+        return cls.tcp(rtt, **kwargs)
+
+    def sweep_time(self, registers):
+        """Return the bus seconds of one coalesced read of registers."""
+        requests = plan_reads([(register.spec.register_type,
+                                register.address, register.spec.count)
+                               for register in registers])
+        return sum(self._request_time(count)
+                   for _, _, count, _ in requests)
+
+    def plan(self, nodes, intervals=None, default_interval=60):
+        """Plan polling the registers of nodes.
+
+        intervals maps register names to their requested poll interval in
+        seconds, other registers are polled every default_interval. When
+        the schedule does not fit, all intervals are stretched by the same
+        factor to the tightest schedule that does. Write-only command
+        registers are not polled and not planned, like DucoBox.sweep.
+
+        Returns a CapacityPlan.
+        """
+        intervals = dict(intervals or {})
+        groups = {}
+        names = {}
+        for node in nodes:
+            for register in node.registers:
+                if register.spec in COMMAND_SPECS:
+                    continue
+                interval = intervals.get(register.name, default_interval)
+                if interval <= 0:
+                    raise ValueError("interval of {} must be > 0"
+                                     .format(register.name))
+                groups.setdefault(interval, []).append(register)
+                names[register.name] = interval
+
+        sweep_times = {interval: self.sweep_time(registers)
+                       for interval, registers in groups.items()}
+        utilization = sum(sweep_time / interval
+                          for interval, sweep_time in sweep_times.items())
+        factor = max(1.0, utilization / self.max_utilization)
+        if factor > 1:
+            _LOGGER.warning("Poll schedule needs %.0f%% of the bus, "
+                            "intervals stretched by %.2f",
+                            100 * utilization, factor)
+        return CapacityPlan(factor == 1, utilization, sweep_times,
+                            {name: interval * factor
+                             for name, interval in names.items()})
@@ -0,0 +1,148 @@
+"""Adaptive polling of registers driven by their rate of change."""
+import logging
+import math
+import time
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+
+class AdaptivePolicy:
+    """Bounds and tuning of adaptive polling.
+
+    A register is polled such that its expected change between two polls
+    is about its change threshold. The expected rate of change is the
+    smoothed absolute derivative plus its standard deviation, so noisy
+    registers are polled more often than steady ones.
+    """
+
+    def __init__(self, min_interval=10, max_interval=600, budget=None,
+                 smoothing=0.3, threshold_steps=10, thresholds=None):
+        """Initialize AdaptivePolicy.
+
+        Args:
+            min_interval (float): shortest poll interval in seconds.
+            max_interval (float): longest poll interval in seconds.
+            budget (:obj:`float`, optional): maximum number of register
+                reads per second over all registers.
+            smoothing (float): weight of a new sample in the moving
+                averages, between 0 and 1.
+            threshold_steps (int): default change threshold, in steps of the
+                register resolution.
+            thresholds (:obj:`dict`, optional): change threshold per
+                register name, overrides threshold_steps.
+
+        """
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("min_interval must be > 0 and <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self.smoothing = smoothing
+        self.threshold_steps = threshold_steps
+        self.thresholds = dict(thresholds or {})
+
+    def threshold(self, spec):
+        """Return the change threshold of a register spec."""
+        try:
+            return self.thresholds[spec.name]
+        except KeyError:
+            return self.threshold_steps * 10 ** -spec.precision
+
+
+class _RegisterState:
+    """Polling state of one register."""
+
+    __slots__ = ('interval', 'due', 'value', 'time', 'rate', 'variance')
+
+    def __init__(self, interval, due):
+        """Initialize _RegisterState."""
+        self.interval = interval
+        self.due = due
+        self.value = None
+        self.time = None
+        self.rate = 0.0
+        self.variance = 0.0
+
+
+class AdaptivePoller:
+    """Poll registers at intervals adapted to their rate of change."""
+
+    def __init__(self, registers, policy=None):
+        """Initialize AdaptivePoller, all registers are due immediately."""
+        self._policy = policy or AdaptivePolicy()
+        self._states = {register: _RegisterState(self._policy.min_interval,
+                                                 -math.inf)
+                        for register in registers}
+
+    @property
+    def policy(self):
+        """Return the AdaptivePolicy of the poller."""
+        return self._policy
+
+    def interval(self, register):
+        """Return the current poll interval of register."""
+        return self._states[register].interval
+
+    def budget_factor(self):
+        """Return the factor intervals are stretched by to fit the budget."""
+        budget = self._policy.budget
+        if not budget:
+            return 1.0
+        load = sum(1.0 / state.interval for state in self._states.values())
+        return max(1.0, load / budget)
+
+    def next_due(self, now=None):
+        """Return the number of seconds until the next register is due."""
+        if not self._states:
+            return self._policy.max_interval
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(state.due for state in self._states.values()) -
+                   now)
+
+    def poll_due(self, now=None):
+        """Update all due registers and adapt their intervals.
+
+        Returns the list of registers that were updated.
+        """
+        now = time.monotonic() if now is None else now
+        factor = self.budget_factor()
+        updated = []
+        for register, state in self._states.items():
+            if state.due > now:
+                continue
+            if register.update():
+                self._adapt(register, state, now)
+                updated.append(register)
+            state.due = now + state.interval * factor
+        return updated
+
+    def _adapt(self, register, state, now):
+        """Adapt the interval of register to its new value."""
+        policy = self._policy
+        value = register.cached_value
+        if state.value is not None and now > state.time:
+            alpha = policy.smoothing
+            rate = abs(value - state.value) / (now - state.time)
+            deviation = rate - state.rate
+            state.rate += alpha * deviation
+            state.variance = (1 - alpha) * (state.variance +
+                                            alpha * deviation ** 2)
+            speed = state.rate + math.sqrt(state.variance)
+            if speed > 0:
+                target = policy.threshold(register.spec) / speed
+            else:
+                target = policy.max_interval
+            # narrow at once, widen at most twofold per poll
+            state.interval = min(max(min(target, 2 * state.interval),
+                                     policy.min_interval),
+                                 policy.max_interval)
+        state.value = value
+        state.time = now
+
+    def run(self, stop_event):
+        """Poll due registers until threading.Event stop_event is set."""
+        while not stop_event.is_set():
+            self.poll_due()
+            stop_event.wait(self.next_due())
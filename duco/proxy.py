@@ -0,0 +1,266 @@
+"""Caching Modbus TCP proxy in front of a ModbusHub."""
+import functools
+import itertools
+import logging
+import queue
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+from duco.modbus import (MAX_READ_COUNT, is_error_response)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+# transaction id, protocol id, length, unit id
+MBAP_STRUCT = struct.Struct('>HHHB')
+
+FUNCTION_READ_HOLDING_REGISTERS = 0x03
+FUNCTION_READ_INPUT_REGISTERS = 0x04
+FUNCTION_WRITE_SINGLE_REGISTER = 0x06
+FUNCTION_WRITE_MULTIPLE_REGISTERS = 0x10
+
+EXCEPTION_ILLEGAL_FUNCTION = 0x01
+EXCEPTION_ILLEGAL_DATA_VALUE = 0x03
+EXCEPTION_SERVER_DEVICE_FAILURE = 0x04
+EXCEPTION_GATEWAY_TARGET_FAILED = 0x0B
+
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+
+
+class ModbusException(Exception):
+    """Modbus exception to be returned to the client."""
+
+    def __init__(self, code):
+        """Initialize ModbusException with exception code."""
+        super().__init__(code)
+        self.code = code
+
+
+class ModbusProxy:
+    """Serve a local Modbus TCP endpoint on top of a single ModbusHub.
+
+    Reads are answered from a short lived register cache, identical
+    concurrent reads are coalesced into one bus transaction and writes are
+    forwarded before any queued read. Requests are forwarded to the unit id
+    of their MBAP header.
+    """
+
+    def __init__(self, hub, host='localhost', port=5020, cache_ttl=1.0):
+        """Initialize ModbusProxy.
+
+        Args:
+            hub (:obj:`ModbusHub`): hub that owns the bus, must be set up.
+            host (str): address to listen on.
+            port (int): port to listen on.
+            cache_ttl (float): seconds a read result is served from cache.
+
+        """
+        self._hub = hub
+        self._address = (host, int(port))
+        self._cache_ttl = cache_ttl
+        self._cache = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._server = None
+        self._worker = None
+
+    @property
+    def server_address(self):
+        """Return the (host, port) the proxy listens on."""
+        if self._server is not None:
+            return self._server.server_address
+        return self._address
+
+    def start(self):
+        """Start the upstream worker and bind the server socket."""
+        self._worker = threading.Thread(target=self._run_upstream,
+                                        name='duco-proxy-upstream',
+                                        daemon=True)
+        self._worker.start()
+        self._server = _ProxyServer(self._address, _ProxyHandler, self)
+
+    def serve_forever(self):
+        """Start and serve clients until shutdown is called."""
+        if self._server is None:
+            self.start()
+        _LOGGER.info("Modbus proxy listening on %s:%d",
+                     *self._server.server_address)
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stop serving clients and stop the upstream worker."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._queue.put((PRIORITY_WRITE, next(self._seq), None, None))
+
+    def _run_upstream(self):
+        """Execute queued bus transactions, writes first."""
+        while True:
+            _, _, call, future = self._queue.get()
+            if call is None:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(call())
+            except Exception as exc:  # pylint: disable=broad-except
+                future.set_exception(exc)
+
+    def _submit(self, priority, call, done_callback=None):
+        """Queue call for the upstream worker, return its Future."""
+        future = Future()
+        if done_callback is not None:
+            future.add_done_callback(done_callback)
+        self._queue.put((priority, next(self._seq), call, future))
+        return future
+
+    def _read_upstream(self, unit, function, address, count):
+        """Read registers from the hub, raise ModbusException on failure."""
+        if function == FUNCTION_READ_INPUT_REGISTERS:
+            result = self._hub.read_input_registers(address, count,
+                                                    unit=unit)
+        else:
+            result = self._hub.read_holding_registers(address, count,
+                                                      unit=unit)
+        try:
+            return list(result.registers)
+        except AttributeError:
+            raise ModbusException(EXCEPTION_GATEWAY_TARGET_FAILED)
+
+    def read(self, unit, function, address, count):
+        """Return count registers of unit, cached or from the bus."""
+        key = (unit, function, address, count)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._submit(
+                    PRIORITY_READ,
+                    functools.partial(self._read_upstream,
+                                      unit, function, address, count),
+                    functools.partial(self._read_done, key))
+                self._inflight[key] = future
+        return future.result()
+
+    def _read_done(self, key, future):
+        """Cache the result of a finished read.
+
+        Reads that were invalidated by a write while in flight are not
+        cached, their result may predate the write.
+        """
+        with self._lock:
+            if self._inflight.get(key) is not future:
+                return
+            del self._inflight[key]
+            if future.exception() is None:
+                self._cache[key] = (time.monotonic() + self._cache_ttl,
+                                    future.result())
+
+    def write(self, unit, address, values):
+        """Write values starting at address of unit before queued reads.
+
+        Raises ModbusException with the exception code of the device, or
+        gateway target failed, when the write failed.
+        """
+        values = list(values)
+
+        def overlaps(key):
+            key_unit, function, start, count = key
+            return (key_unit == unit and
+                    function == FUNCTION_READ_HOLDING_REGISTERS and
+                    start < address + len(values) and
+                    address < start + count)
+
+        with self._lock:
+            # drop cached and in flight reads overlapping the write, later
+            # reads of the range go to the bus again
+            for key in [key for key in self._cache if overlaps(key)]:
+                del self._cache[key]
+            for key in [key for key in self._inflight if overlaps(key)]:
+                del self._inflight[key]
+        if len(values) == 1:
+            call = functools.partial(self._hub.write_register,
+                                     address, values[0], unit=unit)
+        else:
+            call = functools.partial(self._hub.write_registers,
+                                     address, values, unit=unit)
+        result = self._submit(PRIORITY_WRITE, call).result()
+        if is_error_response(result):
+            code = getattr(result, 'exception_code', None)
+            if not isinstance(code, int):
+                code = EXCEPTION_GATEWAY_TARGET_FAILED
+            raise ModbusException(code)
+
+    def handle_pdu(self, pdu, unit):
+        """Handle a request pdu for unit, return the response pdu."""
+        function = pdu[0]
+        try:
+            if function in (FUNCTION_READ_HOLDING_REGISTERS,
+                            FUNCTION_READ_INPUT_REGISTERS):
+                address, count = struct.unpack_from('>HH', pdu, 1)
+                if not 1 <= count <= MAX_READ_COUNT:
+                    raise ModbusException(EXCEPTION_ILLEGAL_DATA_VALUE)
+                words = self.read(unit, function, address, count)
+                return (struct.pack('>BB', function, 2 * count) +
+                        struct.pack('>{}H'.format(count), *words))
+            if function == FUNCTION_WRITE_SINGLE_REGISTER:
+                address, value = struct.unpack_from('>HH', pdu, 1)
+                self.write(unit, address, [value])
+                return pdu[:5]
+            if function == FUNCTION_WRITE_MULTIPLE_REGISTERS:
+                address, count, _ = struct.unpack_from('>HHB', pdu, 1)
+                values = struct.unpack_from('>{}H'.format(count), pdu, 6)
+                self.write(unit, address, values)
+                return struct.pack('>BHH', function, address, count)
+            raise ModbusException(EXCEPTION_ILLEGAL_FUNCTION)
+        except ModbusException as exc:
+            code = exc.code
+        except struct.error:
+            code = EXCEPTION_ILLEGAL_DATA_VALUE
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Proxy request failed")
+            code = EXCEPTION_SERVER_DEVICE_FAILURE
+        return struct.pack('>BB', function | 0x80, code)
+
+
+class _ProxyServer(socketserver.ThreadingTCPServer):
+    """Threading TCP server that knows its ModbusProxy."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, proxy):
+        """Initialize _ProxyServer."""
+        self.proxy = proxy
+        super().__init__(server_address, handler_class)
+
+
+class _ProxyHandler(socketserver.StreamRequestHandler):
+    """Handle the Modbus TCP frames of one client connection."""
+
+    def handle(self):
+        """Answer frames until the client disconnects."""
+        while True:
+            header = self.rfile.read(MBAP_STRUCT.size)
+            if len(header) < MBAP_STRUCT.size:
+                return
+            transaction, protocol, length, unit = MBAP_STRUCT.unpack(header)
+            # the length covers the unit id and at least a function code
+            if protocol != 0 or length < 2:
+                return
+            pdu = self.rfile.read(length - 1)
+            if len(pdu) < length - 1:
+                return
+            response = self.server.proxy.handle_pdu(pdu, unit)
+            self.wfile.write(MBAP_STRUCT.pack(transaction, 0,
+                                              len(response) + 1, unit) +
+                             response)
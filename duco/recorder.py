@@ -0,0 +1,147 @@
+"""Record register values in a local SQLite database."""
+import logging
+import sqlite3
+import time
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+from duco.registers import (REGISTER_SPECS)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+# values are stored as integers, scaled by 10**precision of the register
+_PRECISION = {spec.register_id: spec.precision
+              for spec in REGISTER_SPECS.values()}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    timestamp INTEGER NOT NULL,
+    node_id INTEGER NOT NULL,
+    register_id INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (node_id, register_id, timestamp)
+) WITHOUT ROWID
+"""
+
+_INSERT = "INSERT OR REPLACE INTO readings VALUES (?, ?, ?, ?)"
+
+
+def encode_value(register_id, value):
+    """Encode value of register_id as integer."""
+    return int(round(value * 10 ** _PRECISION.get(register_id, 0)))
+
+
+def decode_value(register_id, value):
+    """Decode integer value of register_id."""
+    precision = _PRECISION.get(register_id, 0)
+    if precision == 0:
+        return value
+    return round(value / 10 ** precision, precision)
+
+
+class SQLiteRecorder:
+    """Batched recorder of register values.
+
+    Every call to record() is written in a single transaction to a SQLite
+    database in WAL mode, using a narrow
+    (timestamp, node_id, register_id, value) schema with integer encodings.
+    """
+
+    def __init__(self, path, retention=None, downsample_after=None,
+                 downsample_bucket=300):
+        """Initialize SQLiteRecorder.
+
+        Args:
+            path (str): path of the SQLite database file.
+            retention (:obj:`int`, optional): seconds readings are kept.
+            downsample_after (:obj:`int`, optional): age in seconds after
+                which readings are averaged per downsample_bucket seconds.
+            downsample_bucket (int): width of a downsample bucket in seconds.
+
+        """
+        self._retention = retention
+        self._downsample_after = downsample_after
+        self._downsample_bucket = int(downsample_bucket)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def __enter__(self):
+        """Enter."""
+        return self
+
+    def __exit__(self, exc_type, _exc_value, traceback):
+        """Exit."""
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        self._conn.close()
+
+    def record(self, registers, timestamp=None):
+        """Record the last values of registers in one transaction.
+
+        The timestamp of each register is used unless timestamp is given.
+        Returns the number of recorded readings.
+        """
+        rows = []
+        for register in registers:
+            value = register.cached_value
+            if value is None:
+                continue
+            register_id = register.spec.register_id
+            when = register.timestamp if timestamp is None else timestamp
+            rows.append((int(when), register.node_id, register_id,
+                         encode_value(register_id, value)))
+        with self._conn:
+            self._conn.executemany(_INSERT, rows)
+        return len(rows)
+
+    def record_sweep(self, box):
+        """Sweep box and record all updated registers."""
+        return self.record(box.sweep())
+
+    def readings(self, node_id, register_id, start=0, end=None):
+        """Return the (timestamp, value) readings of a register."""
+        if end is None:
+            end = int(time.time()) + 1
+        cursor = self._conn.execute(
+            "SELECT timestamp, value FROM readings "
+            "WHERE node_id = ? AND register_id = ? "
+            "AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            (node_id, register_id, int(start), int(end)))
+        return [(timestamp, decode_value(register_id, value))
+                for timestamp, value in cursor]
+
+    def purge(self, older_than):
+        """Delete readings older than timestamp older_than."""
+        with self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM readings WHERE timestamp < ?",
+                (int(older_than),))
+        _LOGGER.debug("purged %d readings", cursor.rowcount)
+        return cursor.rowcount
+
+    def downsample(self, older_than, bucket=None):
+        """Replace readings older than older_than by their bucket average."""
+        bucket = int(bucket or self._downsample_bucket)
+        older_than = int(older_than) - int(older_than) % bucket
+        with self._conn:
+            rows = self._conn.execute(
+                "SELECT (timestamp / ?) * ?, node_id, register_id, "
+                "CAST(ROUND(AVG(value)) AS INTEGER) FROM readings "
+                "WHERE timestamp < ? GROUP BY 1, node_id, register_id",
+                (bucket, bucket, older_than)).fetchall()
+            self._conn.execute(
+                "DELETE FROM readings WHERE timestamp < ?", (older_than,))
+            self._conn.executemany(_INSERT, rows)
+        return len(rows)
+
+    def run_maintenance(self, now=None):
+        """Apply the configured retention and downsampling."""
+        now = time.time() if now is None else now
+        if self._retention is not None:
+            self.purge(now - self._retention)
+        if self._downsample_after is not None:
+            self.downsample(now - self._downsample_after)
@@ -0,0 +1,171 @@
+"""Declarative register map of the Duco nodes."""
+from duco.const import (
+    DUCO_REG_ADDR_INPUT_STATUS,
+    DUCO_REG_ADDR_INPUT_FAN_ACTUAL,
+    DUCO_REG_ADDR_INPUT_TEMPERATURE,
+    DUCO_REG_ADDR_INPUT_CO2_ACTUAL,
+    DUCO_REG_ADDR_INPUT_RH_ACTUAL,
+    DUCO_REG_ADDR_INPUT_GROUP,
+    DUCO_REG_ADDR_HOLD_FAN_SETPOINT,
+    DUCO_REG_ADDR_HOLD_CO2_SETPOINT,
+    DUCO_REG_ADDR_HOLD_RH_SETPOINT,
+    DUCO_REG_ADDR_HOLD_RH_DELTA,
+    DUCO_REG_ADDR_HOLD_FLOW,
+    DUCO_REG_ADDR_HOLD_AUTOMIN,
+    DUCO_REG_ADDR_HOLD_AUTOMAX,
+    DUCO_REG_ADDR_HOLD_ACTION,
+    DUCO_REG_ADDR_HOLD_BUTTON_1,
+    DUCO_REG_ADDR_HOLD_BUTTON_2,
+    DUCO_REG_ADDR_HOLD_BUTTON_3,
+    DUCO_REG_ADDR_HOLD_MANUAL_TIME,
+    DUCO_TEMPERATURE_SCALE_FACTOR,
+    DUCO_TEMPERATURE_PRECISION,
+    DUCO_RH_SCALE_FACTOR,
+    DUCO_RH_PRECISION
+)
+from duco.enum_types import (ModuleType)
+from duco.modbus import (
+    REGISTER_TYPE_INPUT,
+    REGISTER_TYPE_HOLDING,
+    DATA_TYPE_INT, RegisterSpec
+)
+
+# key: name, param_id, register_type,
+#      unit_of_measurement, count, scale, offset, data_type, precision
+REGISTER_SPECS = {
+    # input
+    'status': RegisterSpec(
+        'Zone status', DUCO_REG_ADDR_INPUT_STATUS,
+        REGISTER_TYPE_INPUT, '', 1, 1, 0, DATA_TYPE_INT, 0),
+    'fan_actual': RegisterSpec(
+        'Fan actual', DUCO_REG_ADDR_INPUT_FAN_ACTUAL,
+        REGISTER_TYPE_INPUT, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'temperature': RegisterSpec(
+        'Temperature', DUCO_REG_ADDR_INPUT_TEMPERATURE,
+        REGISTER_TYPE_INPUT, '°C', 1, DUCO_TEMPERATURE_SCALE_FACTOR,
+        0, DATA_TYPE_INT, DUCO_TEMPERATURE_PRECISION),
+    'co2_value': RegisterSpec(
+        'CO2 value', DUCO_REG_ADDR_INPUT_CO2_ACTUAL,
+        REGISTER_TYPE_INPUT, 'ppm', 1, 1, 0, DATA_TYPE_INT, 0),
+    'rh_value': RegisterSpec(
+        'RH value', DUCO_REG_ADDR_INPUT_RH_ACTUAL,
+        REGISTER_TYPE_INPUT, '%', 1, DUCO_RH_SCALE_FACTOR,
+        0, DATA_TYPE_INT, DUCO_RH_PRECISION),
+    'zone': RegisterSpec(
+        'Zone', DUCO_REG_ADDR_INPUT_GROUP,
+        REGISTER_TYPE_INPUT, '', 1, 1, 0, DATA_TYPE_INT, 0),
+    # holding
+    'setpoint': RegisterSpec(
+        'Zone setpoint', DUCO_REG_ADDR_HOLD_FAN_SETPOINT,
+        REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'co2_setpoint': RegisterSpec(
+        'CO2 setpoint', DUCO_REG_ADDR_HOLD_CO2_SETPOINT,
+        REGISTER_TYPE_HOLDING, 'ppm', 1, 1, 0, DATA_TYPE_INT, 0),
+    'rh_setpoint': RegisterSpec(
+        'RH setpoint', DUCO_REG_ADDR_HOLD_RH_SETPOINT,
+        REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'rh_delta': RegisterSpec(
+        'RH delta', DUCO_REG_ADDR_HOLD_RH_DELTA,
+        REGISTER_TYPE_HOLDING, '-', 1, 1, 0, DATA_TYPE_INT, 0),
+    'flow': RegisterSpec(
+        'Flow', DUCO_REG_ADDR_HOLD_FLOW,
+        REGISTER_TYPE_HOLDING, 'm3/h', 1, 1, 0, DATA_TYPE_INT, 0),
+    'button_1': RegisterSpec(
+        'Button 1', DUCO_REG_ADDR_HOLD_BUTTON_1,
+        REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'automin': RegisterSpec(
+        'AutoMin', DUCO_REG_ADDR_HOLD_AUTOMIN,
+        REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'button_2': RegisterSpec(
+        'Button 2', DUCO_REG_ADDR_HOLD_BUTTON_2,
+        REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'automax': RegisterSpec(
+        'AutoMax', DUCO_REG_ADDR_HOLD_AUTOMAX,
+        REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'button_3': RegisterSpec(
+        'Button 3', DUCO_REG_ADDR_HOLD_BUTTON_3,
+        REGISTER_TYPE_HOLDING, '%', 1, 1, 0, DATA_TYPE_INT, 0),
+    'manual_time': RegisterSpec(
+        'Manual time', DUCO_REG_ADDR_HOLD_MANUAL_TIME,
+        REGISTER_TYPE_HOLDING, 'minutes', 1, 1, 0, DATA_TYPE_INT, 0),
+    'action': RegisterSpec(
+        'Zone action', DUCO_REG_ADDR_HOLD_ACTION,
+        REGISTER_TYPE_HOLDING, '', 1, 1, 0, DATA_TYPE_INT, 0),
+}
+
+# write-only command registers, they read back as -1
+COMMAND_SPECS = frozenset((REGISTER_SPECS['action'],))
+
+# register groups, one per node base class
+_NODE = ('status', 'fan_actual', 'zone', 'setpoint', 'action')
+_AUTO_MIN_MAX = ('automin', 'automax')
+_TEMPERATURE_SENSOR = ('temperature',)
+_VALVE = _NODE + _AUTO_MIN_MAX + _TEMPERATURE_SENSOR + ('flow',)
+_CO2_SENSOR = ('co2_value', 'co2_setpoint')
+_RH_SENSOR = ('rh_value', 'rh_setpoint', 'rh_delta')
+_USER_CONTROLLER = ('button_1', 'button_2', 'button_3', 'manual_time')
+
+# ModuleType: keys of REGISTER_SPECS present on a node of that type
+REGISTER_MAP = {
+    ModuleType.MASTER: _NODE + _AUTO_MIN_MAX,
+    ModuleType.VALVE_SENSORLESS: _VALVE,
+    ModuleType.VALVE_CO2: _VALVE + _CO2_SENSOR,
+    ModuleType.VALVE_RH: _VALVE + _RH_SENSOR,
+    ModuleType.USER_CONTROLLER: _NODE + _USER_CONTROLLER,
+    ModuleType.ROOM_SENSOR_CO2: _NODE + _USER_CONTROLLER + _CO2_SENSOR,
+    ModuleType.ROOM_SENSOR_RH: _NODE + _USER_CONTROLLER + _RH_SENSOR,
+}
+
+
+class RegisterIndex:
+    """Reverse index from (register_type, address) to ModbusRegister."""
+
+    def __init__(self):
+        """Initialize an empty RegisterIndex."""
+        self._index = {}
+
+    def __len__(self):
+        """Return the number of indexed registers."""
+        return len(self._index)
+
+    def add_node(self, node):
+        """Add all registers of node to the index."""
+        for register in node.registers:
+            self._index[(register.spec.register_type,
+                         register.address)] = register
+
+    def remove_node(self, node):
+        """Remove all registers of node from the index."""
+        for register in node.registers:
+            self._index.pop((register.spec.register_type,
+                             register.address), None)
+
+    def clear(self):
+        """Remove all registers from the index."""
+        self._index.clear()
+
+    def get(self, register_type, address):
+        """Return the register at address, or None if there is none."""
+        return self._index.get((register_type, address))
+
+    def decode(self, register_type, address, values):
+        """Decode the raw words values read starting at address.
+
+        Every word is looked up in constant time, words that do not belong
+        to a known register are skipped. Returns the decoded registers.
+        """
+        decoded = []
+        index = self._index
+        offset = 0
+        while offset < len(values):
+            register = index.get((register_type, address + offset))
+            if register is None:
+                offset += 1
+                continue
+            count = register.spec.count
+            if offset + count > len(values):
+                break
+            register.decode(values[offset:offset + count])
+            decoded.append(register)
+            offset += count
+        return decoded
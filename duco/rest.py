@@ -0,0 +1,433 @@
+"""Local REST/JSON API on top of the cached register values."""
+import http.server
+import json
+import logging
+import socketserver
+import threading
+
+from duco.const import (
+    PROJECT_PACKAGE_NAME,
+    DUCO_FAN_SETPOINT_MIN,
+    DUCO_FAN_SETPOINT_RES,
+    DUCO_FAN_SETPOINT_MAX,
+    DUCO_CO2_SETPOINT_MIN,
+    DUCO_CO2_SETPOINT_RES,
+    DUCO_CO2_SETPOINT_MAX,
+    DUCO_RH_SETPOINT_MIN,
+    DUCO_RH_SETPOINT_RES,
+    DUCO_RH_SETPOINT_MAX,
+    DUCO_RH_DELTA_OFF,
+    DUCO_RH_DELTA_ON,
+    DUCO_FLOW_MIN,
+    DUCO_FLOW_RES,
+    DUCO_FLOW_MAX,
+    DUCO_MANUAL_TIME_MIN,
+    DUCO_MANUAL_TIME_RES,
+    DUCO_MANUAL_TIME_MAX,
+    DUCO_PCT_RANGE_START,
+    DUCO_PCT_RANGE_STEP,
+    DUCO_PCT_RANGE_STOP
+)
+from duco.helpers import (verify_value_in_range)
+from duco.modbus import (REGISTER_TYPE_HOLDING)
+from duco.nodes import (to_action_value)
+from duco.registers import (REGISTER_MAP)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+_PCT_RANGE = (DUCO_PCT_RANGE_START, DUCO_PCT_RANGE_STEP, DUCO_PCT_RANGE_STOP)
+# register key: valid (start, step, stop) range of written values
+_WRITE_RANGES = {
+    'setpoint': (DUCO_FAN_SETPOINT_MIN, DUCO_FAN_SETPOINT_RES,
+                 DUCO_FAN_SETPOINT_MAX),
+    'co2_setpoint': (DUCO_CO2_SETPOINT_MIN, DUCO_CO2_SETPOINT_RES,
+                     DUCO_CO2_SETPOINT_MAX),
+    'rh_setpoint': (DUCO_RH_SETPOINT_MIN, DUCO_RH_SETPOINT_RES,
+                    DUCO_RH_SETPOINT_MAX),
+    'rh_delta': (DUCO_RH_DELTA_OFF, 1, DUCO_RH_DELTA_ON),
+    'flow': (DUCO_FLOW_MIN, DUCO_FLOW_RES, DUCO_FLOW_MAX),
+    'manual_time': (DUCO_MANUAL_TIME_MIN, DUCO_MANUAL_TIME_RES,
+                    DUCO_MANUAL_TIME_MAX),
+    'automin': _PCT_RANGE,
+    'automax': _PCT_RANGE,
+    'button_1': _PCT_RANGE,
+    'button_2': _PCT_RANGE,
+    'button_3': _PCT_RANGE,
+}
+
+
+def _write_value(key, value):
+    """Return the raw value to write to register key.
+
+    Values are validated like the setters of the nodes, raises ApiError
+    when value is out of range or key has no known range.
+    """
+    if key != 'action' and key not in _WRITE_RANGES:
+        raise ApiError(400, "Register {} is not writable".format(key))
+    try:
+        if key == 'action':
+            return to_action_value(value)
+        verify_value_in_range(value, *_WRITE_RANGES[key])
+    except ValueError as exc:
+        raise ApiError(400, "Invalid value for {}: {}".format(key, exc))
+    return value
+
+
+class ApiError(Exception):
+    """Error to be returned to the client with an HTTP status."""
+
+    def __init__(self, status, message):
+        """Initialize ApiError with HTTP status and message."""
+        super().__init__(message)
+        self.status = status
+
+
+def _register_json(register):
+    """Return the JSON object of register."""
+    spec = register.spec
+    return {'name': spec.name,
+            'value': register.cached_value,
+            'unit': spec.unit_of_measurement,
+            'stale': register.stale,
+            'writable': spec.register_type == REGISTER_TYPE_HOLDING}
+
+
+def _registers_json(node):
+    """Return the {key: register} JSON object of node."""
+    return {key: _register_json(node.register(key))
+            for key in REGISTER_MAP[node.node_type]}
+
+
+def _node_json(node):
+    """Return the JSON object of node."""
+    zone = node.register('zone').cached_value
+    return {'node_id': node.node_id,
+            'type': node.node_type.name,
+            'zone': None if zone is None else int(zone),
+            'registers': _registers_json(node)}
+
+
+class RestApi:
+    """Serve boxes, nodes, zones and registers as JSON over HTTP.
+
+    GET requests are answered from the cached register values, no bus
+    access is done. Every response carries the snapshot version as ETag,
+    a request with a matching If-None-Match is answered with 304. Writes
+    are validated against the range of the register and executed as one
+    batch per request through DucoBox.write_batch.
+
+    Resources:
+        GET  /boxes
+        GET  /boxes/<box>
+        GET  /boxes/<box>/nodes
+        GET  /boxes/<box>/nodes/<node_id>
+        GET  /boxes/<box>/nodes/<node_id>/registers
+        GET  /boxes/<box>/nodes/<node_id>/registers/<key>
+        PUT  /boxes/<box>/nodes/<node_id>/registers/<key>  {"value": v}
+        GET  /boxes/<box>/zones
+        GET  /boxes/<box>/zones/<zone_id>
+        POST /boxes/<box>/writes
+             [{"node_id": n, "register": key, "value": v}, ...]
+    """
+
+    def __init__(self, boxes, host='localhost', port=8080, interval=None):
+        """Initialize RestApi.
+
+        Args:
+            boxes (:obj:`list` of :obj:`DucoBox`): boxes to serve, a box
+                is addressed by its position in this list.
+            host (str): address to listen on.
+            port (int): port to listen on.
+            interval (:obj:`float`, optional): seconds between sweeps of
+                the boxes, without interval the caller refreshes.
+
+        """
+        self._boxes = list(boxes)
+        self._address = (host, int(port))
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._version = 0
+        self._fingerprint = None
+        # path -> (version, body)
+        self._bodies = {}
+        self._server = None
+        self._stop_event = None
+        self._thread = None
+        self.refresh(sweep=False)
+
+    @property
+    def server_address(self):
+        """Return the (host, port) the API listens on."""
+        if self._server is not None:
+            return self._server.server_address
+        return self._address
+
+    @property
+    def version(self):
+        """Return the snapshot version."""
+        return self._version
+
+    def refresh(self, sweep=True):
+        """Sweep the boxes and bump the version if a value changed."""
+        if sweep:
+            for box in self._boxes:
+                box.sweep()
+        with self._lock:
+            fingerprint = tuple((register.cached_value, register.stale)
+                                for box in self._boxes
+                                for node in list(box.node_list)
+                                for register in node.registers)
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._version += 1
+                self._bodies = {}
+            return self._version
+
+    def start(self):
+        """Bind the server socket and start the sweep thread."""
+        self._server = _ApiServer(self._address, _ApiHandler, self)
+        if self._interval:
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._run_refresh,
+                                            args=(self._stop_event,),
+                                            name='duco-rest-refresh',
+                                            daemon=True)
+            self._thread.start()
+
+    def _run_refresh(self, stop_event):
+        """Refresh every interval seconds until stop_event is set."""
+        while not stop_event.wait(self._interval):
+            try:
+                self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Refresh of the REST API failed")
+
+    def serve_forever(self):
+        """Start and serve clients until shutdown is called."""
+        if self._server is None:
+            self.start()
+        _LOGGER.info("REST API listening on %s:%d",
+                     *self._server.server_address)
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stop serving clients and stop the sweep thread."""
+        if self._stop_event is not None:
+            self._stop_event.set()
+            self._thread.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def get(self, path):
+        """Return (version, body) of the JSON resource at path.
+
+        The body is rendered under the lock of refresh, so it never
+        carries a version older than the values it shows.
+        """
+        with self._lock:
+            cached = self._bodies.get(path)
+            if cached is None:
+                body = json.dumps(self._resource(path)).encode('utf-8')
+                cached = self._bodies[path] = (self._version, body)
+            return cached
+
+    def _box(self, parts):
+        """Return the box addressed by parts[1]."""
+        try:
+            return self._boxes[int(parts[1])]
+        except (IndexError, ValueError):
+            raise ApiError(404, "Unknown box")
+
+    @staticmethod
+    def _node(box, node_id):
+        """Return the node node_id of box."""
+        for node in list(box.node_list):
+            if str(node.node_id) == node_id:
+                return node
+        raise ApiError(404, "Unknown node")
+
+    @staticmethod
+    def _register(node, key):
+        """Return the register key of node."""
+        if key not in REGISTER_MAP[node.node_type]:
+            raise ApiError(404, "Unknown register")
+        return node.register(key)
+
+    def _resource(self, path):
+        """Return the JSON object at path."""
+        parts = [part for part in path.split('/') if part]
+        if not parts or parts == ['boxes']:
+            return [self._box_json(index, box)
+                    for index, box in enumerate(self._boxes)]
+        if parts[0] != 'boxes':
+            raise ApiError(404, "Unknown resource")
+        box = self._box(parts)
+        if len(parts) == 2:
+            return self._box_json(int(parts[1]), box)
+        if parts[2] == 'nodes':
+            if len(parts) == 3:
+                return [_node_json(node) for node in list(box.node_list)]
+            node = self._node(box, parts[3])
+            if len(parts) == 4:
+                return _node_json(node)
+            if parts[4] == 'registers' and len(parts) == 5:
+                return _registers_json(node)
+            if parts[4] == 'registers' and len(parts) == 6:
+                return _register_json(self._register(node, parts[5]))
+        elif parts[2] == 'zones':
+            if len(parts) == 3:
+                return [self._zone_json(box, zone_id)
+                        for zone_id in box.zone_index.zones]
+            if len(parts) == 4:
+                try:
+                    zone_id = int(parts[3])
+                except ValueError:
+                    raise ApiError(404, "Unknown zone")
+                if zone_id not in box.zone_index.zones:
+                    raise ApiError(404, "Unknown zone")
+                return self._zone_json(box, zone_id)
+        raise ApiError(404, "Unknown resource")
+
+    @staticmethod
+    def _box_json(index, box):
+        """Return the JSON object of box."""
+        return {'box': index,
+                'nodes': [node.node_id for node in list(box.node_list)],
+                'zones': box.zone_index.zones}
+
+    @staticmethod
+    def _zone_json(box, zone_id):
+        """Return the JSON object of zone_id of box."""
+        zones = box.zone_index
+        return {'zone': zone_id,
+                'nodes': [node.node_id for node in zones.nodes(zone_id)],
+                'max_co2': zones.max_co2(zone_id),
+                'max_rh': zones.max_rh(zone_id),
+                'mean_temperature': zones.mean_temperature(zone_id)}
+
+    def write(self, method, path, data):
+        """Execute the writes of a PUT or POST request, return its result."""
+        parts = [part for part in path.split('/') if part]
+        if len(parts) < 3 or parts[0] != 'boxes':
+            raise ApiError(404, "Unknown resource")
+        box = self._box(parts)
+        if method == 'PUT' and len(parts) == 6 and parts[2] == 'nodes' and \
+                parts[4] == 'registers':
+            if not isinstance(data, dict):
+                raise ApiError(400, "Expected an object with a value")
+            requests = [{'node_id': parts[3], 'register': parts[5],
+                         'value': data.get('value')}]
+        elif method == 'POST' and len(parts) == 3 and parts[2] == 'writes':
+            if not isinstance(data, list):
+                raise ApiError(400, "Expected a list of writes")
+            requests = data
+        else:
+            raise ApiError(405, "Method not allowed")
+
+        writes = {}
+        keys = {}
+        for request in requests:
+            try:
+                node = self._node(box, str(request['node_id']))
+                register = self._register(node, request['register'])
+                value = request['value']
+            except (KeyError, TypeError):
+                raise ApiError(400, "Expected node_id, register and value")
+            if register.spec.register_type != REGISTER_TYPE_HOLDING:
+                raise ApiError(400, "Register {} is read only"
+                               .format(request['register']))
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ApiError(400, "Value must be an integer")
+            writes[register] = _write_value(request['register'], value)
+            keys[register] = request['register']
+
+        elided = []
+        written = box.write_batch(writes, elided)
+        self.refresh(sweep=False)
+        return {'written': [{'node_id': register.node_id,
+                             'register': keys[register]}
+                            for register in written],
+                'elided': [{'node_id': register.node_id,
+                            'register': keys[register]}
+                           for register in elided],
+                'failed': len(writes) - len(written) - len(elided)}
+
+
+class _ApiServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Threading HTTP server that knows its RestApi."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, api):
+        """Initialize _ApiServer."""
+        self.api = api
+        super().__init__(server_address, handler_class)
+
+
+class _ApiHandler(http.server.BaseHTTPRequestHandler):
+    """Handle the requests of one client connection."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Log requests to the package logger."""
+        _LOGGER.debug("%s - " + format, self.address_string(), *args)
+
+    def _send(self, status, body=b'', etag=None):
+        """Send a JSON response."""
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def _send_error(self, exc):
+        """Send ApiError exc as JSON."""
+        self._send(exc.status,
+                   json.dumps({'error': str(exc)}).encode('utf-8'))
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer a GET request from the cached values."""
+        try:
+            version, body = self.server.api.get(self.path)
+        except ApiError as exc:
+            self._send_error(exc)
+            return
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("REST read failed")
+            self._send_error(ApiError(500, "Read failed"))
+            return
+        etag = '"{}"'.format(version)
+        if etag in [tag.strip() for tag in
+                    self.headers.get('If-None-Match', '').split(',')]:
+            self._send(304, etag=etag)
+        else:
+            self._send(200, body, etag)
+
+    def _do_write(self):
+        """Answer a PUT or POST request."""
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                data = json.loads(self.rfile.read(length).decode('utf-8'))
+            except ValueError:
+                raise ApiError(400, "Invalid JSON")
+            result = self.server.api.write(self.command, self.path, data)
+        except ApiError as exc:
+            self._send_error(exc)
+            return
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("REST write failed")
+            self._send_error(ApiError(500, "Write failed"))
+            return
+        self._send(200, json.dumps(result).encode('utf-8'),
+                   '"{}"'.format(self.server.api.version))
+
+    do_PUT = _do_write
+    do_POST = _do_write
@@ -0,0 +1,203 @@
+"""Share the latest register values with local processes."""
+import logging
+import math
+import os
+import struct
+import time
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # python < 3.8
+    resource_tracker = shared_memory = None
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+# sequence number, slot count, resource tracker id of the publisher
+HEADER_STRUCT = struct.Struct('<QI4xQ')
+# node_id, register_id, value, timestamp
+SLOT_STRUCT = struct.Struct('<HB5xdd')
+# offset of value and timestamp within a slot
+_VALUE_OFFSET = 8
+_VALUE_STRUCT = struct.Struct('<dd')
+
+# seconds a reader retries before giving up on a consistent snapshot
+_READ_TIMEOUT = 1.0
+_MAX_BACKOFF = 0.001
+
+
+def _shared_memory():
+    """Return the shared_memory module, available since python 3.8."""
+    if shared_memory is None:
+        raise RuntimeError("Shared memory snapshots need python 3.8")
+    return shared_memory
+
+
+def _tracker_id():
+    """Return the id of the resource tracker of this process, 0 if none.
+
+    Processes started by multiprocessing share the tracker of their
+    parent, the id is the inode of the pipe to the tracker.
+    """
+    if os.name != 'posix':
+        return 0
+    return os.fstat(resource_tracker.getfd()).st_ino
+
+
+class SnapshotPublisher:
+    """Publish register values in a fixed-layout shared memory block.
+
+    The block starts with a sequence number and the slot count, followed by
+    one slot per register. The sequence number is odd while the publisher
+    writes, readers use it as a seqlock to read consistent snapshots.
+    """
+
+    def __init__(self, name, registers):
+        """Create the shared memory block name with a slot per register."""
+        self._registers = tuple(registers)
+        self._slots = {}
+        size = HEADER_STRUCT.size + SLOT_STRUCT.size * len(self._registers)
+        self._shm = _shared_memory().SharedMemory(name=name, create=True,
+                                                  size=size)
+        self._buf = self._shm.buf
+        self._seq = 0
+        HEADER_STRUCT.pack_into(self._buf, 0, self._seq,
+                                len(self._registers), _tracker_id())
+        for slot, register in enumerate(self._registers):
+            offset = HEADER_STRUCT.size + slot * SLOT_STRUCT.size
+            self._slots[register] = offset + _VALUE_OFFSET
+            SLOT_STRUCT.pack_into(self._buf, offset, register.node_id,
+                                  register.spec.register_id, math.nan, 0.0)
+
+    def __enter__(self):
+        """Enter."""
+        return self
+
+    def __exit__(self, exc_type, _exc_value, traceback):
+        """Exit."""
+        self.close()
+
+    @property
+    def name(self):
+        """Return the name of the shared memory block."""
+        return self._shm.name
+
+    @property
+    def version(self):
+        """Return the sequence number of the last published snapshot."""
+        return self._seq
+
+    def publish(self, registers=None):
+        """Publish the last values of registers, all registers by default.
+
+        Registers that are not part of the layout are ignored.
+        """
+        if registers is None:
+            registers = self._registers
+        buf = self._buf
+        slots = self._slots
+        pack_into = _VALUE_STRUCT.pack_into
+        self._seq += 1
+        struct.pack_into('<Q', buf, 0, self._seq)
+        try:
+            for register in registers:
+                offset = slots.get(register)
+                if offset is None:
+                    continue
+                value = register.cached_value
+                pack_into(buf, offset,
+                          math.nan if value is None else value,
+                          register.timestamp or 0.0)
+        finally:
+            self._seq += 1
+            struct.pack_into('<Q', buf, 0, self._seq)
+
+    def close(self):
+        """Close and remove the shared memory block."""
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SnapshotReader:
+    """Read register values from a block written by SnapshotPublisher.
+
+    Reads go directly to the shared memory, no bus traffic is involved.
+    """
+
+    def __init__(self, name):
+        """Attach to the shared memory block name."""
+        self._shm = _shared_memory().SharedMemory(name=name)
+        self._buf = self._shm.buf
+        _, count, tracker = HEADER_STRUCT.unpack_from(self._buf, 0)
+        if tracker != _tracker_id():
+            # the publisher owns the block, the tracker of this process
+            # must not unlink it on exit. A tracker shared with the
+            # publisher only knows the registration of the publisher.
+            resource_tracker.unregister(
+                getattr(self._shm, '_name', '/' + name), 'shared_memory')
+        self._offsets = {}
+        for slot in range(count):
+            offset = HEADER_STRUCT.size + slot * SLOT_STRUCT.size
+            node_id, register_id, _, _ = SLOT_STRUCT.unpack_from(
+                self._buf, offset)
+            self._offsets[(node_id, register_id)] = offset + _VALUE_OFFSET
+
+    def __enter__(self):
+        """Enter."""
+        return self
+
+    def __exit__(self, exc_type, _exc_value, traceback):
+        """Exit."""
+        self.close()
+
+    @property
+    def keys(self):
+        """Return the (node_id, register_id) keys of the layout."""
+        return list(self._offsets)
+
+    def _version(self):
+        """Return the current sequence number of the block."""
+        return struct.unpack_from('<Q', self._buf, 0)[0]
+
+    def _consistent(self, read):
+        """Call read until it ran without a concurrent publish.
+
+        Between attempts the reader backs off, growing from yielding the
+        processor up to _MAX_BACKOFF seconds, until _READ_TIMEOUT passed.
+        """
+        deadline = time.monotonic() + _READ_TIMEOUT
+        backoff = 0.0
+        while True:
+            before = self._version()
+            if not before % 2:
+                result = read()
+                if self._version() == before:
+                    return before, result
+            if time.monotonic() > deadline:
+                raise RuntimeError("Unable to read a consistent snapshot")
+            time.sleep(backoff)
+            backoff = min(2 * backoff or 0.00001, _MAX_BACKOFF)
+
+    def read(self, node_id, register_id):
+        """Return (value, timestamp) of a register, value NaN if unknown."""
+        offset = self._offsets[(node_id, register_id)]
+        _, result = self._consistent(
+            lambda: _VALUE_STRUCT.unpack_from(self._buf, offset))
+        return result
+
+    def snapshot(self):
+        """Return (version, values) of a consistent snapshot.
+
+        values maps (node_id, register_id) to (value, timestamp).
+        """
+        unpack_from = _VALUE_STRUCT.unpack_from
+        return self._consistent(
+            lambda: {key: unpack_from(self._buf, offset)
+                     for key, offset in self._offsets.items()})
+
+    def close(self):
+        """Detach from the shared memory block."""
+        self._buf = None
+        self._shm.close()
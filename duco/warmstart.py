@@ -0,0 +1,141 @@
+"""Persist the last register values across restarts."""
+import logging
+import os
+import struct
+import threading
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+SNAPSHOT_MAGIC = b'DUCOWS2\x00'
+# number of records
+HEADER_STRUCT = struct.Struct('<I')
+# node_id, module type, register_id, value, timestamp
+RECORD_STRUCT = struct.Struct('<HBBdd')
+
+
+def save_snapshot(path, nodes):
+    """Save the last values of the registers of nodes to path.
+
+    The file is replaced atomically, registers without a value are left
+    out. Returns the number of saved values.
+    """
+    records = [RECORD_STRUCT.pack(node.node_id, node.node_type,
+                                  register.spec.register_id,
+                                  register.cached_value, register.timestamp)
+               for node in nodes
+               for register in node.registers
+               if register.cached_value is not None]
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as snapshot:
+        snapshot.write(SNAPSHOT_MAGIC)
+        snapshot.write(HEADER_STRUCT.pack(len(records)))
+        snapshot.write(b''.join(records))
+    os.replace(temp_path, path)
+    return len(records)
+
+
+def load_snapshot(path):
+    """Return the values saved in path.
+
+    Returns {(node_id, module type, register_id): (value, timestamp)}.
+    """
+    with open(path, 'rb') as snapshot:
+        data = snapshot.read()
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError("{} is not a warm start snapshot".format(path))
+    offset = len(SNAPSHOT_MAGIC)
+    count, = HEADER_STRUCT.unpack_from(data, offset)
+    offset += HEADER_STRUCT.size
+    if len(data) - offset < count * RECORD_STRUCT.size:
+        raise ValueError("{} is truncated".format(path))
+    values = {}
+    for _ in range(count):
+        node_id, node_type, register_id, value, timestamp = \
+            RECORD_STRUCT.unpack_from(data, offset)
+        values[(node_id, node_type, register_id)] = (value, timestamp)
+        offset += RECORD_STRUCT.size
+    return values
+
+
+def restore_snapshot(path, nodes):
+    """Restore the values saved in path into registers without a value.
+
+    Values are only restored into nodes of the module type they were saved
+    from, register ids mean different registers on other types. Restored
+    values are marked stale until the register is read. A missing or
+    unreadable snapshot restores nothing. Returns the list of restored
+    registers.
+    """
+    try:
+        values = load_snapshot(path)
+    except (OSError, ValueError, struct.error) as exc:
+        _LOGGER.info("No warm start from %s: %s", path, exc)
+        return []
+    restored = []
+    for node in nodes:
+        for register in node.registers:
+            saved = values.get((node.node_id, node.node_type,
+                                register.spec.register_id))
+            if saved is not None and register.cached_value is None:
+                register.restore(*saved)
+                restored.append(register)
+    return restored
+
+
+class WarmStart:
+    """Save the values of a DucoBox periodically and restore them."""
+
+    def __init__(self, box, path, interval=60):
+        """Initialize WarmStart.
+
+        Args:
+            box (:obj:`DucoBox`): box whose register values are kept.
+            path (str): path of the snapshot file.
+            interval (float): seconds between two saves.
+
+        """
+        self._box = box
+        self._path = path
+        self._interval = interval
+        self._stop_event = None
+        self._thread = None
+
+    def restore(self):
+        """Restore the saved values into the node tree and zone index."""
+        restored = restore_snapshot(self._path, list(self._box.node_list))
+        self._box.zone_index.apply(restored)
+        _LOGGER.debug("restored %d stale values", len(restored))
+        return restored
+
+    def save(self):
+        """Save the current values of the node tree."""
+        return save_snapshot(self._path, list(self._box.node_list))
+
+    def start(self):
+        """Save every interval seconds in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop_event = threading.Event()
+
+        def run(stop_event):
+            while not stop_event.wait(self._interval):
+                try:
+                    self.save()
+                except OSError:
+                    _LOGGER.exception("Unable to save %s", self._path)
+
+        self._thread = threading.Thread(target=run,
+                                        args=(self._stop_event,),
+                                        name='duco-warm-start', daemon=True)
+        self._thread.start()
+
+    def stop(self, save=True):
+        """Stop the background thread and, with save, save once more."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        if save:
+            self.save()
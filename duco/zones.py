@@ -0,0 +1,186 @@
+"""Zones of the Duco network and their aggregated values."""
+import logging
+
+from duco.const import (PROJECT_PACKAGE_NAME)
+from duco.registers import (REGISTER_SPECS)
+
+_LOGGER = logging.getLogger(PROJECT_PACKAGE_NAME)
+
+_ZONE_SPEC = REGISTER_SPECS['zone']
+# register spec: aggregate name
+_AGGREGATED_SPECS = {
+    REGISTER_SPECS['co2_value']: 'co2',
+    REGISTER_SPECS['rh_value']: 'rh',
+    REGISTER_SPECS['temperature']: 'temperature',
+}
+
+
+class _Aggregate:
+    """Incrementally maintained maximum and mean of node values."""
+
+    __slots__ = ('_values', '_total', '_maximum')
+
+    def __init__(self):
+        """Initialize an empty _Aggregate."""
+        self._values = {}
+        self._total = 0
+        self._maximum = None
+
+    def set(self, node_id, value):
+        """Set the value of node_id."""
+        old = self._values.get(node_id)
+        self._values[node_id] = value
+        self._total += value - (old or 0)
+        if self._maximum is not None:
+            if value >= self._maximum:
+                self._maximum = value
+            elif old == self._maximum:
+                # the maximum decreased, recompute on next access
+                self._maximum = None
+
+    def remove(self, node_id):
+        """Remove the value of node_id."""
+        old = self._values.pop(node_id, None)
+        if old is not None:
+            self._total -= old
+            if old == self._maximum:
+                self._maximum = None
+
+    @property
+    def maximum(self):
+        """Return the maximum value, or None without values."""
+        if self._maximum is None and self._values:
+            self._maximum = max(self._values.values())
+        return self._maximum
+
+    @property
+    def mean(self):
+        """Return the mean value, or None without values."""
+        if not self._values:
+            return None
+        return self._total / len(self._values)
+
+
+class _Zone:
+    """Nodes and aggregates of one zone."""
+
+    __slots__ = ('nodes', 'aggregates')
+
+    def __init__(self):
+        """Initialize an empty _Zone."""
+        self.nodes = {}
+        self.aggregates = {name: _Aggregate()
+                           for name in _AGGREGATED_SPECS.values()}
+
+
+class ZoneIndex:
+    """Index from zone id to the nodes in that zone.
+
+    The maximum CO2, maximum RH and mean temperature of every zone are
+    maintained incrementally from the registers of each sweep, so zone
+    queries need neither a node scan nor bus access.
+    """
+
+    def __init__(self):
+        """Initialize an empty ZoneIndex."""
+        self._zones = {}
+        self._node_zone = {}
+        self._nodes = {}
+
+    @property
+    def zones(self):
+        """Return a sorted list of the known zone ids."""
+        return sorted(self._zones)
+
+    def build(self, nodes):
+        """Build the index from nodes.
+
+        Zone registers without a known value are read from the bus.
+        """
+        self._zones = {}
+        self._node_zone = {}
+        self._nodes = {}
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        """Add node and its known values to the index."""
+        self._nodes[node.node_id] = node
+        zone_register = node.register('zone')
+        if zone_register.cached_value is None:
+            zone_register.update()
+        self.apply(node.registers)
+
+    def remove_node(self, node):
+        """Remove node from the index."""
+        self._nodes.pop(node.node_id, None)
+        self._move(node.node_id, None)
+
+    def _move(self, node_id, zone_id):
+        """Move node_id to zone_id, None removes it from its zone."""
+        old_zone_id = self._node_zone.pop(node_id, None)
+        old_zone = self._zones.get(old_zone_id)
+        if old_zone is not None:
+            del old_zone.nodes[node_id]
+            for aggregate in old_zone.aggregates.values():
+                aggregate.remove(node_id)
+            if not old_zone.nodes:
+                del self._zones[old_zone_id]
+        if zone_id is None:
+            return
+        self._node_zone[node_id] = zone_id
+        zone = self._zones.setdefault(zone_id, _Zone())
+        node = self._nodes[node_id]
+        zone.nodes[node_id] = node
+        for register in node.registers:
+            name = _AGGREGATED_SPECS.get(register.spec)
+            if name is not None and register.cached_value is not None:
+                zone.aggregates[name].set(node_id, register.cached_value)
+
+    def apply(self, registers):
+        """Apply the new values of registers, e.g. the result of a sweep."""
+        for register in registers:
+            value = register.cached_value
+            node_id = register.node_id
+            if value is None or node_id not in self._nodes:
+                continue
+            spec = register.spec
+            if spec == _ZONE_SPEC:
+                zone_id = int(value)
+                if self._node_zone.get(node_id) != zone_id:
+                    self._move(node_id, zone_id)
+                continue
+            name = _AGGREGATED_SPECS.get(spec)
+            zone = self._zones.get(self._node_zone.get(node_id))
+            if name is not None and zone is not None:
+                zone.aggregates[name].set(node_id, value)
+
+    def zone_of(self, node_id):
+        """Return the zone id of node_id, or None."""
+        return self._node_zone.get(node_id)
+
+    def nodes(self, zone_id):
+        """Return the list of nodes in zone_id."""
+        zone = self._zones.get(zone_id)
+        if zone is None:
+            return []
+        return list(zone.nodes.values())
+
+    def _aggregate(self, zone_id, name):
+        """Return aggregate name of zone_id, raise KeyError if unknown."""
+        try:
+            return self._zones[zone_id].aggregates[name]
+        except KeyError:
+            raise KeyError("Unknown zone: {}".format(zone_id))
+
+    def max_co2(self, zone_id):
+        """Return the maximum CO2 value in ppm of zone_id."""
+        return self._aggregate(zone_id, 'co2').maximum
+
+    def max_rh(self, zone_id):
+        """Return the maximum relative humidity in % of zone_id."""
+        return self._aggregate(zone_id, 'rh').maximum
+
+    def mean_temperature(self, zone_id):
+        """Return the mean temperature in °C of zone_id."""
+        return self._aggregate(zone_id, 'temperature').mean
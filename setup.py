@@ -42,6 +42,7 @@ setup(
     zip_safe=False,
     platforms='any',
     install_requires=REQUIRES,
+    extras_require={'numpy': ['numpy']},
     test_suite='tests',
     keywords=['duco', 'ventilation'],
     classifiers=PROJECT_CLASSIFIERS,
@@ -0,0 +1,103 @@
+"""Test methods in duco/capture.py."""
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import duco.modbus
+from duco.capture import (
+    CaptureWriter,
+    ReplayClient,
+    read_capture,
+    STATUS_OK,
+    STATUS_ERROR_RESPONSE,
+    STATUS_EXCEPTION
+    )
+from duco.duco import (DucoBox)
+from duco.enum_types import (ModuleType)
+
+
+def response(registers):
+    return SimpleNamespace(registers=registers, isError=lambda: False)
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.cap')
+        os.close(handle)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_hub_capture(self):
+        client = MagicMock()
+        client.read_input_registers.return_value = response([7, 8])
+        client.write_registers.return_value = response(None)
+        client.read_holding_registers.side_effect = IOError
+        hub = duco.modbus.ModbusHub(
+            duco.modbus.create_client_config('serial', '/dev/usb0'))
+        hub._client = client
+        hub.start_capture(self.path)
+        hub.read_input_registers(10, 2)
+        hub.write_registers(15, [1, 2, 3])
+        self.assertRaises(IOError, hub.read_holding_registers, 12)
+        hub.stop_capture()
+
+        transactions = list(read_capture(self.path))
+        self.assertEqual(
+            [(t.function, t.unit, t.address, t.arg, t.status, t.words)
+             for t in transactions],
+            [('read_input_registers', 0, 10, 2, STATUS_OK, (7, 8)),
+             ('write_registers', 0, 15, 3, STATUS_OK, (1, 2, 3)),
+             ('read_holding_registers', 0, 12, 1, STATUS_EXCEPTION, ())])
+
+    def test_spawned_hub_capture(self):
+        hub = duco.modbus.ModbusHub(
+            duco.modbus.create_client_config('tcp', 502, 'gw'))
+        hub._client = MagicMock()
+        spawned = hub.spawn()
+        spawned._client = MagicMock()
+        spawned._client.write_register.return_value = response(None)
+        hub.start_capture(self.path)
+        spawned.write_register(29, 6)
+        # closing the spawned hub leaves the capture running
+        spawned.close()
+        hub.write_register(29, 6)
+        hub.close()
+        self.assertEqual([t.function for t in read_capture(self.path)],
+                         ['write_register', 'write_register'])
+
+    def test_not_a_capture(self):
+        with open(self.path, 'wb') as capture:
+            capture.write(b'garbage!')
+        self.assertRaises(ValueError, list, read_capture(self.path))
+
+    def test_replay_box(self):
+        with CaptureWriter(self.path) as writer:
+            writer.record('read_input_registers', 10, 1, 1,
+                          response([ModuleType.MASTER.value]))
+            writer.record('read_input_registers', 20, 1, 1, None)
+        self.assertEqual([t.status for t in read_capture(self.path)],
+                         [STATUS_OK, STATUS_ERROR_RESPONSE])
+        with DucoBox('replay', self.path) as box:
+            self.assertEqual([node.node_type for node in box.node_list],
+                             [ModuleType.MASTER])
+
+    def test_replay_order_and_speed(self):
+        with CaptureWriter(self.path) as writer:
+            writer.record('read_input_registers', 11, 1, 0, response([1]),
+                          timestamp=100.0)
+            writer.record('read_input_registers', 11, 1, 0, response([2]),
+                          timestamp=101.0)
+        client = ReplayClient(self.path, speed=10)
+        client.connect()
+        start = time.monotonic()
+        self.assertEqual(client.read_input_registers(11, 1).registers, [1])
+        self.assertEqual(client.read_input_registers(11, 1).registers, [2])
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        # the last recorded response is repeated
+        self.assertEqual(client.read_input_registers(11, 1).registers, [2])
+        self.assertTrue(client.read_input_registers(12, 1).isError())
@@ -0,0 +1,40 @@
+"""Test methods in duco/columnar.py."""
+import math
+import unittest
+from unittest.mock import MagicMock
+from duco.columnar import (COLUMNS, export_columns)
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestExportColumns(unittest.TestCase):
+    def test_columns(self):
+        hub = MagicMock()
+        nodes = [Node.factory(1, ModuleType.MASTER, hub),
+                 Node.factory(2, ModuleType.VALVE_CO2, hub),
+                 Node.factory(3, ModuleType.ROOM_SENSOR_RH, hub)]
+        nodes[1].register('co2_value').decode([800])
+        nodes[1].register('zone').decode([1])
+        nodes[2].register('rh_value').decode([5500])
+        columns = export_columns(nodes)
+        self.assertEqual(set(columns), set(COLUMNS))
+        self.assertEqual(columns['node_id'].tolist(), [1, 2, 3])
+        self.assertEqual(columns['module_type'].tolist(),
+                         [node.node_type.value for node in nodes])
+        co2 = columns['co2'].tolist()
+        self.assertTrue(math.isnan(co2[0]))
+        self.assertEqual(co2[1], 800)
+        self.assertTrue(math.isnan(co2[2]))
+        self.assertEqual(columns['zone'][1], 1)
+        self.assertEqual(columns['rh'][2], nodes[2].register(
+            'rh_value').cached_value)
+
+    def test_empty(self):
+        columns = export_columns([])
+        self.assertEqual(len(columns['node_id']), 0)
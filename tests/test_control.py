@@ -0,0 +1,102 @@
+"""Test methods in duco/control.py."""
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from duco.control import (ControlLoop, flush_writes)
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+
+
+class TestControlLoop(unittest.TestCase):
+    def setUp(self):
+        self.hub = MagicMock()
+        self.hub.write_elision = True
+        self.hub.cache_ttl = 60
+        self.hub.write_register.return_value.isError.return_value = False
+        self.hub.write_registers.return_value.isError.return_value = False
+        self.node = Node.factory(2, ModuleType.VALVE_CO2, self.hub)
+        self.co2 = self.node.register('co2_value')
+        self.inputs = [self.co2, self.node.register('co2_setpoint')]
+        self.hub.read_many.return_value = [[1200], [1000]]
+
+    def step(self, cycle):
+        if self.co2.cached_value > 1000:
+            cycle.write(self.node.register('automin'), 40)
+            cycle.write(self.node.register('automax'), 90)
+            cycle.write(self.node.register('setpoint'), 50)
+            cycle.write(self.node.register('action'), 4)
+
+    def test_cycle(self):
+        loop = ControlLoop(self.hub, self.inputs, self.step, 1)
+        written = loop.run_cycle()
+        self.hub.read_many.assert_called_once()
+        self.assertEqual(self.co2.cached_value, 1200)
+        self.assertEqual(len(written), 4)
+        # automin and automax are adjacent and share one request
+        automin = self.node.register('automin').address
+        self.hub.write_registers.assert_called_once_with(automin, [40, 90])
+        self.assertEqual(self.hub.write_register.call_count, 2)
+        self.assertEqual(self.node.register('automin').cached_value, 40)
+
+    def test_elided(self):
+        loop = ControlLoop(self.hub, self.inputs, self.step, 1)
+        loop.run_cycle()
+        self.hub.write_register.reset_mock()
+        self.hub.write_registers.reset_mock()
+        loop.run_cycle()
+        # only the command register is written again
+        self.hub.write_registers.assert_not_called()
+        self.assertEqual(self.hub.write_register.call_count, 1)
+
+    def test_stale_not_elided(self):
+        automin = self.node.register('automin')
+        automin.restore(40, time.time())
+        flush_writes(self.hub, {automin: 40})
+        self.hub.write_register.assert_called_once_with(automin.address, 40)
+        self.assertFalse(automin.stale)
+
+    def test_flush_input_register(self):
+        writes = {self.node.register('automin'): 40,
+                  self.node.register('fan_actual'): 50}
+        self.assertRaises(TypeError, flush_writes, self.hub, writes)
+        self.hub.write_register.assert_not_called()
+        self.hub.write_registers.assert_not_called()
+
+    def test_flush_verified(self):
+        self.hub.verify_writes = True
+        automin = self.node.register('automin')
+        flush_writes(self.hub, {automin: 40})
+        self.assertEqual(automin.cached_value, 40)
+        self.assertTrue(automin.verify_pending)
+
+    def test_run_stats(self):
+        stop = threading.Event()
+        cycles = []
+
+        def step(cycle):
+            cycles.append(cycle.now)
+            if len(cycles) == 3:
+                stop.set()
+
+        loop = ControlLoop(self.hub, self.inputs, step, 0.01)
+        loop.run(stop)
+        stats = loop.stats
+        self.assertEqual(stats.cycles, 3)
+        self.assertGreaterEqual(stats.max_jitter, stats.mean_jitter)
+        self.assertGreaterEqual(stats.mean_jitter, 0)
+
+    def test_deadline_miss(self):
+        stop = threading.Event()
+
+        def step(cycle):
+            stop.wait(0.05)
+            stop.set()
+
+        loop = ControlLoop(self.hub, self.inputs, step, 0.01)
+        loop.run(stop)
+        self.assertEqual(loop.stats.misses, 1)
+        self.assertGreaterEqual(loop.stats.last_duration, 0.05)
+
+    def test_invalid_period(self):
+        self.assertRaises(ValueError, ControlLoop, self.hub, [], None, 0)
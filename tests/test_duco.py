@@ -1,6 +1,18 @@
 """Test methods in duco/duco.py."""
+import threading
 import unittest
+from unittest.mock import MagicMock
 import duco
+import duco.modbus
+from duco.duco import (
+    DucoBox,
+    TOPOLOGY_NODE_ADDED,
+    TOPOLOGY_NODE_REMOVED,
+    TOPOLOGY_NODE_TYPE_CHANGED
+    )
+from duco.enum_types import (ModuleType, ZoneAction)
+from duco.nodes import (Node)
+from duco.registers import (REGISTER_SPECS)
 from duco.const import (
     MAJOR_VERSION,
     MINOR_VERSION,
@@ -15,6 +27,299 @@ class TestDucoVersion(unittest.TestCase):
 
 
 
+def create_box(node_types, zones):
+    """Create a DucoBox with a mocked hub and the given node tree."""
+    box = DucoBox('serial', '/dev/usb0')
+    hub = MagicMock()
+    box._modbus_hub = hub
+    box.node_list = [Node.factory(idx + 1, node_type, hub)
+                     for idx, node_type in enumerate(node_types)]
+    for node, zone in zip(box.node_list, zones):
+        node.register('zone').decode([zone])
+    box.zone_index.build(box.node_list)
+    return box, hub
+
+
+class TestSharedHub(unittest.TestCase):
+    def test_unit_views(self):
+        hub = duco.modbus.ModbusHub(
+            duco.modbus.create_client_config('serial', '/dev/usb0'))
+        hub._client = MagicMock()
+        boxes = [DucoBox('serial', '/dev/usb0', modbus_master_unit_id=unit,
+                         cache_ttl=unit, modbus_hub=hub)
+                 for unit in (1, 2)]
+        for box in boxes:
+            box._DucoBox__probe_node_id(1)
+        self.assertEqual(
+            [c[1]['unit'] for c in
+             hub._client.read_input_registers.call_args_list], [1, 2])
+        self.assertEqual([box._modbus_hub.cache_ttl for box in boxes],
+                         [1, 2])
+        boxes[0].__exit__(None, None, None)
+        hub._client.close.assert_not_called()
+
+
+class TestResume(unittest.TestCase):
+    def test_catch_up_sweep(self):
+        box = DucoBox('tcp', 502, 'gw')
+        hub = box._modbus_hub
+        hub._client = MagicMock()
+        hub._client.read_input_registers.side_effect = [IOError, None]
+        swept = threading.Event()
+        box.sweep = swept.set
+        self.assertRaises(duco.modbus.ModbusConnectionError,
+                          hub.read_input_registers, 10)
+        hub._retry_at = 0
+        hub.read_input_registers(10)
+        self.assertTrue(swept.wait(5))
+
+    def test_listener_removed_on_exit(self):
+        box = DucoBox('tcp', 502, 'gw')
+        hub = box._modbus_hub
+        hub._client = MagicMock()
+        box.sweep = MagicMock()
+        box.__exit__(None, None, None)
+        hub._connected = False
+        hub.read_input_registers(10)
+        box.sweep.assert_not_called()
+
+
+class TestSweep(unittest.TestCase):
+    def test_read_many(self):
+        box, hub = create_box([ModuleType.MASTER, ModuleType.VALVE_CO2],
+                              [0, 1])
+        registers = [register for node in box.node_list
+                     for register in node.registers
+                     if register.spec != REGISTER_SPECS['action']]
+        hub.read_many.return_value = [[1]] * (len(registers) - 1) + [None]
+        updated = box.sweep()
+        hub.read_many.assert_called_once()
+        hub.read_input_registers.assert_not_called()
+        # the write-only action registers are not read
+        self.assertEqual(len(list(hub.read_many.call_args[0][0])),
+                         len(registers))
+        self.assertEqual(updated, registers[:-1])
+        self.assertEqual(updated[0].cached_value, 1)
+
+
+class TestControlLoop(unittest.TestCase):
+    def test_default_inputs(self):
+        box, hub = create_box([ModuleType.MASTER, ModuleType.VALVE_CO2],
+                              [0, 1])
+        loop = box.control_loop(lambda cycle: None, 5)
+        self.assertEqual(loop.period, 5)
+        count = sum(len(node.registers) for node in box.node_list)
+        hub.read_many.return_value = [None] * (count - 2)
+        loop.run_cycle()
+        ranges = list(hub.read_many.call_args[0][0])
+        # the write-only action registers are not read
+        self.assertEqual(len(ranges), count - 2)
+
+
+class TestZoneAction(unittest.TestCase):
+    def setUp(self):
+        self.box, self.hub = create_box(
+            [ModuleType.MASTER, ModuleType.VALVE_CO2,
+             ModuleType.ROOM_SENSOR_CO2], [0, 1, 1])
+        self.hub.write_register.return_value.isError.return_value = False
+
+    def test_zone_wide(self):
+        self.assertEqual(self.box.set_zone_action(1, ZoneAction.AWAY), [2])
+        self.hub.write_register.assert_called_once_with(29, 6)
+
+    def test_node_visibility(self):
+        self.assertEqual(self.box.set_zone_action(
+            1, ZoneAction.NODE_VISIBILITY_ON), [2, 3])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.box.set_zone_action, 5,
+                          ZoneAction.AWAY)
+        self.assertRaises(ValueError, self.box.set_zone_action, 1, 9)
+
+
+class TestApplyAction(unittest.TestCase):
+    def setUp(self):
+        self.box, self.hub = create_box(
+            [ModuleType.MASTER, ModuleType.VALVE_CO2,
+             ModuleType.ROOM_SENSOR_CO2], [0, 1, 1])
+        self.hub.write_register.return_value.isError.return_value = False
+
+    def test_serial(self):
+        results = self.box.apply_action(self.box.node_list, ZoneAction.AWAY)
+        self.assertEqual([r.node_id for r in results], [1, 2, 3])
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(self.hub.write_register.call_count, 3)
+
+    def test_failure_reported(self):
+        self.hub.write_register.side_effect = [
+            self.hub.write_register.return_value, IOError('timeout'),
+            None]
+        results = self.box.apply_action(self.box.node_list, ZoneAction.AWAY)
+        self.assertEqual([r.success for r in results], [True, False, False])
+        self.assertEqual(results[1].error, 'timeout')
+
+    def test_pooled(self):
+        self.box._client_config[duco.modbus.CONF_TYPE] = 'tcp'
+        pooled = MagicMock()
+        pooled.write_register.return_value.isError.return_value = False
+        self.box._connection_pool = [pooled, pooled]
+        results = self.box.apply_action(self.box.node_list,
+                                        ZoneAction.ZONE_TO_AUTO)
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(self.hub.write_register.call_count +
+                         pooled.write_register.call_count, 3)
+
+    def test_pool_spawned_from_hub(self):
+        self.box._client_config[duco.modbus.CONF_TYPE] = 'tcp'
+        pooled = self.hub.spawn.return_value
+        pooled.write_register.return_value.isError.return_value = False
+        results = self.box.apply_action(self.box.node_list,
+                                        ZoneAction.ZONE_TO_AUTO,
+                                        connections=2)
+        self.assertTrue(all(r.success for r in results))
+        self.hub.spawn.assert_called_once_with()
+        pooled.setup.assert_called_once()
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.box.apply_action,
+                          self.box.node_list, 9)
+        self.hub.write_register.assert_not_called()
+
+
+class TestTopology(unittest.TestCase):
+    def setUp(self):
+        self.box, self.hub = create_box(
+            [ModuleType.MASTER, ModuleType.VALVE_CO2,
+             ModuleType.ROOM_SENSOR_CO2], [0, 1, 1])
+        for node in self.box.node_list:
+            self.box.register_index.add_node(node)
+        self.bus = {node.node_id: node.node_type.value
+                    for node in self.box.node_list}
+        self.hub.read_input_registers.side_effect = self.read
+        self.hub.read_many.side_effect = self.read_many
+        self.down = False
+        self.events = []
+        self.box.add_topology_listener(self.events.append)
+
+    def read(self, address, count):
+        if address % 10:
+            return MagicMock(registers=[0] * count)
+        if address // 10 not in self.bus:
+            return None
+        return MagicMock(registers=[self.bus[address // 10]])
+
+    def read_many(self, ranges, max_gap=0, strict=False):
+        if self.down:
+            raise duco.modbus.ModbusConnectionError("down")
+        results = [self.read(address, count) for _, address, count in ranges]
+        return [None if result is None else result.registers
+                for result in results]
+
+    def probed(self):
+        return [address // 10 for call in self.hub.read_many.call_args_list
+                for _, address, _ in call[0][0]]
+
+    def test_unchanged(self):
+        nodes = list(self.box.node_list)
+        self.assertEqual(self.box.check_topology(), [])
+        self.assertEqual(self.box.node_list, nodes)
+        # known ids plus the lookahead ids, in two batches
+        self.assertEqual(self.probed(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.hub.read_many.call_count, 2)
+        self.hub.read_input_registers.assert_not_called()
+
+    def test_returned_at_gap(self):
+        del self.bus[2]
+        self.box.check_topology()
+        self.box.check_topology()
+        self.assertEqual([node.node_id for node in self.box.node_list],
+                         [1, 3])
+        self.bus[2] = ModuleType.VALVE_RH.value
+        events = self.box.check_topology()
+        self.assertEqual([(e.kind, e.node_id) for e in events],
+                         [(TOPOLOGY_NODE_ADDED, 2)])
+        self.assertEqual([node.node_id for node in self.box.node_list],
+                         [1, 2, 3])
+
+    def test_added(self):
+        self.bus[5] = ModuleType.ROOM_SENSOR_CO2.value
+        events = self.box.check_topology()
+        self.assertEqual([(e.kind, e.node_id) for e in events],
+                         [(TOPOLOGY_NODE_ADDED, 5)])
+        self.assertEqual(events, self.events)
+        self.assertEqual([node.node_id for node in self.box.node_list],
+                         [1, 2, 3, 5])
+        self.assertIsNotNone(self.box.register_index.get(
+            duco.modbus.REGISTER_TYPE_INPUT, 51))
+        self.assertIn(5, [n.node_id for n in self.box.zone_index.nodes(0)])
+
+    def test_removed_after_misses(self):
+        old = self.box.node_list[1]
+        del self.bus[2]
+        self.assertEqual(self.box.check_topology(), [])
+        events = self.box.check_topology()
+        self.assertEqual([(e.kind, e.node_id) for e in events],
+                         [(TOPOLOGY_NODE_REMOVED, 2)])
+        self.assertNotIn(old, self.box.node_list)
+        self.assertIsNone(self.box.register_index.get(
+            duco.modbus.REGISTER_TYPE_INPUT, 21))
+        self.assertEqual([n.node_id for n in self.box.zone_index.nodes(1)],
+                         [3])
+
+    def test_connection_down(self):
+        nodes = list(self.box.node_list)
+        self.down = True
+        self.assertEqual(self.box.check_topology(), [])
+        self.assertEqual(self.box.check_topology(), [])
+        self.assertEqual(self.box.node_list, nodes)
+        self.down = False
+        self.assertEqual(self.box.check_topology(), [])
+        self.assertEqual(self.box.node_list, nodes)
+
+    def test_type_changed(self):
+        kept = self.box.node_list[0]
+        self.bus[3] = ModuleType.ROOM_SENSOR_RH.value
+        events = self.box.check_topology()
+        self.assertEqual(events[0].kind, TOPOLOGY_NODE_TYPE_CHANGED)
+        self.assertEqual(events[0].new_type, ModuleType.ROOM_SENSOR_RH)
+        self.assertIs(self.box.node_list[0], kept)
+        self.assertEqual(self.box.node_list[2].node_type,
+                         ModuleType.ROOM_SENSOR_RH)
+
+
+class TestDiscover(unittest.TestCase):
+    def setUp(self):
+        self.box = DucoBox('serial', '/dev/usb0', discover_on_enter=False)
+        self.hub = MagicMock()
+        self.box._modbus_hub = self.hub
+        bus = {1: ModuleType.MASTER.value, 2: ModuleType.VALVE_CO2.value}
+
+        def read(address, count):
+            if address % 10:
+                return MagicMock(registers=[1] * count)
+            if address // 10 not in bus:
+                return None
+            return MagicMock(registers=[bus[address // 10]])
+        self.hub.read_input_registers.side_effect = read
+
+    def test_enter_does_not_probe(self):
+        with self.box as box:
+            self.assertEqual(box.node_list, [])
+        self.hub.read_input_registers.assert_not_called()
+
+    def test_streaming(self):
+        nodes = self.box.discover()
+        first = next(nodes)
+        self.assertEqual(first.node_id, 1)
+        self.assertEqual(self.box.node_list, [first])
+        # node 2 has not been probed yet
+        self.assertNotIn(20, [c[0][0] for c in
+                              self.hub.read_input_registers.call_args_list])
+        self.assertEqual([node.node_id for node in nodes], [2])
+        self.assertEqual(len(self.box.node_list), 2)
+        self.assertEqual(len(self.box.zone_index.nodes(1)), 2)
+
+
 """ class TestProbeNodeId(unittest.TestCase):
     def test_happyflow(self):
         duco.modbus.MODBUSHUB = MagicMock()
@@ -0,0 +1,65 @@
+"""Test methods in duco/fleet.py."""
+import queue
+import unittest
+from unittest.mock import MagicMock
+from duco.enum_types import (ModuleType)
+from duco.fleet import (BoxConfig, FleetPoller, pack_readings, shard_boxes)
+from duco.nodes import (Node)
+
+
+class TestShardBoxes(unittest.TestCase):
+    """Class that tests shard_boxes function."""
+
+    def test_endpoint_kept_together(self):
+        configs = [BoxConfig('tcp', 502, 'gw1', 1),
+                   BoxConfig('tcp', 502, 'gw1', 2),
+                   BoxConfig('tcp', 502, 'gw2', 1),
+                   BoxConfig('serial', '/dev/usb0')]
+        shards = shard_boxes(configs, 2)
+        self.assertEqual(len(shards), 2)
+        for shard in shards:
+            endpoints = set(config.endpoint for _, config in shard)
+            if ('tcp', 'gw1', 502) in endpoints:
+                self.assertEqual(len(shard), 2)
+        self.assertEqual(sorted(idx for shard in shards for idx, _ in shard),
+                         [0, 1, 2, 3])
+
+    def test_more_shards_than_boxes(self):
+        shards = shard_boxes([BoxConfig('serial', '/dev/usb0')], 4)
+        self.assertEqual(len(shards), 1)
+
+
+class TestPackReadings(unittest.TestCase):
+    """Class that tests packing and merging of readings."""
+
+    def test_roundtrip(self):
+        hub = MagicMock()
+        hub.read_input_registers.return_value.registers = [215]
+        node = Node.factory(3, ModuleType.VALVE_SENSORLESS, hub)
+        node._reg_temperature.update()
+        data = pack_readings(7, node.registers)
+        poller = FleetPoller([])
+        self.assertEqual(poller.merge(data), 1)
+        value, timestamp = poller.values[(7, 3, 3)]
+        self.assertEqual(value, 21.5)
+        self.assertEqual(timestamp, node._reg_temperature.timestamp)
+
+
+class TestFleetPoller(unittest.TestCase):
+    """Class that tests FleetPoller."""
+
+    def test_stop_drains_results(self):
+        hub = MagicMock()
+        hub.read_input_registers.return_value.registers = [215]
+        node = Node.factory(3, ModuleType.VALVE_SENSORLESS, hub)
+        node._reg_temperature.update()
+        poller = FleetPoller([], interval=1)
+        poller._results = queue.Queue()
+        poller._results.put(pack_readings(0, node.registers))
+        worker = MagicMock()
+        # the worker exits once its sweep was taken from the queue
+        worker.is_alive.side_effect = lambda: not poller._results.empty()
+        poller._workers = [worker]
+        poller.stop()
+        self.assertIn((0, 3, 3), poller.values)
+        worker.terminate.assert_not_called()
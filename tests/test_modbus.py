@@ -1,7 +1,10 @@
 """Test methods in duco/modbus.py."""
+import threading
+import struct
+import time
 import unittest
 # from unittest.mock import Mock
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, call, patch
 from duco.const import (DUCO_MODULE_TYPE_MASTER)
 from duco.enum_types import (ModuleType)
 import duco.modbus
@@ -125,14 +128,488 @@ class TestModbusRegister(unittest.TestCase):
         r_offset = 3
         r_data_type = duco.modbus.DATA_TYPE_INT
         r_precision = 4
-        reg = duco.modbus.ModbusRegister(r_hub, r_name, r_reg, r_reg_type, r_unit,
-                                         r_count, r_scale, r_offset, r_data_type,
-                                         r_precision)
+        spec = duco.modbus.RegisterSpec(r_name, 9, r_reg_type, r_unit,
+                                        r_count, r_scale, r_offset,
+                                        r_data_type, r_precision)
+        reg = duco.modbus.ModbusRegister(r_hub, spec, r_reg)
         self.assertEqual(reg.name, r_name, "")
         self.assertEqual(reg.unit_of_measurement, r_unit, "")
-        self.assertEqual(reg._count, r_count)
-        self.assertEqual(reg._scale, r_scale)
-        self.assertEqual(reg._offset, r_offset)
-        self.assertEqual(reg._data_type, r_data_type)
-        self.assertEqual(reg._precision, r_precision)
+        self.assertIs(reg.spec, spec)
+        self.assertEqual(reg._register, r_reg)
+        self.assertEqual(reg.spec.count, r_count)
+        self.assertEqual(reg.spec.scale, r_scale)
+        self.assertEqual(reg.spec.offset, r_offset)
+        self.assertEqual(reg.spec.data_type, r_data_type)
+        self.assertEqual(reg.spec.precision, r_precision)
         self.assertEqual(reg._value, None)
+        self.assertEqual(reg.timestamp, None)
+
+    def test_slots(self):
+        spec = duco.modbus.RegisterSpec('Zone', 9,
+                                        duco.modbus.REGISTER_TYPE_INPUT, '',
+                                        1, 1, 0, duco.modbus.DATA_TYPE_INT, 0)
+        reg = duco.modbus.ModbusRegister(MagicMock(), spec, 19)
+        self.assertFalse(hasattr(reg, '__dict__'))
+        with self.assertRaises(AttributeError):
+            reg.foo = 1
+
+    def test_update(self):
+        spec = duco.modbus.RegisterSpec('Temperature', 3,
+                                        duco.modbus.REGISTER_TYPE_INPUT, '',
+                                        1, 0.1, 0, duco.modbus.DATA_TYPE_INT,
+                                        1)
+        r_hub = MagicMock()
+        r_hub.cache_ttl = 0
+        r_hub.read_input_registers.return_value.registers = [215]
+        reg = duco.modbus.ModbusRegister(r_hub, spec, 13)
+        self.assertEqual(reg.value, '21.5')
+        r_hub.read_input_registers.assert_called_with(13, 1)
+        self.assertIsNotNone(reg.timestamp)
+        r_hub.read_input_registers.return_value.registers = [0xFFFF]
+        self.assertEqual(reg.value, '-0.1')
+
+
+class TestModbusHubSingleFlight(unittest.TestCase):
+    def test_concurrent_reads_shared(self):
+        started = threading.Event()
+        release = threading.Event()
+        response = MagicMock()
+
+        def slow_read(address, count, **kwargs):
+            started.set()
+            release.wait(5)
+            return response
+
+        modbus_client = MagicMock()
+        modbus_client.read_input_registers.side_effect = slow_read
+        client_config = duco.modbus.create_client_config('serial', '/dev/usb0')
+        hub = duco.modbus.ModbusHub(client_config)
+        hub._client = modbus_client
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(hub.read_input_registers(42)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(
+            target=lambda: results.append(hub.read_input_registers(42)))
+            for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        # give the followers time to join the in-flight read
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(results, [response] * 4)
+        modbus_client.read_input_registers.assert_called_once()
+        self.assertEqual(hub._inflight, {})
+
+    def test_failed_read_propagates(self):
+        modbus_client = MagicMock()
+        modbus_client.read_holding_registers.side_effect = IOError
+        client_config = duco.modbus.create_client_config('serial', '/dev/usb0')
+        hub = duco.modbus.ModbusHub(client_config)
+        hub._client = modbus_client
+        self.assertRaises(IOError, hub.read_holding_registers, 42)
+        self.assertEqual(hub._inflight, {})
+
+
+class TestModbusHubWorker(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+        def execute(function):
+            def call(address, arg, **kwargs):
+                self.calls.append((function, address))
+                if address == 1:
+                    self.started.set()
+                    self.release.wait(5)
+                return MagicMock(registers=[address])
+            return call
+
+        modbus_client = MagicMock()
+        for function in ('read_input_registers', 'read_holding_registers',
+                         'write_register'):
+            getattr(modbus_client, function).side_effect = execute(function)
+        client_config = duco.modbus.create_client_config('serial', '/dev/usb0')
+        self.hub = duco.modbus.ModbusHub(client_config)
+        self.hub._client = modbus_client
+        self.hub.start_worker()
+
+    def tearDown(self):
+        self.release.set()
+        self.hub.stop_worker()
+
+    def test_stop_while_calling(self):
+        self.release.set()
+        results = []
+
+        def read():
+            for address in range(2, 202):
+                results.append(self.hub.read_input_registers(address))
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        self.hub.stop_worker()
+        for reader in readers:
+            reader.join(5)
+            self.assertFalse(reader.is_alive())
+        self.assertEqual(len(results), 800)
+
+    def test_submit_without_worker(self):
+        self.hub.stop_worker()
+        self.assertRaises(RuntimeError, self.hub.submit_read_input_registers,
+                          10)
+
+    def test_blocking_methods_use_worker(self):
+        self.release.set()
+        self.assertEqual(self.hub.read_input_registers(10).registers, [10])
+        self.assertEqual(self.hub.write_register(20, 3).registers, [20])
+
+    def test_batch_reordered_and_merged(self):
+        first = self.hub.submit_read_input_registers(1)
+        self.started.wait(5)
+        # queued while the worker is busy with the first read
+        reads = [self.hub.submit_read_input_registers(5) for _ in range(2)]
+        low = self.hub.submit_read_input_registers(3)
+        write = self.hub.submit_write_register(7, 1)
+        self.release.set()
+        self.assertEqual(reads[0].result(5), reads[1].result(5))
+        self.assertEqual(low.result(5).registers, [3])
+        write.result(5)
+        first.result(5)
+        self.assertEqual(self.calls, [('read_input_registers', 1),
+                                      ('write_register', 7),
+                                      ('read_input_registers', 3),
+                                      ('read_input_registers', 5)])
+
+    def test_exception_delivered(self):
+        self.release.set()
+        self.hub._client.read_holding_registers.side_effect = IOError
+        future = self.hub.submit_read_holding_registers(10)
+        self.assertRaises(IOError, future.result, 5)
+
+
+class TestModbusHubReadMany(unittest.TestCase):
+    def setUp(self):
+        def read(address, count, **kwargs):
+            if address in self.failing:
+                return None
+            return MagicMock(registers=list(range(address, address + count)))
+
+        self.failing = set()
+        self.client = MagicMock()
+        self.client.read_input_registers.side_effect = read
+        self.client.read_holding_registers.side_effect = read
+        client_config = duco.modbus.create_client_config('serial', '/dev/usb0')
+        self.hub = duco.modbus.ModbusHub(client_config)
+        self.hub._client = self.client
+
+    def test_merged(self):
+        results = self.hub.read_many([
+            (duco.modbus.REGISTER_TYPE_INPUT, 13, 1),
+            (duco.modbus.REGISTER_TYPE_INPUT, 10, 3),
+            (duco.modbus.REGISTER_TYPE_INPUT, 11, 2),
+            (duco.modbus.REGISTER_TYPE_INPUT, 20, 1),
+            (duco.modbus.REGISTER_TYPE_HOLDING, 14, 1)])
+        self.assertEqual(results, [[13], [10, 11, 12], [11, 12], [20],
+                                   [14]])
+        self.assertEqual(self.client.read_input_registers.call_count, 2)
+        self.client.read_input_registers.assert_any_call(10, 4, unit=0)
+        self.client.read_holding_registers.assert_called_once_with(
+            14, 1, unit=0)
+
+    def test_max_gap(self):
+        results = self.hub.read_many(
+            [(duco.modbus.REGISTER_TYPE_INPUT, address, 1)
+             for address in (10, 20, 40)], max_gap=9)
+        self.assertEqual(results, [[10], [20], [40]])
+        self.client.read_input_registers.assert_has_calls(
+            [call(10, 11, unit=0), call(40, 1, unit=0)])
+        self.assertEqual(self.client.read_input_registers.call_count, 2)
+
+    def test_connection_down(self):
+        self.client.read_input_registers.side_effect = IOError
+        ranges = [(duco.modbus.REGISTER_TYPE_INPUT, 10, 1)]
+        self.assertEqual(self.hub.read_many(ranges), [None])
+        self.assertRaises(duco.modbus.ModbusConnectionError,
+                          self.hub.read_many, ranges, strict=True)
+
+    def test_max_count(self):
+        results = self.hub.read_many(
+            [(duco.modbus.REGISTER_TYPE_INPUT, address, 1)
+             for address in range(200)])
+        self.assertEqual(results, [[address] for address in range(200)])
+        self.assertEqual(self.client.read_input_registers.call_count, 2)
+
+    def test_failed_request_split(self):
+        self.failing = {10}
+        results = self.hub.read_many([
+            (duco.modbus.REGISTER_TYPE_INPUT, 10, 1),
+            (duco.modbus.REGISTER_TYPE_INPUT, 11, 1)])
+        self.assertEqual(results, [None, [11]])
+
+    def test_empty(self):
+        self.assertEqual(self.hub.read_many([]), [])
+        self.assertEqual(duco.modbus.plan_reads([]), [])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.hub.read_many,
+                          [('coil', 10, 1)])
+        self.assertRaises(ValueError, self.hub.read_many,
+                          [(duco.modbus.REGISTER_TYPE_INPUT, 10, 126)])
+
+
+class TestModbusUnit(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        client_config = duco.modbus.create_client_config('serial', '/dev/usb0')
+        self.hub = duco.modbus.ModbusHub(client_config)
+        self.hub._client = self.client
+
+    def test_unit_kwarg(self):
+        self.hub.read_input_registers(10, 2, unit=3)
+        self.client.read_input_registers.assert_called_once_with(
+            10, 2, unit=3)
+        self.hub.write_register(10, 2)
+        self.client.write_register.assert_called_once_with(10, 2, unit=0)
+
+    def test_view(self):
+        view = self.hub.unit_view(2)
+        self.hub.cache_ttl = 5
+        view.cache_ttl = 10
+        self.assertIs(view.hub, self.hub)
+        view.read_holding_registers(15)
+        self.client.read_holding_registers.assert_called_once_with(
+            15, 1, unit=2)
+        view.read_many([(duco.modbus.REGISTER_TYPE_INPUT, 11, 1)])
+        self.client.read_input_registers.assert_called_once_with(
+            11, 1, unit=2)
+        view.write_register(15, 1)
+        self.client.write_register.assert_called_once_with(15, 1, unit=2)
+        view.close()
+        self.client.close.assert_not_called()
+        self.assertEqual(self.hub.cache_ttl, 5)
+
+    def test_view_setup_once(self):
+        hub = MagicMock()
+        hub.is_set_up = False
+        hub.unit_view = lambda unit: duco.modbus.ModbusUnit(hub, unit)
+        hub.unit_view(1).setup()
+        hub.is_set_up = True
+        hub.unit_view(2).setup()
+        hub.setup.assert_called_once()
+
+    def test_round_robin(self):
+        reads = {1: {('read', 30, 1, 1): 'a', ('read', 10, 1, 1): 'b'},
+                 2: {('read', 20, 1, 2): 'c'}}
+        self.assertEqual([futures for _, futures in
+                          duco.modbus._round_robin(reads)],
+                         ['b', 'c', 'a'])
+
+    def test_fair_lock_order(self):
+        lock = duco.modbus._FairLock()
+        order = []
+        lock.acquire()
+        threads = []
+        for index in range(3):
+            thread = threading.Thread(
+                target=lambda index=index: (lock.acquire(),
+                                            order.append(index),
+                                            lock.release()))
+            thread.start()
+            threads.append(thread)
+            # make sure the thread is waiting before starting the next
+            time.sleep(0.05)
+        lock.release()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, [0, 1, 2])
+
+
+class TestModbusHubReconnect(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.response = MagicMock(registers=[1])
+        client_config = duco.modbus.create_client_config('tcp', 502, 'gw')
+        self.hub = duco.modbus.ModbusHub(client_config)
+        self.hub._client = self.client
+        self.resumed = []
+        self.hub.add_resume_listener(lambda: self.resumed.append(True))
+
+    def test_fail_fast_and_resume(self):
+        self.client.read_input_registers.side_effect = [
+            IOError('reset'), self.response, self.response]
+        self.assertRaises(duco.modbus.ModbusConnectionError,
+                          self.hub.read_input_registers, 10)
+        self.client.close.assert_called_once()
+        # backing off, the client is not used
+        self.assertRaises(duco.modbus.ModbusConnectionError,
+                          self.hub.read_input_registers, 10)
+        self.assertEqual(self.client.read_input_registers.call_count, 1)
+        self.hub._retry_at = 0
+        self.assertIs(self.hub.read_input_registers(10), self.response)
+        self.client.connect.assert_called_once()
+        self.assertEqual(self.resumed, [True])
+        self.hub.read_input_registers(10)
+        self.assertEqual(self.resumed, [True])
+
+    def test_other_error_keeps_connection(self):
+        self.client.write_register.side_effect = struct.error
+        self.assertRaises(struct.error, self.hub.write_register, 10, -1)
+        self.client.close.assert_not_called()
+        self.hub.read_input_registers(10)
+        self.assertEqual(self.client.read_input_registers.call_count, 1)
+
+    def test_backoff_grows(self):
+        self.client.read_input_registers.side_effect = IOError
+        delays = []
+        for _ in range(8):
+            self.hub._retry_at = 0
+            self.assertRaises(IOError, self.hub.read_input_registers, 10)
+            delays.append(self.hub._retry_delay)
+        self.assertEqual(delays, [0.5, 1, 2, 4, 8, 16, 30, 30])
+        self.assertEqual(self.resumed, [])
+
+    def test_register_update(self):
+        self.client.read_input_registers.side_effect = IOError
+        spec = duco.modbus.RegisterSpec('Status', 1,
+                                        duco.modbus.REGISTER_TYPE_INPUT,
+                                        '', 1, 1, 0,
+                                        duco.modbus.DATA_TYPE_INT, 0)
+        reg = duco.modbus.ModbusRegister(self.hub, spec, 11)
+        self.assertFalse(reg.update())
+        self.assertEqual(self.hub.read_many(
+            [(duco.modbus.REGISTER_TYPE_INPUT, 11, 1)]), [None])
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        client_config = duco.modbus.create_client_config('serial', '/dev/usb0')
+        self.hub = duco.modbus.ModbusHub(client_config)
+        self.hub._client = MagicMock()
+
+    def test_token_bucket(self):
+        bucket = duco.modbus.TokenBucket(10, burst=20)
+        self.assertEqual(bucket.reserve(20, now=bucket._time), 0)
+        self.assertAlmostEqual(bucket.reserve(5, now=bucket._time), 0.5)
+        # refilled after one second, the debt of 5 is paid off
+        self.assertEqual(bucket.reserve(5, now=bucket._time + 1), 0)
+        self.assertRaises(ValueError, duco.modbus.TokenBucket, 0)
+
+    @patch('duco.modbus.time.sleep')
+    def test_reads_throttled(self, sleep):
+        self.hub.set_rate_limit(registers_per_second=100)
+        self.hub.read_input_registers(10, 100)
+        sleep.assert_not_called()
+        self.hub.read_input_registers(10, 50)
+        self.assertAlmostEqual(sleep.call_args[0][0], 0.5, places=2)
+        requests, seconds = self.hub.throttle_stats()[0]
+        self.assertEqual(requests, 1)
+        self.assertAlmostEqual(seconds, 0.5, places=2)
+
+    @patch('duco.modbus.time.sleep')
+    def test_writes_not_delayed(self, sleep):
+        self.hub.set_rate_limit(requests_per_second=1)
+        for _ in range(3):
+            self.hub.write_register(10, 1)
+        sleep.assert_not_called()
+        # the reads pay for the writes
+        self.hub.read_input_registers(10)
+        self.assertGreater(sleep.call_args[0][0], 2)
+
+    @patch('duco.modbus.time.sleep')
+    def test_per_unit(self, sleep):
+        self.hub.unit_view(2).set_rate_limit(requests_per_second=1)
+        self.hub.read_input_registers(10, unit=2)
+        self.hub.read_input_registers(10, unit=3)
+        self.hub.read_input_registers(11, unit=3)
+        sleep.assert_not_called()
+        self.hub.read_input_registers(11, unit=2)
+        sleep.assert_called_once()
+        self.assertEqual(list(self.hub.throttle_stats()), [2])
+        self.hub.set_rate_limit(unit=2)
+        self.hub.read_input_registers(12, unit=2)
+        sleep.assert_called_once()
+
+    @patch('duco.modbus.time.sleep')
+    def test_spawned_hub_shares_limits(self, sleep):
+        self.hub.set_rate_limit(requests_per_second=1)
+        self.hub.cache_ttl = 5
+        spawned = self.hub.spawn(unit=3)
+        spawned._client = MagicMock()
+        self.assertEqual(spawned.unit, 3)
+        self.assertEqual(spawned.cache_ttl, 5)
+        self.hub.read_input_registers(10)
+        spawned.read_input_registers(10)
+        sleep.assert_called_once()
+        self.assertEqual(list(self.hub.throttle_stats()), [3])
+
+
+class TestModbusRegisterWrite(unittest.TestCase):
+    def setUp(self):
+        self.hub = MagicMock()
+        self.hub.write_elision = True
+        self.hub.verify_writes = False
+        self.hub.cache_ttl = 60
+        self.hub.write_register.return_value.isError.return_value = False
+        spec = duco.modbus.RegisterSpec('AutoMin', 5,
+                                        duco.modbus.REGISTER_TYPE_HOLDING,
+                                        '%', 1, 1, 0,
+                                        duco.modbus.DATA_TYPE_INT, 0)
+        self.reg = duco.modbus.ModbusRegister(self.hub, spec, 15)
+
+    def test_read_your_writes(self):
+        self.assertTrue(self.reg.write(20))
+        self.hub.write_register.assert_called_once_with(15, 20)
+        self.assertEqual(self.reg.cached_value, 20)
+        self.assertEqual(self.reg.value, '20')
+        self.hub.read_holding_registers.assert_not_called()
+
+    def test_elision(self):
+        self.reg.value = 20
+        self.reg.value = 20
+        self.hub.write_register.assert_called_once_with(15, 20)
+        self.assertTrue(self.reg.write(20, force=True))
+        self.assertEqual(self.hub.write_register.call_count, 2)
+        self.hub.write_elision = False
+        self.reg.value = 20
+        self.assertEqual(self.hub.write_register.call_count, 3)
+
+    def test_no_elision_of_expired_value(self):
+        self.reg.value = 20
+        self.hub.cache_ttl = 0
+        self.reg.value = 20
+        self.assertEqual(self.hub.write_register.call_count, 2)
+
+    def test_no_elision_of_stale_value(self):
+        self.reg.restore(20, time.time())
+        self.reg.value = 20
+        self.hub.write_register.assert_called_once_with(15, 20)
+        self.assertFalse(self.reg.stale)
+
+    def test_failed_write(self):
+        self.hub.write_register.return_value.isError.return_value = True
+        self.assertFalse(self.reg.write(20))
+        self.assertIsNone(self.reg.cached_value)
+
+    def test_verify(self):
+        self.hub.verify_writes = True
+        self.reg.write(20)
+        self.assertTrue(self.reg.verify_pending)
+        self.hub.read_holding_registers.return_value.registers = [25]
+        with self.assertLogs('python-duco', 'WARNING'):
+            self.reg.update()
+        self.assertFalse(self.reg.verify_pending)
+
+    def test_input_not_writable(self):
+        spec = duco.modbus.RegisterSpec('Zone', 9,
+                                        duco.modbus.REGISTER_TYPE_INPUT, '',
+                                        1, 1, 0, duco.modbus.DATA_TYPE_INT, 0)
+        reg = duco.modbus.ModbusRegister(self.hub, spec, 19)
+        self.assertRaises(TypeError, reg.write, 1)
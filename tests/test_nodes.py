@@ -1,6 +1,38 @@
 """Test methods in duco/nodes.py."""
+import unittest
+from unittest.mock import MagicMock
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+from duco.registers import (REGISTER_SPECS)
 
 
 def test_nodes():
     """Test duco dummy."""
     return True
+
+
+class TestNodeRegisters(unittest.TestCase):
+    """Class that tests the register layout of nodes."""
+
+    def test_specs_shared(self):
+        hub = MagicMock()
+        node_a = Node.factory(2, ModuleType.VALVE_CO2, hub)
+        node_b = Node.factory(3, ModuleType.VALVE_CO2, hub)
+        self.assertIs(node_a._reg_co2_value.spec,
+                      node_b._reg_co2_value.spec)
+        self.assertEqual(node_a._reg_co2_value._register, 24)
+        self.assertEqual(node_b._reg_co2_value._register, 34)
+
+    def test_registers_only_container(self):
+        hub = MagicMock()
+        for module_type in (ModuleType.MASTER, ModuleType.VALVE_RH,
+                            ModuleType.ROOM_SENSOR_CO2):
+            node = Node.factory(2, module_type, hub)
+            self.assertFalse(hasattr(node, '__dict__'))
+            for register in node.registers:
+                key = next(key for key, spec in REGISTER_SPECS.items()
+                           if spec is register.spec)
+                self.assertIs(node.register(key), register)
+            self.assertIs(node._reg_status, node.register('status'))
+            self.assertIsNone(node.register('flow' if module_type ==
+                                            ModuleType.MASTER else 'x'))
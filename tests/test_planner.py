@@ -0,0 +1,74 @@
+"""Test methods in duco/planner.py."""
+import unittest
+from unittest.mock import MagicMock
+import duco.modbus
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+from duco.planner import (CapacityPlanner)
+
+
+def create_nodes(count):
+    hub = MagicMock()
+    return [Node.factory(node_id, ModuleType.VALVE_CO2, hub)
+            for node_id in range(1, count + 1)]
+
+
+class TestCapacityPlanner(unittest.TestCase):
+    def test_serial_request_time(self):
+        planner = CapacityPlanner.serial(turnaround=0)
+        register = create_nodes(1)[0].register('co2_value')
+        # 15 frame bytes and 2 silences of 3.5 characters at 9600 8N1
+        self.assertAlmostEqual(planner.sweep_time([register]),
+                               22 * 10 / 9600.0)
+        fast = CapacityPlanner.serial(baudrate=38400, parity='E',
+                                      turnaround=0)
+        self.assertAlmostEqual(fast.sweep_time([register]),
+                               15 * 11 / 38400.0 + 2 * 0.00175)
+
+    def test_coalesced(self):
+        planner = CapacityPlanner.tcp(0.01)
+        node = create_nodes(1)[0]
+        registers = [node.register(key) for key in
+                     ('status', 'fan_actual', 'temperature', 'co2_value')]
+        self.assertAlmostEqual(planner.sweep_time(registers), 0.01)
+
+    def test_fits(self):
+        planner = CapacityPlanner.tcp(0.01)
+        plan = planner.plan(create_nodes(2), {'CO2 value': 10},
+                            default_interval=60)
+        self.assertTrue(plan.fits)
+        self.assertLess(plan.utilization, 0.8)
+        self.assertEqual(plan.intervals['CO2 value'], 10)
+        self.assertEqual(set(plan.sweep_times), {10, 60})
+
+    def test_commands_not_planned(self):
+        planner = CapacityPlanner.tcp(0.01)
+        nodes = create_nodes(2)
+        plan = planner.plan(nodes)
+        self.assertNotIn('Zone action', plan.intervals)
+        readable = [register for node in nodes
+                    for register in node.registers
+                    if register.name != 'Zone action']
+        self.assertAlmostEqual(plan.sweep_times[60],
+                               planner.sweep_time(readable))
+
+    def test_stretched(self):
+        planner = CapacityPlanner.serial(turnaround=0.05)
+        plan = planner.plan(create_nodes(40), default_interval=1)
+        self.assertFalse(plan.fits)
+        factor = plan.utilization / planner.max_utilization
+        self.assertTrue(all(abs(interval - factor) < 1e-9
+                            for interval in plan.intervals.values()))
+        stretched = planner.plan(create_nodes(40),
+                                 default_interval=factor * 1.001)
+        self.assertTrue(stretched.fits)
+
+    def test_for_client_config(self):
+        serial = duco.modbus.create_client_config('serial', '/dev/usb0')
+        self.assertIsInstance(CapacityPlanner.for_client_config(serial),
+                              CapacityPlanner)
+        tcp = duco.modbus.create_client_config('tcp', 502, 'gw')
+        self.assertRaises(ValueError, CapacityPlanner.for_client_config,
+                          tcp)
+        planner = CapacityPlanner.for_client_config(tcp, rtt=0.02)
+        self.assertEqual(planner.max_utilization, 0.8)
@@ -0,0 +1,46 @@
+"""Test methods in duco/polling.py."""
+import unittest
+from unittest.mock import MagicMock
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+from duco.polling import (AdaptivePoller, AdaptivePolicy)
+
+
+class TestAdaptivePoller(unittest.TestCase):
+    """Class that tests AdaptivePoller."""
+
+    def setUp(self):
+        self.hub = MagicMock()
+        self.node = Node.factory(2, ModuleType.VALVE_CO2, self.hub)
+        self.register = self.node._reg_co2_value
+        self.policy = AdaptivePolicy(min_interval=10, max_interval=640)
+        self.now = 0
+
+    def poll(self, poller, values, step):
+        for value in values:
+            self.hub.read_input_registers.return_value.registers = [value]
+            self.now += step
+            poller.poll_due(self.now)
+
+    def test_flat_widens(self):
+        poller = AdaptivePoller([self.register], self.policy)
+        self.poll(poller, [600] * 10, 1000)
+        self.assertEqual(poller.interval(self.register), 640)
+
+    def test_climbing_narrows(self):
+        poller = AdaptivePoller([self.register], self.policy)
+        self.poll(poller, [600] * 10, 1000)
+        self.poll(poller, [600, 5600], 1000)
+        self.assertEqual(poller.interval(self.register), 10)
+
+    def test_not_due(self):
+        poller = AdaptivePoller([self.register], self.policy)
+        self.assertEqual(poller.poll_due(0), [self.register])
+        self.assertEqual(poller.poll_due(5), [])
+        self.assertEqual(poller.next_due(5), 5)
+
+    def test_budget(self):
+        policy = AdaptivePolicy(min_interval=10, max_interval=640, budget=0.1)
+        poller = AdaptivePoller(self.node.registers, policy)
+        self.assertAlmostEqual(poller.budget_factor(),
+                               len(self.node.registers) / 10 / 0.1)
@@ -0,0 +1,107 @@
+"""Test methods in duco/proxy.py."""
+import socket
+import struct
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from duco.proxy import (ModbusProxy, MBAP_STRUCT)
+
+
+class TestModbusProxy(unittest.TestCase):
+    """Class that tests ModbusProxy."""
+
+    def setUp(self):
+        self.hub = MagicMock()
+        self.hub.read_input_registers.return_value.registers = [1, 2, 3]
+        self.hub.write_register.return_value.isError.return_value = False
+        self.hub.write_registers.return_value.isError.return_value = False
+        self.proxy = ModbusProxy(self.hub, 'localhost', 0, cache_ttl=60)
+        self.proxy.start()
+        self.thread = threading.Thread(target=self.proxy.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.proxy.shutdown()
+        self.thread.join()
+
+    def request(self, pdu, transaction=1, unit=1):
+        with socket.create_connection(self.proxy.server_address) as sock:
+            sock.sendall(MBAP_STRUCT.pack(transaction, 0, len(pdu) + 1,
+                                          unit) + pdu)
+            header = sock.recv(MBAP_STRUCT.size)
+            _, _, length, _ = MBAP_STRUCT.unpack(header)
+            return sock.recv(length - 1)
+
+    def test_read_cached(self):
+        pdu = struct.pack('>BHH', 0x04, 20, 3)
+        expected = struct.pack('>BB3H', 0x04, 6, 1, 2, 3)
+        self.assertEqual(self.request(pdu), expected)
+        self.assertEqual(self.request(pdu), expected)
+        self.hub.read_input_registers.assert_called_once_with(20, 3, unit=1)
+
+    def test_read_failed(self):
+        self.hub.read_holding_registers.return_value = None
+        pdu = struct.pack('>BHH', 0x03, 20, 1)
+        self.assertEqual(self.request(pdu), b'\x83\x0b')
+
+    def test_write_single(self):
+        pdu = struct.pack('>BHH', 0x06, 29, 5)
+        self.assertEqual(self.request(pdu), pdu)
+        self.hub.write_register.assert_called_once_with(29, 5, unit=1)
+
+    def test_write_multiple(self):
+        pdu = struct.pack('>BHHB2H', 0x10, 24, 2, 4, 50, 60)
+        self.assertEqual(self.request(pdu), struct.pack('>BHH', 0x10, 24, 2))
+        self.hub.write_registers.assert_called_once_with(
+            24, [50, 60], unit=1)
+
+    def test_write_failed(self):
+        self.hub.write_register.return_value = None
+        pdu = struct.pack('>BHH', 0x06, 29, 5)
+        self.assertEqual(self.request(pdu), b'\x86\x0b')
+        error = MagicMock(exception_code=0x02)
+        error.isError.return_value = True
+        self.hub.write_register.return_value = error
+        self.assertEqual(self.request(pdu), b'\x86\x02')
+
+    def test_empty_frame(self):
+        with socket.create_connection(self.proxy.server_address) as sock:
+            sock.settimeout(5)
+            sock.sendall(MBAP_STRUCT.pack(1, 0, 0, 1))
+            self.assertEqual(sock.recv(16), b'')
+
+    def test_units_cached_separately(self):
+        self.hub.read_input_registers.side_effect = (
+            lambda address, count, unit: MagicMock(registers=[unit] * count))
+        pdu = struct.pack('>BHH', 0x04, 20, 1)
+        self.assertEqual(self.request(pdu, unit=1), b'\x04\x02\x00\x01')
+        self.assertEqual(self.request(pdu, unit=2), b'\x04\x02\x00\x02')
+        self.assertEqual(self.hub.read_input_registers.call_count, 2)
+
+    def test_write_invalidates_inflight_read(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def read(address, count, unit):
+            started.set()
+            release.wait(5)
+            return MagicMock(registers=[7])
+
+        self.hub.read_holding_registers.side_effect = read
+        reader = threading.Thread(target=self.proxy.read, args=(1, 3, 24, 1))
+        reader.start()
+        started.wait(5)
+        writer = threading.Thread(target=self.proxy.write, args=(1, 24, [9]))
+        writer.start()
+        while self.proxy._inflight:
+            time.sleep(0.01)
+        release.set()
+        reader.join()
+        writer.join()
+        self.assertEqual(self.proxy._cache, {})
+        self.proxy.read(1, 3, 24, 1)
+        self.assertEqual(self.hub.read_holding_registers.call_count, 2)
+
+    def test_illegal_function(self):
+        self.assertEqual(self.request(b'\x01\x00\x00\x00\x01'), b'\x81\x01')
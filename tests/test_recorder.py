@@ -0,0 +1,57 @@
+"""Test methods in duco/recorder.py."""
+import unittest
+from unittest.mock import MagicMock
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+from duco.recorder import (SQLiteRecorder, decode_value, encode_value)
+
+
+class TestEncoding(unittest.TestCase):
+    """Class that tests the integer encoding of values."""
+
+    def test_roundtrip(self):
+        # temperature, precision 1
+        self.assertEqual(encode_value(3, 21.5), 215)
+        self.assertEqual(decode_value(3, 215), 21.5)
+        # rh, precision 2
+        self.assertEqual(encode_value(5, 45.67), 4567)
+        self.assertEqual(decode_value(5, 4567), 45.67)
+        # co2, precision 0
+        self.assertEqual(encode_value(4, 650), 650)
+        self.assertEqual(decode_value(4, 650), 650)
+
+
+class TestSQLiteRecorder(unittest.TestCase):
+    """Class that tests SQLiteRecorder."""
+
+    def setUp(self):
+        self.hub = MagicMock()
+        self.node = Node.factory(2, ModuleType.VALVE_SENSORLESS, self.hub)
+        self.recorder = SQLiteRecorder(':memory:')
+
+    def tearDown(self):
+        self.recorder.close()
+
+    def record_temperature(self, raw, timestamp):
+        self.hub.read_input_registers.return_value.registers = [raw]
+        self.node._reg_temperature.update()
+        return self.recorder.record([self.node._reg_temperature,
+                                     self.node._reg_flow], timestamp)
+
+    def test_record(self):
+        self.assertEqual(self.record_temperature(215, 1000), 1)
+        self.assertEqual(self.recorder.readings(2, 3), [(1000, 21.5)])
+
+    def test_purge(self):
+        self.record_temperature(215, 1000)
+        self.record_temperature(220, 2000)
+        self.assertEqual(self.recorder.purge(1500), 1)
+        self.assertEqual(self.recorder.readings(2, 3), [(2000, 22.0)])
+
+    def test_downsample(self):
+        self.record_temperature(210, 1000)
+        self.record_temperature(220, 1100)
+        self.record_temperature(230, 1300)
+        self.assertEqual(self.recorder.downsample(1200, 600), 1)
+        self.assertEqual(self.recorder.readings(2, 3),
+                         [(600, 21.5), (1300, 23.0)])
@@ -0,0 +1,60 @@
+"""Test methods in duco/registers.py."""
+import unittest
+from unittest.mock import MagicMock
+from duco.enum_types import (ModuleType)
+from duco.modbus import (REGISTER_TYPE_INPUT, REGISTER_TYPE_HOLDING)
+from duco.nodes import (Node)
+from duco.registers import (REGISTER_MAP, REGISTER_SPECS, RegisterIndex)
+
+
+class TestRegisterMap(unittest.TestCase):
+    """Class that tests the declarative register map."""
+
+    def test_keys_known(self):
+        for keys in REGISTER_MAP.values():
+            for key in keys:
+                self.assertIn(key, REGISTER_SPECS)
+
+    def test_addresses_unique(self):
+        for keys in REGISTER_MAP.values():
+            addresses = [(REGISTER_SPECS[key].register_type,
+                          REGISTER_SPECS[key].param_id) for key in keys]
+            self.assertEqual(len(addresses), len(set(addresses)))
+
+    def test_node_registers(self):
+        node = Node.factory(1, ModuleType.VALVE_RH, MagicMock())
+        self.assertEqual(len(node.registers),
+                         len(REGISTER_MAP[ModuleType.VALVE_RH]))
+        self.assertIs(node._reg_rh_value.spec, REGISTER_SPECS['rh_value'])
+
+
+class TestRegisterIndex(unittest.TestCase):
+    """Class that tests RegisterIndex."""
+
+    def setUp(self):
+        self.index = RegisterIndex()
+        self.node = Node.factory(2, ModuleType.VALVE_CO2, MagicMock())
+        self.index.add_node(self.node)
+
+    def test_get(self):
+        self.assertIs(self.index.get(REGISTER_TYPE_INPUT, 24),
+                      self.node._reg_co2_value)
+        self.assertIs(self.index.get(REGISTER_TYPE_HOLDING, 24),
+                      self.node._reg_flow)
+        self.assertIsNone(self.index.get(REGISTER_TYPE_INPUT, 27))
+
+    def test_decode(self):
+        decoded = self.index.decode(REGISTER_TYPE_INPUT, 21,
+                                    [2, 50, 215, 650, 0, 0, 0, 0, 3])
+        self.assertEqual(decoded, [self.node._reg_status,
+                                   self.node._reg_fan_actual,
+                                   self.node._reg_temperature,
+                                   self.node._reg_co2_value,
+                                   self.node._reg_zone])
+        self.assertEqual(self.node._reg_temperature._value, 21.5)
+        self.assertEqual(self.node._reg_co2_value._value, 650)
+        self.assertEqual(self.node._reg_zone._value, 3)
+
+    def test_remove_node(self):
+        self.index.remove_node(self.node)
+        self.assertEqual(len(self.index), 0)
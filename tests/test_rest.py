@@ -0,0 +1,183 @@
+"""Test methods in duco/rest.py."""
+import http.client
+import json
+import threading
+import unittest
+from unittest.mock import MagicMock
+from duco.duco import (DucoBox)
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+from duco.rest import (ApiError, RestApi, _write_value)
+
+
+class TestRestApi(unittest.TestCase):
+    """Class that tests RestApi."""
+
+    def setUp(self):
+        self.box = DucoBox('serial', '/dev/usb0')
+        self.hub = MagicMock()
+        self.hub.write_register.return_value.isError.return_value = False
+        self.hub.write_registers.return_value.isError.return_value = False
+        self.box._modbus_hub = self.hub
+        self.box.node_list = [Node.factory(1, ModuleType.MASTER, self.hub),
+                              Node.factory(2, ModuleType.VALVE_CO2,
+                                           self.hub)]
+        for node in self.box.node_list:
+            node.register('zone').decode([1])
+        self.box.node_list[1].register('co2_value').decode([800])
+        self.box.zone_index.build(self.box.node_list)
+        self.api = RestApi([self.box], 'localhost', 0)
+        self.api.start()
+        self.thread = threading.Thread(target=self.api.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.api.shutdown()
+        self.thread.join()
+
+    def request(self, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection(*self.api.server_address)
+        try:
+            if body is not None:
+                body = json.dumps(body)
+            connection.request(method, path, body, headers or {})
+            response = connection.getresponse()
+            data = response.read()
+            return response, json.loads(data.decode()) if data else None
+        finally:
+            connection.close()
+
+    def test_boxes(self):
+        response, data = self.request('GET', '/boxes')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data, [{'box': 0, 'nodes': [1, 2], 'zones': [1]}])
+
+    def test_register(self):
+        _, data = self.request('GET', '/boxes/0/nodes/2/registers/co2_value')
+        self.assertEqual(data, {'name': 'CO2 value', 'value': 800,
+                                'unit': 'ppm', 'stale': False,
+                                'writable': False})
+
+    def test_zone(self):
+        _, data = self.request('GET', '/boxes/0/zones/1')
+        self.assertEqual(data['nodes'], [1, 2])
+        self.assertEqual(data['max_co2'], 800)
+
+    def test_not_found(self):
+        for path in ('/boxes/1', '/boxes/0/nodes/9', '/boxes/0/zones/2',
+                     '/boxes/0/nodes/1/registers/co2_value', '/other'):
+            response, data = self.request('GET', path)
+            self.assertEqual(response.status, 404, path)
+            self.assertIn('error', data)
+
+    def test_read_error(self):
+        self.api._resource = MagicMock(side_effect=RuntimeError)
+        with self.assertLogs('python-duco', 'ERROR'):
+            response, data = self.request('GET', '/boxes')
+        self.assertEqual(response.status, 500)
+        self.assertIn('error', data)
+
+    def test_reads_from_cache(self):
+        self.request('GET', '/boxes/0/nodes')
+        self.hub.read_input_registers.assert_not_called()
+        self.hub.read_holding_registers.assert_not_called()
+
+    def test_conditional_get(self):
+        response, _ = self.request('GET', '/boxes/0/nodes/2')
+        etag = response.getheader('ETag')
+        response, data = self.request('GET', '/boxes/0/nodes/2',
+                                      headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertIsNone(data)
+        # an unchanged refresh keeps the version
+        self.api.refresh(sweep=False)
+        response, _ = self.request('GET', '/boxes/0/nodes/2',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.box.node_list[1].register('co2_value').decode([900])
+        self.api.refresh(sweep=False)
+        response, data = self.request('GET', '/boxes/0/nodes/2',
+                                      headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 200)
+        self.assertNotEqual(response.getheader('ETag'), etag)
+        self.assertEqual(data['registers']['co2_value']['value'], 900)
+
+    def test_put_register(self):
+        version = self.api.version
+        response, data = self.request(
+            'PUT', '/boxes/0/nodes/2/registers/setpoint', {'value': 40})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data, {'written': [{'node_id': 2,
+                                             'register': 'setpoint'}],
+                                'elided': [], 'failed': 0})
+        self.hub.write_register.assert_called_once_with(
+            self.box.node_list[1].register('setpoint').address, 40)
+        self.assertGreater(self.api.version, version)
+
+    def test_put_unchanged(self):
+        self.hub.write_elision = True
+        self.hub.cache_ttl = 60
+        for _ in range(2):
+            response, data = self.request(
+                'PUT', '/boxes/0/nodes/2/registers/setpoint', {'value': 40})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data, {'written': [],
+                                'elided': [{'node_id': 2,
+                                            'register': 'setpoint'}],
+                                'failed': 0})
+        self.hub.write_register.assert_called_once()
+
+    def test_post_writes_batched(self):
+        node = self.box.node_list[1]
+        response, data = self.request('POST', '/boxes/0/writes', [
+            {'node_id': 2, 'register': 'automin', 'value': 10},
+            {'node_id': 2, 'register': 'automax', 'value': 90}])
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(data['written']), 2)
+        self.hub.write_registers.assert_called_once_with(
+            node.register('automin').address, [10, 90])
+
+    def test_bad_writes(self):
+        for body in ({'value': 'x'}, {'value': True}, [1]):
+            response, _ = self.request(
+                'PUT', '/boxes/0/nodes/2/registers/setpoint', body)
+            self.assertEqual(response.status, 400, body)
+        response, _ = self.request(
+            'PUT', '/boxes/0/nodes/2/registers/co2_value', {'value': 1})
+        self.assertEqual(response.status, 400)
+        response, _ = self.request('POST', '/boxes/0/nodes', [])
+        self.assertEqual(response.status, 405)
+        self.hub.write_register.assert_not_called()
+
+    def test_out_of_range(self):
+        for key, value in (('setpoint', 42), ('setpoint', 105),
+                           ('automin', -5), ('co2_setpoint', 2010),
+                           ('action', 7), ('setpoint', -1)):
+            response, data = self.request(
+                'PUT', '/boxes/0/nodes/2/registers/' + key, {'value': value})
+            self.assertEqual(response.status, 400, key)
+            self.assertIn(key, data['error'])
+        # one invalid write rejects the whole batch
+        response, _ = self.request('POST', '/boxes/0/writes', [
+            {'node_id': 2, 'register': 'automin', 'value': 10},
+            {'node_id': 2, 'register': 'automax', 'value': 101}])
+        self.assertEqual(response.status, 400)
+        self.hub.write_register.assert_not_called()
+        self.hub.write_registers.assert_not_called()
+
+    def test_write_value(self):
+        self.assertEqual(_write_value('manual_time', 30), 30)
+        for value in (-1, 70000):
+            self.assertRaises(ApiError, _write_value, 'manual_time', value)
+        self.assertRaises(ApiError, _write_value, 'unknown', 0)
+
+    def test_put_action(self):
+        response, _ = self.request(
+            'PUT', '/boxes/0/nodes/2/registers/action', {'value': 4})
+        self.assertEqual(response.status, 200)
+        self.hub.write_register.assert_called_once_with(
+            self.box.node_list[1].register('action').address, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
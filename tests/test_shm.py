@@ -0,0 +1,60 @@
+"""Test methods in duco/shm.py."""
+import math
+import multiprocessing
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+import duco.shm
+from duco.shm import (SnapshotPublisher, SnapshotReader)
+
+
+@unittest.skipIf(sys.version_info < (3, 8), "shared_memory needs python 3.8")
+class TestSnapshot(unittest.TestCase):
+    """Class that tests SnapshotPublisher and SnapshotReader."""
+
+    def setUp(self):
+        self.hub = MagicMock()
+        self.hub.read_input_registers.return_value.registers = [215]
+        self.node = Node.factory(2, ModuleType.VALVE_SENSORLESS, self.hub)
+        self.name = 'duco_test_{}'.format(os.getpid())
+        self.publisher = SnapshotPublisher(self.name, self.node.registers)
+        self.reader = SnapshotReader(self.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.publisher.close()
+
+    def test_layout(self):
+        self.assertEqual(len(self.reader.keys), len(self.node.registers))
+        value, timestamp = self.reader.read(2, 3)
+        self.assertTrue(math.isnan(value))
+        self.assertEqual(timestamp, 0.0)
+
+    def test_publish(self):
+        self.node._reg_temperature.update()
+        self.publisher.publish([self.node._reg_temperature])
+        value, timestamp = self.reader.read(2, 3)
+        self.assertEqual(value, 21.5)
+        self.assertEqual(timestamp, self.node._reg_temperature.timestamp)
+        version, values = self.reader.snapshot()
+        self.assertEqual(version, self.publisher.version)
+        self.assertEqual(version % 2, 0)
+        self.assertEqual(values[(2, 3)][0], 21.5)
+
+    def test_inconsistent(self):
+        with patch.object(duco.shm, '_READ_TIMEOUT', 0.01), \
+                patch.object(self.reader, '_version', return_value=1):
+            self.assertRaises(RuntimeError, self.reader.snapshot)
+
+    @unittest.skipIf(os.name != 'posix', "resource tracker is posix only")
+    def test_forked_reader_shares_tracker(self):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        child = context.Process(
+            target=lambda: results.put(duco.shm._tracker_id()))
+        child.start()
+        child.join()
+        self.assertEqual(results.get(timeout=5), duco.shm._tracker_id())
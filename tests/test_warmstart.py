@@ -0,0 +1,90 @@
+"""Test methods in duco/warmstart.py."""
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+from duco.warmstart import (
+    WarmStart,
+    load_snapshot,
+    restore_snapshot,
+    save_snapshot
+    )
+from duco.zones import (ZoneIndex)
+
+
+def create_nodes():
+    hub = MagicMock()
+    hub.cache_ttl = 3600
+    hub.read_input_registers.return_value = None
+    return [Node.factory(1, ModuleType.MASTER, hub),
+            Node.factory(2, ModuleType.VALVE_CO2, hub)]
+
+
+class TestWarmStart(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.snap')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_roundtrip(self):
+        nodes = create_nodes()
+        co2 = nodes[1].register('co2_value')
+        co2.decode([850])
+        temperature = nodes[1].register('temperature')
+        temperature.decode([215])
+        self.assertEqual(save_snapshot(self.path, nodes), 2)
+        values = load_snapshot(self.path)
+        self.assertEqual(
+            values[(2, ModuleType.VALVE_CO2, co2.spec.register_id)],
+            (850, co2.timestamp))
+
+        restarted = create_nodes()
+        restored = restore_snapshot(self.path, restarted)
+        self.assertEqual(len(restored), 2)
+        new_co2 = restarted[1].register('co2_value')
+        self.assertEqual(new_co2.cached_value, 850)
+        self.assertEqual(new_co2.timestamp, co2.timestamp)
+        self.assertTrue(new_co2.stale)
+        self.assertEqual(restarted[1].register('temperature').cached_value,
+                         21.5)
+        new_co2.decode([900])
+        self.assertFalse(new_co2.stale)
+
+    def test_type_changed(self):
+        nodes = create_nodes()
+        nodes[1].register('flow').decode([120])
+        save_snapshot(self.path, nodes)
+        hub = MagicMock()
+        replaced = [Node.factory(2, ModuleType.USER_CONTROLLER, hub)]
+        # flow of the valve and button_1 of the controller share an id
+        self.assertEqual(replaced[0].register('button_1').spec.register_id,
+                         nodes[1].register('flow').spec.register_id)
+        self.assertEqual(restore_snapshot(self.path, replaced), [])
+        self.assertIsNone(replaced[0].register('button_1').cached_value)
+
+    def test_missing_or_invalid(self):
+        os.remove(self.path)
+        self.assertEqual(restore_snapshot(self.path, []), [])
+        with open(self.path, 'wb') as snapshot:
+            snapshot.write(b'garbage')
+        self.assertRaises(ValueError, load_snapshot, self.path)
+        self.assertEqual(restore_snapshot(self.path, []), [])
+
+    def test_box(self):
+        box = MagicMock()
+        box.node_list = create_nodes()
+        box.node_list[1].register('zone').decode([1])
+        box.node_list[1].register('co2_value').decode([1200])
+        warm_start = WarmStart(box, self.path)
+        warm_start.start()
+        warm_start.stop()
+
+        box.node_list = create_nodes()
+        box.zone_index = ZoneIndex()
+        box.zone_index.build(box.node_list)
+        warm_start.restore()
+        self.assertEqual(box.zone_index.max_co2(1), 1200)
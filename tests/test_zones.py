@@ -0,0 +1,59 @@
+"""Test methods in duco/zones.py."""
+import unittest
+from unittest.mock import MagicMock
+from duco.enum_types import (ModuleType)
+from duco.nodes import (Node)
+from duco.zones import (ZoneIndex)
+
+
+def set_value(node, key, raw):
+    """Decode raw into register key of node."""
+    register = node.register(key)
+    register.decode([raw])
+    return register
+
+
+class TestZoneIndex(unittest.TestCase):
+    """Class that tests ZoneIndex."""
+
+    def setUp(self):
+        hub = MagicMock()
+        self.nodes = [Node.factory(2, ModuleType.VALVE_CO2, hub),
+                      Node.factory(3, ModuleType.ROOM_SENSOR_CO2, hub),
+                      Node.factory(4, ModuleType.VALVE_RH, hub)]
+        for node, zone in zip(self.nodes, [1, 1, 2]):
+            set_value(node, 'zone', zone)
+        set_value(self.nodes[0], 'co2_value', 600)
+        set_value(self.nodes[1], 'co2_value', 900)
+        set_value(self.nodes[0], 'temperature', 200)
+        set_value(self.nodes[2], 'temperature', 220)
+        set_value(self.nodes[2], 'rh_value', 5000)
+        self.index = ZoneIndex()
+        self.index.build(self.nodes)
+
+    def test_build(self):
+        self.assertEqual(self.index.zones, [1, 2])
+        self.assertEqual(self.index.nodes(1), self.nodes[:2])
+        self.assertEqual(self.index.zone_of(4), 2)
+        self.assertEqual(self.index.max_co2(1), 900)
+        self.assertEqual(self.index.max_rh(2), 50.0)
+        self.assertEqual(self.index.mean_temperature(1), 20.0)
+        self.assertIsNone(self.index.max_co2(2))
+
+    def test_apply(self):
+        self.index.apply([set_value(self.nodes[1], 'co2_value', 500)])
+        self.assertEqual(self.index.max_co2(1), 600)
+        self.index.apply([set_value(self.nodes[0], 'temperature', 210)])
+        self.assertAlmostEqual(self.index.mean_temperature(1), 21.0)
+
+    def test_move(self):
+        self.index.apply([set_value(self.nodes[0], 'zone', 2)])
+        self.assertEqual(self.index.nodes(1), [self.nodes[1]])
+        self.assertEqual(self.index.max_co2(2), 600)
+        self.assertAlmostEqual(self.index.mean_temperature(2), 21.0)
+        self.assertIsNone(self.index.mean_temperature(1))
+
+    def test_remove_node(self):
+        self.index.remove_node(self.nodes[2])
+        self.assertEqual(self.index.zones, [1])
+        self.assertRaises(KeyError, self.index.max_rh, 2)